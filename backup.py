@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Back up a base directory into a single encrypted archive or restore one.
+
+Usage:
+    SLRD_GPG_KEY=<key id> ./backup.py backup.slrd
+    SLRD_GPG_KEY=<key id> ./backup.py --restore backup.slrd [target dir]
+"""
+from argparse import ArgumentParser
+from os import environ
+import sys
+from slrd.controllers.gpg_controller import GPGController
+from slrd.exceptions import SLRDRuntimeException
+from slrd.managers.backup_manager import BackupManager
+
+
+def report(stats):
+    """Print a progress line over a previous one."""
+    total = stats['total_files']
+    sys.stderr.write('\r%i%s files, %.1f MB, %.1f MB/s ' % (
+        stats['files'], '/%i' % total if total is not None else '',
+        stats['bytes'] / BackupManager.MB, stats['rate'] / BackupManager.MB))
+
+
+def main():
+    """Run a backup or a restore."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('archive', help='path to an archive')
+    parser.add_argument('target', nargs='?',
+                        help='directory to restore into (default: base dir)')
+    parser.add_argument('--restore', action='store_true',
+                        help='restore an archive instead of creating one')
+    parser.add_argument('--force', action='store_true',
+                        help='override an existing archive')
+    args = parser.parse_args()
+    gpgctrl = GPGController(environ['SLRD_GPG_KEY'],
+                            environ.get('SLRD_GPG_HOME', '~/.gnupg/'))
+    backups = BackupManager(environ.get('SLRD_BASE_DIR', '~/.slrd/'), gpgctrl)
+    try:
+        if args.restore:
+            stats = backups.restore(args.archive, args.target, report)
+        else:
+            stats = backups.backup(args.archive, report, args.force)
+    except SLRDRuntimeException as e:
+        sys.exit('\nerror: %s' % e)
+    report(stats)
+    sys.stderr.write('\ndone in %.1fs\n' % stats['elapsed'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Re-encrypt every container with a new GPG key (stop a server first).
+
+Usage:
+    SLRD_GPG_KEY=<old key id> ./rotate.py <new key id>
+    SLRD_GPG_KEY=<old key id> ./rotate.py --workers 4 --io-rate 50 <new key>
+
+Both keys must be in SLRD_GPG_HOME. An interrupted rotation resumes when it's
+run again with the same keys; point a server to a new key once it's done.
+"""
+from argparse import ArgumentParser
+from os import environ
+import sys
+from slrd.controllers.gpg_controller import GPGController
+from slrd.exceptions import SLRDRuntimeException
+from slrd.managers.rotation_manager import RotationManager
+
+
+def main():
+    """Run a rotation."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('new_key', help='ID of a GPG key to rotate to')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--io-rate', type=float,
+                        help='I/O budget in MB/s (default: unlimited)')
+    parser.add_argument('--batch-size', type=int,
+                        help='containers re-encrypted and written at once')
+    args = parser.parse_args()
+    gpgctrl = GPGController(environ['SLRD_GPG_KEY'],
+                            environ.get('SLRD_GPG_HOME', '~/.gnupg/'))
+    rotation = RotationManager(
+            environ.get('SLRD_BASE_DIR', '~/.slrd/'), gpgctrl, args.new_key,
+            args.workers, args.io_rate and args.io_rate * RotationManager.MB,
+            args.batch_size)
+    try:
+        stats = rotation.run()
+    except SLRDRuntimeException as e:
+        sys.exit('error: %s' % e)
+    sys.stderr.write('%i containers (%.1f MB) in %i passes, done in %.1fs\n'
+                     % (stats['containers'], stats['bytes'] /
+                        RotationManager.MB, stats['passes'],
+                        stats['elapsed']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # vi: set ft=python sw=4 :
-"""."""
-
+"""Development server (see start.sh for a production one)."""
+from os import environ
 from slrd import slrd
-slrd.run(host='0.0.0.0', port=8080, debug=True)
+slrd.run(host='127.0.0.1', port=8080, threaded=True,
+         debug=environ.get('SLRD_DEBUG') == '1')
@@ -1,8 +1,20 @@
 """."""
+import atexit
+from os import environ
 from flask import Flask
 import logging
+from slrd.controllers.gpg_controller import GPGController
+from slrd.managers.backend_manager import BackendManager
 
 slrd = Flask(__name__)
+# an index snapshot is encrypted with this key (rebuilt on start if not set)
+gpgctrl = GPGController(environ['SLRD_GPG_KEY'],
+                        environ.get('SLRD_GPG_HOME', '~/.gnupg/')) \
+    if environ.get('SLRD_GPG_KEY') else None
+# one index and set of executors per server process
+backend = BackendManager(environ.get('SLRD_BASE_DIR', '~/.slrd/'),
+                         gpgctrl=gpgctrl)
+atexit.register(backend.shutdown)
 from slrd.views import views
 
 
@@ -11,26 +11,35 @@ Todo:
     - add delete_link() method
     - consider moving OS compatibility check to a separate module
 """
+from contextlib import contextmanager
 from datetime import datetime
-import logging
-from importlib import import_module
-from os import makedirs, remove, fdopen, O_CREAT, lstat, utime, supports_fd
+from mmap import mmap, ACCESS_READ
+from os import makedirs, remove, fdopen, lstat, scandir, utime, supports_fd
+from os import close, fstat, fsync, read, rename, stat, write, unlink
+from os import fchmod, supports_dir_fd
+from os import O_CREAT, O_WRONLY, O_RDONLY, O_EXCL, O_DIRECTORY
+from os import O_APPEND, O_CLOEXEC, O_NOFOLLOW, O_NONBLOCK
 from os import open as osopen
-from os.path import isdir, isfile, islink, exists
+from os.path import isdir, isfile, islink, exists, join, split
+from secrets import token_hex
+from stat import S_ISREG
+from threading import local
 from slrd.utils import type_checker as tc
+from slrd.utils import codec_registry
 from slrd.exceptions import fsctrl_exceptions as ex
 from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
 from shutil import rmtree
 
 
 class FSController(object):
     """Read, write and modify files in a file system."""
 
-    SUPPORTED_LOAD_FORMATS = ["yaml", "json"]
+    READ_CHUNK = 64 * 1024
+    TMP_PREFIX = '.slrd-'
+    TMP_SUFFIX = '.tmp'
 
     LOGSTR_RET_PMODE = 'retrieved parent mode: %s, mode: %s'
-    LOGSTR_RET_FILE = 'retrieved file content: %s'
-    LOGSTR_PARSE_FILE = 'parsed file content: %s, format: %s'
     LOGSTR_MKDIR = 'created directory: %s, mode: %s'
     LOGSTR_DELDIR = 'deleted directory: %s'
     LOGSTR_NODIR_OK = 'directory do not exist -> nothing to delete: %s'
@@ -41,10 +50,17 @@ class FSController(object):
     LOGSTR_MODE_WEIRD = 'permissions mode seems to be weird: %s'
     LOGSTR_NABS_PATHS = 'no absolute path enforcement: some functionality' + \
                         'might break with relative paths'
-    LOGSTR_WRITE_OK = 'written content to a file: %s, mode: %i, ts: %s, ' + \
-                      'bytes: %i'
+    LOGSTR_SCAN_DIR = 'scanned directory: %s, files: %i'
+    LOGSTR_BATCH = 'batch %s done: %s, files: %i'
+    LOGSTR_GROUP_COMMIT = 'group commit done: directories synced: %i'
+    LOGSTR_MAP_LEAK = 'mapping outlived a with-block, left to GC: %s'
+
+    # per-file events of bulk operations (sampled, see LazyLogger.hot())
+    HOTEVT_READ = 'fs.read'
+    HOTEVT_PARSE = 'fs.parse'
+    HOTEVT_WRITE = 'fs.write'
+    HOTEVT_MAP = 'fs.map'
 
-    ERRMSG_UNSUP_FORMAT = 'unsupported load format passed : %s'
     ERRMSG_UNSUP_TYPE = 'unsupported delete type: %s: %s'
     ERRMSG_MKDIR_MODE_ERR = 'can\'t cast mode argument to integer: %s'
     ERRMSG_READ_ERR = 'failed to read a file content: %s: %s'
@@ -61,13 +77,16 @@ class FSController(object):
     ERRMSG_WRITE_FAIL = 'error writing to file: %s: %s'
     ERRMSG_PATH_NEXIST = 'path do not exist: %s'
     ERRMSG_PATH_NABS = 'path must be absolute: %s'
+    ERRMSG_BAD_NAME = 'not a plain file name: %r'
+    ERRMSG_NREG = 'not a regular file'
     ERRMSG_PMRET_FAIL = 'failed to retrieve parent perms mode: %s: %s'
 
     def __init__(self, enforce_abspath=True):
         """Initialization method."""
-        self.logger = logging.getLogger(__name__)
+        self.logger = LazyLogger(__name__)
         self.logger.debug(comlogstr.LOG_INIT_START)
         self.enforce_abspath = enforce_abspath
+        self._group = local()  # per thread group commit state
         if not self.enforce_abspath:
             self.logger.warning(self.LOGSTR_NABS_PATHS)
         self.logger.debug(comlogstr.LOG_INIT_END)
@@ -103,9 +122,10 @@ class FSController(object):
         """
         if mode in range(0, 512):
             return True
-        self.logger.warning(self.LOGSTR_MODE_WEIRD % oct(mode))
+        self.logger.warning(self.LOGSTR_MODE_WEIRD, oct(mode))
         return False
 
+    @tc.accepts(path=str, check_func=callable)
     def __it_exists(self, path, check_func):
         """Implementation of *_exists methods.
 
@@ -120,12 +140,11 @@ class FSController(object):
 
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
         """
-        tc.check_types(str, callable, path, check_func)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         result = check_func(path)
-        self.logger.debug(comlogstr.LOG_CHECK_RESULT %
-                          (check_func.__name__ + '(%s)' % path, result))
+        self.logger.debug(comlogstr.LOG_CHECK_CALL_RESULT, check_func.__name__,
+                          path, result)
         return result
 
     def file_exists(self, path):
@@ -180,6 +199,7 @@ class FSController(object):
         """
         return self.__it_exists(path, exists)
 
+    @tc.accepts(path=str, mode=int)
     def create_dir(self, path, mode):
         """Create a directory.
 
@@ -193,7 +213,6 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlCreateException
         """
-        tc.check_types(str, int, path, mode)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         d_exists = self.dir_exists(path)
@@ -210,10 +229,11 @@ class FSController(object):
             makedirs(path, mode)
         except OSError as e:
             errmsg = self.ERRMSG_MKDIR_ERR % (path, mode, e)
-            self.logger.error(self.errmsg)
+            self.logger.error(errmsg)
             raise ex.SLRDFSCtrlCreateException(errmsg)
-        self.logger.info(self.LOGSTR_MKDIR % (path, mode))
+        self.logger.info(self.LOGSTR_MKDIR, path, mode)
 
+    @tc.accepts(path=str, del_func=callable, dtype=str)
     def __delete_it(self, path, del_func, dtype):
         """Implemetation of delete_* methods.
 
@@ -230,7 +250,6 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlRmException
         """
-        tc.check_types(str, callable, str, path, del_func, dtype)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         dtype_up = dtype.upper()
@@ -257,7 +276,7 @@ class FSController(object):
             errmsg = errstr_del_wtype % path
             self.logger.error(errmsg)
             raise ex.SLRDFSCtrlRmException(errmsg)
-        self.logger.warning(logstr_del_ok % path)  # do not exist at all
+        self.logger.warning(logstr_del_ok, path)  # do not exist at all
 
     def delete_dir(self, path):
         """Delete a directory.
@@ -293,6 +312,7 @@ class FSController(object):
         """
         self.__delete_it(path, remove, 'file')
 
+    @tc.accepts(path=str)
     def read_file(self, path):
         """Read content of a text file.
 
@@ -305,26 +325,134 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
         """
-        tc.check_types(str, path)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         try:
             with open(path) as f:
                 cont = f.read()
-                self.logger.info(self.LOGSTR_RET_FILE % path)
+                self.logger.hot(self.HOTEVT_READ, path=path, size=len(cont))
                 return cont
         except (OSError, PermissionError) as e:
             errmsg = self.ERRMSG_READ_ERR % (path, e)
             self.logger.error(errmsg)
             raise ex.SLRDFSCtrlReadException(errmsg)
 
+    def __map(self, path):
+        """Map a file read-only.
+
+        :return: mmap object (b'' for an empty file) and a file stat result
+        :rtype:  tuple
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        if self.enforce_abspath:
+            self.__enforce_absolute(path)
+        try:
+            fd = osopen(path, O_RDONLY | O_NOFOLLOW | O_CLOEXEC | O_NONBLOCK)
+            try:
+                st = fstat(fd)
+                if not S_ISREG(st.st_mode):
+                    raise OSError(self.ERRMSG_NREG)
+                # zero-length mappings are not allowed
+                mapped = mmap(fd, 0, access=ACCESS_READ) if st.st_size \
+                    else b''
+            finally:
+                close(fd)
+        except (OSError, ValueError) as e:
+            errmsg = self.ERRMSG_READ_ERR % (path, e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlReadException(errmsg)
+        self.logger.hot(self.HOTEVT_MAP, path=path, size=st.st_size)
+        return mapped, st
+
+    @contextmanager
+    @tc.accepts(path=str)
+    def map_file(self, path):
+        """Map content of a file into memory (read-only, no copies).
+
+        Pages are loaded by the kernel on access and can be dropped again
+        under memory pressure, so mapping a file costs no RAM up front no
+        matter how large it is. Slices of a view are zero-copy as well; they
+        must not be used after a with-block ends. Symlinks are not followed.
+
+        Usage:
+            with fsctrl.map_file(path) as view:
+                gpgctrl.decrypt(view)
+
+        :param path: path to a file to map
+        :type path:  str
+
+        :return: read-only view of file content
+        :rtype:  memoryview
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        mapped, st = self.__map(path)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            if st.st_size:
+                try:
+                    mapped.close()
+                except BufferError:  # slices still alive: GC will unmap it
+                    self.logger.debug(self.LOGSTR_MAP_LEAK, path)
+
+    @tc.accepts(path=str)
+    def open_mapped(self, path):
+        """Map content of a file into memory for as long as a view is used.
+
+        Unlike self.map_file() a mapping is not tied to a with-block: it's
+        released once a view and all of its slices are garbage collected.
+        A file may be replaced or deleted in the meantime, a mapping keeps
+        showing the content it had when it was mapped.
+
+        :param path: path to a file to map
+        :type path:  str
+
+        :return: read-only view of file content and a file stat result
+        :rtype:  tuple
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        mapped, st = self.__map(path)
+        return memoryview(mapped), st
+
+    def read_chunks(self, path, chunk_size=None):
+        """Stream content of a file in chunks without reading it whole.
+
+        :param path:       path to a file to read
+        :param chunk_size: size of chunks; defaults to self.READ_CHUNK
+
+        :type path:       str
+        :type chunk_size: int
+
+        :return: generator of read-only views of consecutive chunks (valid
+                 until a next chunk is requested)
+        :rtype:  generator
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        chunk_size = chunk_size or self.READ_CHUNK
+        with self.map_file(path) as view:
+            for offset in range(0, len(view), chunk_size):
+                chunk = view[offset:offset + chunk_size]
+                yield chunk
+                chunk.release()
+
+    @tc.accepts(path=str, lformat=str)
     def load_formatted_file(self, path, lformat):
         """Load content of a specific format.
 
-        Basically calls self.read_file() and then attempts to loads with a
-        parser of a specified format (JSON, YAML etc).
+        A file is memory-mapped and parsed with a codec of a specified format
+        (JSON, YAML etc) straight from the mapping.
 
-        See self.SUPPORTED_LOAD_FORMATS for a list of formats that can be used.
+        See slrd.utils.codec_registry for a list of formats that can be used.
 
         :param path:   path to a file to load
         :param format: format to use when parsing file content
@@ -338,23 +466,23 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
         """
-        tc.check_types(str, str, path, lformat)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
-        if lformat not in self.SUPPORTED_LOAD_FORMATS:
-            errmsg = self.ERRMSG_UNSUP_FORMAT % lformat
-            self.logger.critical(errmsg)
-            raise ex.SLRDIllegalArgumentError(errmsg)
-        file_content = self.read_file(path)
+        codec = codec_registry.get(lformat)
         try:
-            parsed_cont = import_module(lformat).loads(file_content)
-            self.logger.info(self.LOGSTR_PARSE_FILE % (path, lformat))
+            with self.map_file(path) as view:
+                parsed_cont = codec.loads(view)
+            self.logger.hot(self.HOTEVT_PARSE, path=path, format=lformat)
             return parsed_cont
+        except ex.SLRDFSCtrlReadException:
+            raise
         except Exception as e:
             errmsg = self.ERRMSG_READ_ERR % (path, e)
             self.logger.error(errmsg)
             raise ex.SLRDFSCtrlReadException(errmsg)
 
+    @tc.accepts(data=str, path=str, mode=int, inherit_mode=bool,
+                timestamp=datetime, force=bool)
     def write_to_file(
             self,
             data,
@@ -366,7 +494,11 @@ class FSController(object):
             ):
         """Write data to a file located at a specified path.
 
-        Data is written in a text mode.
+        Data is written in a text mode. A write is atomic and durable: data
+        goes to a temporary file in the same directory which is fsync'ed and
+        renamed over a target, then the directory is fsync'ed (once per
+        group, see self.group_commit()). A crash leaves either an old or a new
+        file, never a half-written one.
 
         :param data:         data to write to a file
         :param path:         path to a file to write to
@@ -386,14 +518,12 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlWriteException
         """
-        tc.check_types(str, str, int, bool, datetime, bool, data, path, mode,
-                       inherit_mode, timestamp, force)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         f_exists = self.file_exists(path)
         if utime not in supports_fd:
             self.logger.critical(self.ERRMSG_NSUPP_FD)
-            raise self.SLRDUnsupportedSystemError(self.ERRMSG_NSUPP_FD)
+            raise ex.SLRDUnsupportedSystemError(self.ERRMSG_NSUPP_FD)
         elif f_exists and not force:
             errmsg = self.ERRMSG_FILE_EXISTS % (path, str(force))
             self.logger.error(errmsg)
@@ -408,17 +538,499 @@ class FSController(object):
         if not timestamp:
             timestamp = datetime.today()
         ts_seconds = timestamp.timestamp()
+        dir_path, name = split(path)
+        tmp_path = join(dir_path, self.__temp_name(name))
         try:
-            with fdopen(osopen(path, flags=O_CREAT, mode=mode)) as f:
-                f.write(data)
-                utime(f.fileno(), times=(ts_seconds, ts_seconds))
-                self.logger.info(self.LOGSTR_WRITE_OK %
-                                 (path, oct(mode), timestamp, len(data)))
+            flags = O_WRONLY | O_CREAT | O_EXCL | O_NOFOLLOW | O_CLOEXEC
+            try:
+                with fdopen(osopen(tmp_path, flags=flags, mode=mode),
+                            'w') as f:
+                    f.write(data)
+                    f.flush()
+                    fsync(f.fileno())
+                    utime(f.fileno(), times=(ts_seconds, ts_seconds))
+                rename(tmp_path, path)
+            except BaseException:
+                self.__discard(tmp_path)
+                raise
+            self.logger.hot(self.HOTEVT_WRITE, path=path, mode=mode,
+                            ts=timestamp, size=len(data))
+            self.__commit_dir(dir_path or '.')
         except Exception as e:
-            errmsg = self.ERRMSG_WRITE_FAIL % (type(e).__name__, e)
+            errmsg = self.ERRMSG_WRITE_FAIL % (path, e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+
+    @tc.accepts(data=str, path=str, mode=int)
+    def append_to_file(self, data, path, mode=0o600):
+        """Append data to a text file (i.e. a journal) durably.
+
+        A file is created if it doesn't exist. Unlike self.write_to_file()
+        an append is not atomic: a crash may leave a partially written tail,
+        so readers must ignore an incomplete last record.
+
+        :param data: data to append
+        :param path: path to a file to append to
+        :param mode: permissions with which to create a file
+
+        :type data: str
+        :type path: str
+        :type mode: int
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlWriteException
+        """
+        if self.enforce_abspath:
+            self.__enforce_absolute(path)
+        self.__is_weird_perms_mode(mode)
+        dir_path = split(path)[0]
+        try:
+            created = not self.file_exists(path)
+            flags = O_WRONLY | O_CREAT | O_APPEND | O_NOFOLLOW | O_CLOEXEC
+            with fdopen(osopen(path, flags, mode), 'a') as f:
+                f.write(data)
+                f.flush()
+                fsync(f.fileno())
+            self.logger.hot(self.HOTEVT_WRITE, path=path, mode=mode,
+                            size=len(data))
+            if created:
+                self.__commit_dir(dir_path or '.')
+        except OSError as e:
+            errmsg = self.ERRMSG_WRITE_FAIL % (path, e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+
+    @classmethod
+    def __temp_name(cls, name):
+        """Get a unique name of a temporary file to write name through."""
+        return '%s%s.%s%s' % (cls.TMP_PREFIX, name, token_hex(4),
+                              cls.TMP_SUFFIX)
+
+    @classmethod
+    def is_temp_name(cls, name):
+        """Check whether a file name is one of a temporary file.
+
+        Temporary files only exist while a write is in progress (or after a
+        crash in the middle of one) and must be ignored by directory scans.
+
+        :param name: file name (not a path)
+        :type name:  str
+
+        :rtype: bool
+        """
+        return name.startswith(cls.TMP_PREFIX) and \
+            name.endswith(cls.TMP_SUFFIX)
+
+    @staticmethod
+    def __discard(tmp_path, dir_fd=None):
+        """Remove a temporary file of a failed write (best-effort)."""
+        try:
+            unlink(tmp_path, dir_fd=dir_fd)
+        except OSError:
+            pass
+
+    def __commit_dir(self, path, dir_fd=None):
+        """Make renames and unlinks in a directory durable.
+
+        Inside of self.group_commit() a directory is only remembered and
+        fsync'ed once when a group ends.
+
+        :param path:   path to a directory
+        :param dir_fd: open file descriptor of a directory (if any)
+
+        :type path:   str
+        :type dir_fd: int
+        """
+        pending = getattr(self._group, 'dirs', None)
+        if pending is not None:
+            pending.add(path)
+            return
+        if dir_fd is not None:
+            fsync(dir_fd)
+            return
+        dir_fd = osopen(path, O_RDONLY | O_DIRECTORY | O_CLOEXEC)
+        try:
+            fsync(dir_fd)
+        finally:
+            close(dir_fd)
+
+    @contextmanager
+    def group_commit(self):
+        """Group writes so that each directory is fsync'ed only once.
+
+        Every file is still written atomically and fsync'ed on its own, only
+        directory fsyncs (which make renames durable) are deferred until a
+        group ends. Groups are per thread; nested groups join an outer one.
+
+        Usage:
+            with fsctrl.group_commit():
+                for ...:
+                    fsctrl.write_to_file(...)
+
+        :raises: slrd.exceptions.controller_exceptions.SLRDFSCtrlWriteException
+        """
+        if getattr(self._group, 'dirs', None) is not None:
+            yield
+            return
+        self._group.dirs = set()
+        try:
+            yield
+        finally:
+            dirs, self._group.dirs = self._group.dirs, None
+            try:
+                for path in sorted(dirs):
+                    self.__commit_dir(path)
+            except OSError as e:
+                errmsg = self.ERRMSG_WRITE_FAIL % (path, e)
+                self.logger.error(errmsg)
+                raise ex.SLRDFSCtrlWriteException(errmsg)
+            self.logger.debug(self.LOGSTR_GROUP_COMMIT, len(dirs))
+
+    @tc.accepts(path=str)
+    def scan_dir(self, path):
+        """Get stat signatures of regular files in a directory.
+
+        A signature is a (mtime_ns, size, inode) tuple; comparing signatures of
+        two scans is enough to tell which files were changed in between
+        without reading them. Subdirectories and temporary files of writes in
+        progress are skipped. A missing directory is treated as an empty one.
+
+        :param path: path to a directory to scan
+        :type path:  str
+
+        :return: {absolute file path: signature}
+        :rtype:  dict
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if self.enforce_abspath:
+            self.__enforce_absolute(path)
+        state = {}
+        try:
+            with scandir(path) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False) and \
+                            not self.is_temp_name(entry.name):
+                        st = entry.stat(follow_symlinks=False)
+                        state[entry.path] = (st.st_mtime_ns, st.st_size,
+                                             st.st_ino)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        self.logger.debug(self.LOGSTR_SCAN_DIR, path, len(state))
+        return state
+
+    @tc.accepts(path=str)
+    def walk_dir(self, path, skip=()):
+        """Get stat signatures of regular files in a whole subtree.
+
+        Works like self.scan_dir() on a directory and every subdirectory of it
+        (symlinks are not followed). Files are yielded in a stable order:
+        sorted by name, files of a directory before its subdirectories.
+
+        :param path: path to a root of a subtree to walk
+        :param skip: names of files and directories to leave out (at any
+                     depth), i.e. ('.git',)
+
+        :type path: str
+        :type skip: iterable of str
+
+        :return: generator of (absolute file path, signature) tuples
+        :rtype:  generator
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        skip = frozenset(skip)
+        pending = [path]
+        while pending:
+            dir_path = pending.pop()
+            files = self.scan_dir(dir_path)
+            for file_path in sorted(files):
+                if split(file_path)[1] not in skip:
+                    yield file_path, files[file_path]
+            try:
+                with scandir(dir_path) as it:
+                    subdirs = [entry.path for entry in it
+                               if entry.name not in skip and
+                               entry.is_dir(follow_symlinks=False)]
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            pending.extend(sorted(subdirs, reverse=True))
+
+    @contextmanager
+    def atomic_output(self, path, mode=0o600, force=False):
+        """Let an external writer (i.e. gpg) create a file atomically.
+
+        A temporary path in the same directory is handed out to write to;
+        once a with-block ends a temporary file is fsync'ed and renamed over
+        a target (same guarantees as self.write_to_file()). A temporary file
+        is removed if a with-block fails.
+
+        Usage:
+            with fsctrl.atomic_output(path) as tmp_path:
+                gpgctrl.encrypt_stream(source, tmp_path)
+
+        :param path:  path to a file to create
+        :param mode:  permissions to set on a file
+        :param force: override an existing file
+
+        :type path:  str
+        :type mode:  int
+        :type force: bool
+
+        :return: temporary path to write to
+        :rtype:  str
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlWriteException
+        """
+        if self.enforce_abspath:
+            self.__enforce_absolute(path)
+        if self.file_exists(path) and not force:
+            errmsg = self.ERRMSG_FILE_EXISTS % (path, str(force))
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+        dir_path, name = split(path)
+        tmp_path = join(dir_path, self.__temp_name(name))
+        try:
+            yield tmp_path
+            fd = osopen(tmp_path, O_WRONLY | O_NOFOLLOW | O_CLOEXEC)
+            try:
+                fchmod(fd, mode)
+                fsync(fd)
+            finally:
+                close(fd)
+            rename(tmp_path, path)
+        except BaseException as e:
+            self.__discard(tmp_path)
+            if not isinstance(e, OSError):
+                raise
+            errmsg = self.ERRMSG_WRITE_FAIL % (path, e)
             self.logger.error(errmsg)
             raise ex.SLRDFSCtrlWriteException(errmsg)
+        self.logger.hot(self.HOTEVT_WRITE, path=path, mode=mode)
+        try:
+            self.__commit_dir(dir_path or '.')
+        except OSError as e:
+            errmsg = self.ERRMSG_WRITE_FAIL % (path, e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+
+    def __open_dir(self, path, names):
+        """Validate a batch and open its directory.
+
+        Batch operations address files by names relative to a directory file
+        descriptor, so a path is checked once per batch and names only have to
+        be plain file names (no separators: nothing can escape a directory).
+
+        :param path:  path to a directory
+        :param names: names of files in a directory
+
+        :type path:  str
+        :type names: list
+
+        :return: directory file descriptor (caller must close it)
+        :rtype:  int
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.common_exceptions.SLRDUnsupportedSystemError,
+                 FileNotFoundError, NotADirectoryError, PermissionError
+        """
+        if self.enforce_abspath:
+            self.__enforce_absolute(path)
+        if not ({osopen, rename, stat, unlink} <= supports_dir_fd and
+                utime in supports_fd):
+            self.logger.critical(self.ERRMSG_NSUPP_FD)
+            raise ex.SLRDUnsupportedSystemError(self.ERRMSG_NSUPP_FD)
+        for name in names:
+            if not isinstance(name, str) or not name or '/' in name or \
+                    name in ('.', '..'):
+                errmsg = self.ERRMSG_BAD_NAME % (name,)
+                self.logger.critical(errmsg)
+                raise ex.SLRDIllegalArgumentError(errmsg)
+        return osopen(path, O_RDONLY | O_DIRECTORY | O_CLOEXEC)
+
+    @tc.accepts(path=str, names=list)
+    def read_many(self, path, names):
+        """Read content of many text files located in a single directory.
+
+        Costs open, fstat, read and close per file. Symlinks are not followed.
+        Content is decoded as UTF-8 (no newline translation).
+
+        :param path:  path to a directory
+        :param names: names of files to read
+
+        :type path:  str
+        :type names: list
+
+        :return: content of each file (in order of names)
+        :rtype:  list
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        result = []
+        name = ''
+        try:
+            dfd = self.__open_dir(path, names)
+            try:
+                for name in names:
+                    fd = osopen(name, O_RDONLY | O_NOFOLLOW | O_CLOEXEC |
+                                O_NONBLOCK, dir_fd=dfd)
+                    try:
+                        st = fstat(fd)
+                        if not S_ISREG(st.st_mode):
+                            raise OSError(self.ERRMSG_NREG)
+                        chunks = [read(fd, st.st_size + 1)]
+                        while chunks[-1]:  # file grew since fstat()
+                            chunks.append(read(fd, self.READ_CHUNK))
+                    finally:
+                        close(fd)
+                    result.append(b''.join(chunks).decode())
+                    self.logger.hot(self.HOTEVT_READ, path=name,
+                                    size=st.st_size)
+            finally:
+                close(dfd)
+        except (OSError, UnicodeDecodeError) as e:
+            errmsg = self.ERRMSG_READ_ERR % (join(path, name), e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlReadException(errmsg)
+        self.logger.debug(self.LOGSTR_BATCH, 'read', path, len(result))
+        return result
+
+    def __check_target(self, name, dir_fd, force):
+        """Check a file can be (over)written by a batch write.
+
+        :raises: FileExistsError, OSError
+        """
+        try:
+            st = stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        except FileNotFoundError:
+            return
+        if not force:
+            raise FileExistsError(name)
+        if not S_ISREG(st.st_mode):
+            raise OSError(self.ERRMSG_NREG)
+
+    @tc.accepts(path=str, files=dict, mode=int, force=bool)
+    def write_many(self, path, files, mode=0o600, timestamp=None,
+                   force=False):
+        """Write many files located in a single directory.
+
+        Every file is written atomically like in self.write_to_file(): to an
+        fsync'ed temporary file renamed over a target. That costs fstatat,
+        open, write, fsync, futimens, close and rename per file; the directory
+        itself is fsync'ed once per batch (or once per group, see
+        self.group_commit()). Symlinks are not followed. Files are written in
+        order and a batch stops at a first failure.
+
+        :param path:      path to an existing directory
+        :param files:     {file name: data (str or bytes)}
+        :param mode:      permissions with which to create files
+        :param timestamp: timestamp to set on files (local time) or a function
+                          returning a timestamp for each file; now by default
+        :param force:     override existing files
+
+        :type path:      str
+        :type files:     dict
+        :type mode:      int
+        :type timestamp: datetime.datetime object or function
+        :type force:     bool
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlWriteException
+        """
+        self.__is_weird_perms_mode(mode)
+        flags = O_WRONLY | O_CREAT | O_EXCL | O_NOFOLLOW | O_CLOEXEC
+        name = ''
+        try:
+            dfd = self.__open_dir(path, list(files))
+            try:
+                for name, data in files.items():
+                    self.__check_target(name, dfd, force)
+                    ts = timestamp() if callable(timestamp) else timestamp
+                    ts_seconds = (ts or datetime.today()).timestamp()
+                    view = memoryview(data.encode() if isinstance(data, str)
+                                      else data)
+                    tmp_name = self.__temp_name(name)
+                    fd = osopen(tmp_name, flags, mode, dir_fd=dfd)
+                    try:
+                        try:
+                            while view:
+                                view = view[write(fd, view):]
+                            fsync(fd)
+                            utime(fd, times=(ts_seconds, ts_seconds))
+                        finally:
+                            close(fd)
+                        rename(tmp_name, name, src_dir_fd=dfd,
+                               dst_dir_fd=dfd)
+                    except BaseException:
+                        self.__discard(tmp_name, dfd)
+                        raise
+                    self.logger.hot(self.HOTEVT_WRITE, path=name, mode=mode,
+                                    ts=ts, size=len(data))
+                if files:
+                    self.__commit_dir(path, dfd)
+            finally:
+                close(dfd)
+        except FileExistsError:
+            errmsg = self.ERRMSG_FILE_EXISTS % (join(path, name), str(force))
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+        except OSError as e:
+            errmsg = self.ERRMSG_WRITE_FAIL % (join(path, name), e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlWriteException(errmsg)
+        self.logger.debug(self.LOGSTR_BATCH, 'write', path, len(files))
+
+    @tc.accepts(path=str, names=list)
+    def delete_many(self, path, names):
+        """Delete many files located in a single directory.
+
+        Costs a single unlink per file plus a directory fsync per batch (or
+        per group, see self.group_commit()). Missing files (and a missing
+        directory) are considered to be deleted already.
+
+        :param path:  path to a directory
+        :param names: names of files to delete
+
+        :type path:  str
+        :type names: list
+
+        :return: amount of files actually deleted
+        :rtype:  int
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlRmException
+        """
+        deleted = 0
+        name = ''
+        try:
+            dfd = self.__open_dir(path, names)
+        except FileNotFoundError:
+            return deleted
+        except OSError as e:
+            errmsg = self.ERRMSG_DELFILE_ERR % (path, e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlRmException(errmsg)
+        try:
+            for name in names:
+                try:
+                    unlink(name, dir_fd=dfd)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+            if deleted:
+                self.__commit_dir(path, dfd)
+        except OSError as e:
+            errmsg = self.ERRMSG_DELFILE_ERR % (join(path, name), e)
+            self.logger.error(errmsg)
+            raise ex.SLRDFSCtrlRmException(errmsg)
+        finally:
+            close(dfd)
+        self.logger.debug(self.LOGSTR_BATCH, 'delete', path, deleted)
+        return deleted
 
+    @tc.accepts(path=str)
     def get_parent_mode(self, path):
         """Get permissions mode of a parent folder.
 
@@ -431,7 +1043,6 @@ class FSController(object):
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
                  slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
         """
-        tc.check_types(str, path)
         if self.enforce_abspath:
             self.__enforce_absolute(path)
         if not self.it_exists(path):
@@ -449,7 +1060,7 @@ class FSController(object):
             errmsg = self.ERRMSG_PMRET_FAIL % (path, e)
             self.logger.error(errmsg)
             raise ex.SLRDFSCtrlReadException(errmsg)
-        self.logger.info(self.LOGSTR_RET_PMODE % (path, oct(pmode)))
+        self.logger.info(self.LOGSTR_RET_PMODE, path, oct(pmode))
         return pmode
 
     def check_mode(self, path):
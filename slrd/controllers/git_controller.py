@@ -1,16 +1,255 @@
 # -*- coding: utf-8 -*-
 # vi: set ft=python sw=4 :
-"""Git repository controller."""
-import logging
+"""Git repository controller.
+
+This module keeps a vault directory under git and syncs it with a remote
+(i.e. a local bare repository or one reachable over SSH).
+
+The number of git processes spawned never depends on the number of files:
+a whole batch of changed paths is staged by a single `git add` reading
+pathspecs from stdin, and a commit is made with plumbing (write-tree,
+commit-tree, update-ref) instead of porcelain that would rescan a working
+tree. A pull is a single fetch plus a merge and reports which paths changed
+so that an index can be updated incrementally instead of being rebuilt.
+
+Commits are authored by a fixed neutral identity so that no user
+configuration is needed and nothing personal leaks into the history.
+
+Classes:
+    - GitController
+"""
+from os import environ, makedirs
+from os.path import abspath, expanduser, isabs, isdir, join, relpath
+from subprocess import PIPE, run
+from slrd.exceptions import gitctrl_exceptions as ex
 from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class GitController(object):
+    """Commit, pull and push a vault directory with git."""
+
+    GIT = 'git'
+    DEF_BRANCH = 'master'
+    DEF_REMOTE = 'origin'
+    AUTHOR_NAME = 'slrd'
+    AUTHOR_EMAIL = 'slrd@localhost'
+
+    LOGSTR_INIT = 'initialized git repository: %s'
+    LOGSTR_COMMIT = 'committed %i paths: %s'
+    LOGSTR_NOTHING = 'nothing to commit'
+    LOGSTR_PULL = 'pulled %s/%s: %s -> %s, %i paths changed'
+    LOGSTR_PUSH = 'pushed to %s/%s'
+
+    ERRMSG_GIT_FAIL = 'git %s failed (%i): %s'
+    ERRMSG_NO_GIT = 'git binary is not available: %s'
+    ERRMSG_OUTSIDE = 'path is outside of a repository: %s'
+
+    def __init__(self, repo_dir, remote=None, branch=None):
+        """Initialization method.
 
+        Nothing is touched on disk here; call self.init() first.
 
-class GPGController(object):
-    """."""
+        :param repo_dir: path to a working tree (i.e. a data storage root)
+        :param remote:   name of a remote to sync with
+        :param branch:   branch to commit to and sync
 
-    def __init__(self):
-        """."""
-        self.logger = logging.getLogger(__name__)
+        :type repo_dir: str
+        :type remote:   str
+        :type branch:   str
+        """
+        self.logger = LazyLogger(__name__)
         self.logger.debug(comlogstr.LOG_INIT_START)
-        # init stuff goes here
+        self.repo_dir = abspath(expanduser(repo_dir))
+        self.remote = remote or self.DEF_REMOTE
+        self.branch = branch or self.DEF_BRANCH
+        self._env = dict(environ, GIT_AUTHOR_NAME=self.AUTHOR_NAME,
+                         GIT_AUTHOR_EMAIL=self.AUTHOR_EMAIL,
+                         GIT_COMMITTER_NAME=self.AUTHOR_NAME,
+                         GIT_COMMITTER_EMAIL=self.AUTHOR_EMAIL,
+                         GIT_TERMINAL_PROMPT='0')
         self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __git(self, *args, stdin=None, env=None, exc=None, check=True):
+        """Run a git command in a repository.
+
+        :param args:  git arguments
+        :param stdin: data to feed to git
+        :param env:   extra environment variables
+        :param exc:   exception class to raise on failure
+        :param check: raise on a non-zero exit code
+
+        :return: standard output (trailing newline stripped)
+        :rtype:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        exc = exc or ex.SLRDGitCtrlCommitException
+        cmd_env = dict(self._env, **env) if env else self._env
+        try:
+            proc = run((self.GIT, '-C', self.repo_dir) + args, input=stdin,
+                       stdout=PIPE, stderr=PIPE, env=cmd_env)
+        except OSError as e:
+            errmsg = self.ERRMSG_NO_GIT % e
+            self.logger.critical(errmsg)
+            raise ex.SLRDUnsupportedSystemError(errmsg)
+        if check and proc.returncode:
+            errmsg = self.ERRMSG_GIT_FAIL % (
+                    args[0], proc.returncode,
+                    proc.stderr.decode(errors='replace').strip())
+            self.logger.error(errmsg)
+            raise exc(errmsg)
+        return proc.stdout.decode().rstrip('\n')
+
+    def __relpath(self, path):
+        """Get a path relative to a working tree.
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if not isabs(path):
+            return path
+        rel = relpath(path, self.repo_dir)
+        if rel == '..' or rel.startswith('../'):
+            errmsg = self.ERRMSG_OUTSIDE % path
+            self.logger.critical(errmsg)
+            raise ex.SLRDIllegalArgumentError(errmsg)
+        return rel
+
+    def init(self, remote_url=None):
+        """Create a repository (if there is none) and configure a remote.
+
+        :param remote_url: URL (or path) of a remote; a remote is left as is
+                           when not passed
+
+        :type remote_url: str
+
+        :raises: slrd.exceptions.controller_exceptions.
+                 SLRDGitCtrlCommitException
+        """
+        if not isdir(join(self.repo_dir, '.git')):
+            makedirs(self.repo_dir, mode=0o700, exist_ok=True)
+            self.__git('init', '-q')
+            self.__git('symbolic-ref', 'HEAD', 'refs/heads/' + self.branch)
+            self.logger.info(self.LOGSTR_INIT, self.repo_dir)
+        if remote_url is not None:
+            if self.__git('remote', check=False).split('\n').count(
+                    self.remote):
+                self.__git('remote', 'set-url', self.remote, remote_url)
+            else:
+                self.__git('remote', 'add', self.remote, remote_url)
+
+    def head(self):
+        """Get a commit a current branch points to.
+
+        :return: commit id or None if nothing was committed yet
+        :rtype:  str
+        """
+        return self.__git('rev-parse', '-q', '--verify', 'HEAD^{commit}',
+                          check=False) or None
+
+    def commit(self, paths, message, timestamp=None):
+        """Commit changes of many paths in one go.
+
+        Paths may be files or directories; added, modified and deleted files
+        are all staged. The cost is five git processes per batch no matter
+        how many paths are passed.
+
+        :param paths:     paths to commit (absolute or relative to a working
+                          tree)
+        :param message:   commit message
+        :param timestamp: commit date (now by default)
+
+        :type paths:     iterable of str
+        :type message:   str
+        :type timestamp: datetime.datetime object
+
+        :return: new commit id or None if there was nothing to commit
+        :rtype:  str
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.
+                 SLRDGitCtrlCommitException
+        """
+        specs = [self.__relpath(path) for path in paths]
+        if not specs:
+            return None
+        self.__git('add', '-A', '--pathspec-from-file=-',
+                   '--pathspec-file-nul',
+                   stdin='\0'.join(specs).encode() + b'\0')
+        tree = self.__git('write-tree')
+        parent = self.head()
+        if parent and self.__git('rev-parse', parent + '^{tree}') == tree:
+            self.logger.debug(self.LOGSTR_NOTHING)
+            return None
+        env = None
+        if timestamp is not None:
+            date = '%i %s' % (timestamp.timestamp(),
+                              timestamp.astimezone().strftime('%z'))
+            env = {'GIT_AUTHOR_DATE': date, 'GIT_COMMITTER_DATE': date}
+        args = ('commit-tree', tree, '-m', message)
+        if parent:
+            args += ('-p', parent)
+        commit = self.__git(*args, env=env)
+        # old value guards against a concurrent update of a branch
+        self.__git('update-ref', 'HEAD', commit, parent or '')
+        self.logger.info(self.LOGSTR_COMMIT, len(specs), commit)
+        return commit
+
+    def changed_paths(self, old, new):
+        """Get paths that differ between two commits.
+
+        :param old: commit id (None for an empty history)
+        :param new: commit id
+
+        :type old: str
+        :type new: str
+
+        :return: sorted absolute paths of added, modified and deleted files
+        :rtype:  list
+        """
+        if old == new or new is None:
+            return []
+        if old is None:
+            out = self.__git('ls-tree', '-r', '-z', '--name-only', new)
+        else:
+            out = self.__git('diff-tree', '-r', '-z', '--name-only',
+                             '--no-renames', old, new)
+        return sorted(join(self.repo_dir, path)
+                      for path in out.split('\0') if path)
+
+    def pull(self):
+        """Fetch a remote branch and merge it into a current one.
+
+        A merge that can't be completed automatically is aborted and leaves
+        a working tree as it was.
+
+        :return: sorted absolute paths changed by a pull
+        :rtype:  list
+
+        :raises: slrd.exceptions.controller_exceptions.
+                 SLRDGitCtrlSyncException
+        """
+        sync = ex.SLRDGitCtrlSyncException
+        old = self.head()
+        self.__git('fetch', '-q', self.remote, self.branch, exc=sync)
+        try:
+            self.__git('merge', '-q', '--no-edit', 'FETCH_HEAD', exc=sync)
+        except sync:
+            self.__git('merge', '--abort', check=False)
+            raise
+        new = self.head()
+        changed = self.changed_paths(old, new)
+        self.logger.info(self.LOGSTR_PULL, self.remote, self.branch, old, new,
+                         len(changed))
+        return changed
+
+    def push(self):
+        """Push a current branch to a remote.
+
+        :raises: slrd.exceptions.controller_exceptions.
+                 SLRDGitCtrlSyncException
+        """
+        self.__git('push', '-q', self.remote,
+                   'HEAD:refs/heads/' + self.branch,
+                   exc=ex.SLRDGitCtrlSyncException)
+        self.logger.info(self.LOGSTR_PUSH, self.remote, self.branch)
@@ -6,78 +6,530 @@ This module provides a way to encrypt and decrypt data with GPG using a
 single GPG key. All data is padded to the same length before being encrypted.
 The length can be specified on creation of GPGController class instance.
 
-Todo:
-    - implement methods
+Arbitrary-length data that is not stored in fixed-size containers (i.e. an
+index snapshot) can be encrypted with encrypt_blob()/decrypt_blob(), and
+streams too large to be held in memory (i.e. a backup archive) with
+encrypt_stream()/decrypt_stream().
+
+Every GPG operation is a separate gpg process which takes tens of
+milliseconds, mostly waiting on process startup and gpg-agent. Batches of
+blocks should go through encrypt_many()/decrypt_many(): they run operations on
+a bounded pool of worker threads (each driving its own gpg process) that lives
+as long as the controller does, and keep results in input order.
+
+Optionally the controller can work in a hybrid mode: a GPG key is used only to
+wrap a random data key (one per vault or per epoch) and every block is sealed
+in-process with AES-256-GCM under that data key. Blocks are still padded to
+pt_length so encrypted blocks keep a uniform size. The GPG private key never
+leaves gpg-agent; it's only needed once to unwrap a data key. Hybrid mode
+requires the optional cryptography package.
 """
+from base64 import b64encode
+from binascii import a2b_base64
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
 import gnupg
-import logging
+from os import cpu_count, urandom
+from os.path import expanduser
+from struct import Struct
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # hybrid mode is unavailable
+    AESGCM = None
+    InvalidTag = ValueError
+from slrd.exceptions import gpgctrl_exceptions as ex
 from slrd.strings import comlogstr
+from slrd.utils import random_utils
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class _ViewReader(object):
+    """Minimal binary file object over a bytes-like object.
+
+    Lets gpg read a (memory-mapped) block in chunks: read() hands out
+    zero-copy slices instead of a copy of a whole block.
+    """
+
+    __slots__ = ('view', 'offset')
+
+    def __init__(self, data):
+        """."""
+        self.view = memoryview(data).cast('B')
+        self.offset = 0
+
+    def read(self, size=-1):
+        """Read up to size bytes (all remaining if size is negative)."""
+        start = self.offset
+        end = len(self.view) if size < 0 else start + size
+        self.offset = min(end, len(self.view))
+        return self.view[start:self.offset]
 
 
 class GPGController(object):
     """Encrypt and decrypt data with GnuPG."""
 
-    def __init__(self, gpg_key_id, gpg_home_dir='~/.gnupg/', pt_length=1000):
+    PAD_HEADER = Struct('>I')
+    MAX_WORKERS = 8
+    HYBRID_MAGIC = 'SLRD-AEAD-1 '
+    DATA_KEY_LENGTH = 32
+    NONCE_LENGTH = 12
+    EPOCH_LENGTH = 16
+    HEADER_MAX = len(HYBRID_MAGIC) + EPOCH_LENGTH + 1
+
+    LOGSTR_ENCRYPT_OK = 'encrypted blob: %i bytes'
+    LOGSTR_DECRYPT_OK = 'decrypted blob: %i bytes'
+    LOGSTR_POOL_START = 'started gpg worker pool: %i workers'
+    LOGSTR_BATCH_OK = '%s batch done: %i blocks'
+    LOGSTR_DATA_KEY = 'loaded data key: epoch %s, current: %s'
+    LOGSTR_STREAM_OK = '%s stream into: %s'
+
+    ERRMSG_ENCRYPT_FAIL = 'failed to encrypt data: %s'
+    ERRMSG_DECRYPT_FAIL = 'failed to decrypt data: %s'
+    ERRMSG_PT_TOO_LONG = 'data is too long to pad: %i bytes, max: %i'
+    ERRMSG_BAD_PADDING = 'malformed padded block: %i bytes'
+    ERRMSG_NO_DATA_KEY = 'no usable data key for: %s'
+    ERRMSG_NO_AEAD = 'hybrid mode requires the cryptography package'
+
+    def __init__(self, gpg_key_id, gpg_home_dir='~/.gnupg/', pt_length=1000,
+                 workers=None):
         """Initialization method.
 
         :param gpg_key_id:   ID of GPG key to use for encryption/decryption
         :param gpg_home_dir: path to GnuPG home directory
         :param pt_length:    length of a plain text block to feed to GPG.
                              Default is 1000.
+        :param workers:      maximum amount of concurrent gpg processes used
+                             by batch operations. Defaults to CPU count
+                             (capped by MAX_WORKERS).
 
         :type gpg_key_id: str
         :type gpg_home_dir: str
         :type pt_length: int
+        :type workers: int
 
         :raise: <???>
         """
-        self.logger = logging.getLogger(__name__)
+        self.logger = LazyLogger(__name__)
         self.logger.debug(comlogstr.LOG_INIT_START)
 
         self.gpg_key_id = gpg_key_id
-        self.gpg = gnupg.GPG(gnupghome='???')  # TODO
+        self.gpg_home_dir = expanduser(gpg_home_dir)
+        self.pt_length = pt_length
+        self.gpg = gnupg.GPG(gnupghome=self.gpg_home_dir)
+        self.workers = workers or min(cpu_count() or 1, self.MAX_WORKERS)
+        self._pool = None
+        self._data_keys = {}  # epoch -> AEAD cipher
+        self._data_epoch = None
 
         self.logger.debug(comlogstr.LOG_INIT_END)
 
     def pad(self, data):
-        """Pad data to the length equal to len(self.pt_length).
+        """Pad data to the length equal to self.pt_length.
+
+        A padded block is a 4-byte big-endian length of data followed by data
+        itself and random filler bytes.
 
         :param data: data to pad
-        :type data: str
+        :type data: bytes
 
         :return: padded data
-        :rtype: str
+        :rtype: bytes
 
-        :raise: <???>
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        return bytes(self.pad_many((data,))[0])
+
+    def pad_many(self, blocks):
+        """Pad many blocks at once (see self.pad()).
+
+        Blocks are laid out in a single preallocated buffer and filler of
+        all of them comes from a single draw of random bytes, instead of
+        a random draw and a concatenation per block.
+
+        :param blocks: data to pad
+        :type blocks: iterable of bytes
+
+        :return: read-only views of padded blocks (slices of a single buffer)
+        :rtype: list of memoryview
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        pt_length, hsize = self.pt_length, self.PAD_HEADER.size
+        blocks = [data.encode() if isinstance(data, str) else data
+                  for data in blocks]
+        for data in blocks:
+            if len(data) > pt_length - hsize:
+                errmsg = self.ERRMSG_PT_TOO_LONG % (len(data),
+                                                    self.max_data_len)
+                self.logger.error(errmsg)
+                raise ex.SLRDIllegalArgumentError(errmsg)
+        buf = bytearray(pt_length * len(blocks))
+        view = memoryview(buf)
+        filler = memoryview(random_utils.get_random_bytes(
+                (pt_length - hsize) * len(blocks) -
+                sum(len(data) for data in blocks)))
+        pack_into = self.PAD_HEADER.pack_into
+        offset = taken = 0
+        for data in blocks:
+            pack_into(buf, offset, len(data))
+            start = offset + hsize + len(data)
+            view[offset + hsize:start] = data
+            offset += pt_length
+            view[start:offset] = filler[taken:taken + offset - start]
+            taken += offset - start
+        view = view.toreadonly()
+        return [view[offset:offset + pt_length]
+                for offset in range(0, len(buf), pt_length)]
+
+    def unpad(self, block):
+        """Strip padding added by self.pad().
+
+        A block length is public, but a length header is secret: it's never
+        branched on. The whole block is always copied, a header is checked
+        with arithmetic and a bad one is only reported at the very end, so a
+        valid and a malformed header take the same path through this method
+        (as far as Python lets one control timing).
+
+        :param block: padded data
+        :type block: bytes
+
+        :return: data
+        :rtype: bytes
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
         """
+        if len(block) != self.pt_length:
+            errmsg = self.ERRMSG_BAD_PADDING % len(block)
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlDecryptException(errmsg)
+        length = self.PAD_HEADER.unpack_from(block)[0]
+        # 1 if length > self.max_data_len: both are below 2 ** 32, so
+        # a difference is negative (all high bits set) only then
+        bad = ((self.max_data_len - length) >> 32) & 1
+        payload = bytes(memoryview(block)[self.PAD_HEADER.size:])
+        data = payload[:length * (1 - bad)]
+        if bad:
+            errmsg = self.ERRMSG_BAD_PADDING % len(block)
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlDecryptException(errmsg)
+        return data
+
+    @property
+    def max_data_len(self):
+        """Get a maximum length of data that fits into a single block."""
+        return self.pt_length - self.PAD_HEADER.size
 
     def encrypt(self, data):
         """Encrypt data with GPG.
 
+        Data is padded to self.pt_length first so that all encrypted blocks
+        have the same length.
+
         :param data: data to encrypt
-        :type data: str
+        :type data: bytes
 
-        :return: encrypted data
-        :rtype: <???> # TODO: what type?
+        :return: ASCII-armored encrypted data
+        :rtype: str
 
-        :raise: <???>
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlEncryptException
         """
-
-        # Make sure len(data) < self.pt_length
-
-        # Pad data first
-        # self.pad(data)
+        return self.encrypt_blob(self.pad(data))
 
     def decrypt(self, data):
         """Decrypt data with PGP.
 
-        :param data: data to decrypt
-        :type data: str
+        :param data: ASCII-armored data encrypted with self.encrypt()
+        :type data: str or bytes-like (i.e. memoryview of a mapped file)
+
+        :return: decrypted data with padding stripped
+        :rtype: bytes
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
+        """
+        return self.unpad(self.decrypt_blob(data))
+
+    def __gpg_encrypt(self, data):
+        """Encrypt data with a GPG key (a gpg process is spawned)."""
+        crypt = self.gpg.encrypt(data, self.gpg_key_id, armor=True,
+                                 always_trust=True)
+        if not crypt.ok:
+            errmsg = self.ERRMSG_ENCRYPT_FAIL % crypt.status
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlEncryptException(errmsg)
+        self.logger.debug(self.LOGSTR_ENCRYPT_OK, len(data))
+        return str(crypt)
+
+    def __gpg_decrypt(self, data):
+        """Decrypt data with a GPG key (a gpg process is spawned).
+
+        Bytes-like data (i.e. a mapped file) is streamed to gpg in chunks
+        without being copied.
+        """
+        if isinstance(data, str):
+            crypt = self.gpg.decrypt(data)
+        else:
+            crypt = self.gpg.decrypt_file(_ViewReader(data))
+        if not crypt.ok:
+            errmsg = self.ERRMSG_DECRYPT_FAIL % crypt.status
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlDecryptException(errmsg)
+        self.logger.debug(self.LOGSTR_DECRYPT_OK, len(crypt.data))
+        return crypt.data
+
+    def __seal(self, data):
+        """Encrypt data in-process with a current data key."""
+        epoch = self._data_epoch
+        nonce = urandom(self.NONCE_LENGTH)
+        header = ('%s%s:' % (self.HYBRID_MAGIC, epoch)).encode()
+        sealed = self._data_keys[epoch].encrypt(nonce, bytes(data), header)
+        return header.decode() + b64encode(nonce + sealed).decode() + '\n'
+
+    def __open(self, data):
+        """Decrypt data sealed with one of loaded data keys.
+
+        Bytes-like data is decoded in place: the only copy made is the
+        decoded cipher text (AES-GCM authenticates it, so lax base64 decoding
+        can't let tampered data through).
+        """
+        if isinstance(data, str):
+            data = data.encode('ascii', 'replace')
+        view = memoryview(data)
+        header = ''
+        try:
+            sep = bytes(view[:self.HEADER_MAX]).index(b':') + 1
+            header = str(view[:sep], 'ascii')
+            aead = self._data_keys[header[len(self.HYBRID_MAGIC):-1]]
+            raw = memoryview(a2b_base64(view[sep:]))
+            return aead.decrypt(raw[:self.NONCE_LENGTH],
+                                raw[self.NONCE_LENGTH:], view[:sep])
+        except KeyError:
+            errmsg = self.ERRMSG_NO_DATA_KEY % header
+        except (ValueError, InvalidTag) as e:
+            errmsg = self.ERRMSG_DECRYPT_FAIL % type(e).__name__
+        self.logger.error(errmsg)
+        raise ex.SLRDGPGCtrlDecryptException(errmsg)
+
+    def is_hybrid(self, data):
+        """Check whether data was sealed with a data key (not GPG).
+
+        :param data: encrypted data
+        :type data:  str or bytes-like
+
+        :rtype: bool
+        """
+        magic = self.HYBRID_MAGIC
+        if isinstance(data, str):
+            return data.startswith(magic)
+        return bytes(data[:len(magic)]) == magic.encode()
+
+    @property
+    def hybrid(self):
+        """Check whether new data is sealed with a data key."""
+        return self._data_epoch is not None
+
+    def generate_data_key(self):
+        """Generate a new data key wrapped (encrypted) with a GPG key.
+
+        The key is not loaded; pass the result to self.load_data_key().
+
+        :return: ASCII-armored wrapped data key
+        :rtype:  str
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlEncryptException
+        """
+        return self.__gpg_encrypt(urandom(self.DATA_KEY_LENGTH))
+
+    def load_data_key(self, wrapped, current=True):
+        """Unwrap a data key with a GPG key and switch to hybrid mode.
+
+        Data keys are identified by an epoch (a digest of a wrapped key).
+        Any amount of them can be loaded to decrypt data sealed in previous
+        epochs; only the current one is used to seal new data.
+
+        :param wrapped: data key returned by self.generate_data_key()
+        :param current: use this key to seal new data
+
+        :type wrapped: str
+        :type current: bool
+
+        :return: epoch of a data key
+        :rtype:  str
+
+        :raise: slrd.exceptions.common_exceptions.SLRDUnsupportedSystemError,
+                slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
+        """
+        if AESGCM is None:
+            self.logger.critical(self.ERRMSG_NO_AEAD)
+            raise ex.SLRDUnsupportedSystemError(self.ERRMSG_NO_AEAD)
+        epoch = sha256(wrapped.encode()).hexdigest()[:self.EPOCH_LENGTH]
+        if epoch not in self._data_keys:
+            raw = self.__gpg_decrypt(wrapped)
+            if len(raw) != self.DATA_KEY_LENGTH:
+                errmsg = self.ERRMSG_NO_DATA_KEY % epoch
+                self.logger.error(errmsg)
+                raise ex.SLRDGPGCtrlDecryptException(errmsg)
+            self._data_keys[epoch] = AESGCM(raw)
+        if current:
+            self._data_epoch = epoch
+        self.logger.info(self.LOGSTR_DATA_KEY, epoch, current)
+        return epoch
+
+    def unload_data_keys(self):
+        """Forget all data keys and switch back to GPG-only mode."""
+        self._data_keys = {}
+        self._data_epoch = None
+
+    def encrypt_blob(self, data):
+        """Encrypt data of an arbitrary length (no padding).
+
+        Data is sealed with a current data key in hybrid mode and encrypted
+        with GPG otherwise.
+
+        :param data: data to encrypt
+        :type data: bytes
+
+        :return: ASCII-armored encrypted data
+        :rtype: str
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlEncryptException
+        """
+        if self._data_epoch is not None:
+            return self.__seal(data)
+        return self.__gpg_encrypt(data)
+
+    def decrypt_blob(self, data):
+        """Decrypt data encrypted with self.encrypt_blob().
+
+        Both GPG and data key sealed data is accepted regardless of a mode.
+
+        :param data: ASCII-armored encrypted data
+        :type data: str or bytes-like (i.e. memoryview of a mapped file)
 
         :return: decrypted data
-        :rtype: <???> # TODO: what type?
+        :rtype: bytes
 
-        :raise: <???>
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
+        """
+        if self.is_hybrid(data):
+            return self.__open(data)
+        return self.__gpg_decrypt(data)
+
+    def encrypt_stream(self, source, output):
+        """Encrypt a stream of an arbitrary length with GPG into a file.
+
+        Data is read from a source in chunks while gpg is running, so it
+        never has to fit in memory. Output is binary (no armor) and not
+        compressed by gpg: compress data before it's encrypted if needed.
+
+        :param source: binary file object to read data from (i.e. a pipe)
+        :param output: path to a file gpg creates
+
+        :type source: file object
+        :type output: str
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlEncryptException
+        """
+        crypt = self.gpg.encrypt_file(source, self.gpg_key_id, armor=False,
+                                      always_trust=True, output=output,
+                                      extra_args=['--compress-algo', 'none'])
+        if not crypt.ok:
+            errmsg = self.ERRMSG_ENCRYPT_FAIL % crypt.status
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlEncryptException(errmsg)
+        self.logger.debug(self.LOGSTR_STREAM_OK, 'encrypted', output)
+
+    def decrypt_stream(self, source, output):
+        """Decrypt a stream encrypted with self.encrypt_stream() into a file.
+
+        :param source: binary file object to read encrypted data from
+        :param output: path to a file gpg creates
+
+        :type source: file object
+        :type output: str
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
+        """
+        crypt = self.gpg.decrypt_file(source, output=output)
+        if not crypt.ok:
+            errmsg = self.ERRMSG_DECRYPT_FAIL % crypt.status
+            self.logger.error(errmsg)
+            raise ex.SLRDGPGCtrlDecryptException(errmsg)
+        self.logger.debug(self.LOGSTR_STREAM_OK, 'decrypted', output)
+
+    def __get_pool(self):
+        """Get a worker pool (started on first use)."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='slrd-gpg')
+            self.logger.debug(self.LOGSTR_POOL_START, self.workers)
+        return self._pool
+
+    def encrypt_many(self, blocks):
+        """Encrypt many blocks with GPG concurrently.
+
+        All blocks are padded before any gpg process is started so that a
+        block that is too long fails the batch early.
+
+        :param blocks: data to encrypt
+        :type blocks:  iterable of bytes
+
+        :return: ASCII-armored encrypted blocks in input order
+        :rtype:  list
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlEncryptException
+        """
+        padded = self.pad_many(blocks)
+        if len(padded) < 2 or self._data_epoch is not None:
+            return [self.encrypt_blob(block) for block in padded]
+        result = list(self.__get_pool().map(self.encrypt_blob, padded))
+        self.logger.debug(self.LOGSTR_BATCH_OK, 'encrypt', len(result))
+        return result
+
+    def decrypt_many(self, blocks):
+        """Decrypt many blocks encrypted with self.encrypt() concurrently.
+
+        :param blocks: ASCII-armored encrypted blocks
+        :type blocks:  iterable of str or bytes-like
+
+        :return: decrypted blocks with padding stripped in input order
+        :rtype:  list
+
+        :raise: slrd.exceptions.controller_exceptions.
+                SLRDGPGCtrlDecryptException
         """
+        result = list(blocks)
+        gpg_idx = []
+        for idx, block in enumerate(result):
+            if self.is_hybrid(block):
+                result[idx] = self.decrypt(block)
+            else:
+                gpg_idx.append(idx)
+        if len(gpg_idx) < 2:
+            for idx in gpg_idx:
+                result[idx] = self.decrypt(result[idx])
+            return result
+        decrypted = self.__get_pool().map(self.decrypt,
+                                          [result[idx] for idx in gpg_idx])
+        for idx, block in zip(gpg_idx, decrypted):
+            result[idx] = block
+        self.logger.debug(self.LOGSTR_BATCH_OK, 'decrypt', len(result))
+        return result
 
-        # Make sure len(data) == len(pt_length) + GPG overhead
+    def close(self):
+        """Stop a worker pool (it's started again on demand)."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -20,5 +20,29 @@ class FSControllerExceptions(object):
         self.SLRDFSCtrlWriteException = SLRDFSCtrlWriteException
 
 
+class GPGControllerExceptions(object):
+    """Encapsulate all exceptions used in slrd.controllers.gpg_controller."""
+
+    def __init__(self):
+        """Initialization method."""
+        self.SLRDIllegalArgumentError = SLRDIllegalArgumentError
+        self.SLRDUnsupportedSystemError = SLRDUnsupportedSystemError
+        self.SLRDGPGCtrlEncryptException = SLRDGPGCtrlEncryptException
+        self.SLRDGPGCtrlDecryptException = SLRDGPGCtrlDecryptException
+
+
+class GitControllerExceptions(object):
+    """Encapsulate all exceptions used in slrd.controllers.git_controller."""
+
+    def __init__(self):
+        """Initialization method."""
+        self.SLRDIllegalArgumentError = SLRDIllegalArgumentError
+        self.SLRDUnsupportedSystemError = SLRDUnsupportedSystemError
+        self.SLRDGitCtrlCommitException = SLRDGitCtrlCommitException
+        self.SLRDGitCtrlSyncException = SLRDGitCtrlSyncException
+
+
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 fsctrl_exceptions = FSControllerExceptions()
+gpgctrl_exceptions = GPGControllerExceptions()
+gitctrl_exceptions = GitControllerExceptions()
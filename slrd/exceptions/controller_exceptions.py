@@ -9,6 +9,11 @@ Classes:
     - SLRDFSCtrlCreateException
     - SLRDFSCtrlRmException
     - SLRDFSCtrlReadException
+    - SLRDFSCtrlWriteException
+    - SLRDGPGCtrlEncryptException
+    - SLRDGPGCtrlDecryptException
+    - SLRDGitCtrlCommitException
+    - SLRDGitCtrlSyncException
 """
 from slrd.exceptions import SLRDRuntimeException, SLRDImplementationError
 
@@ -31,3 +36,19 @@ class SLRDFSCtrlReadException(SLRDRuntimeException):
 
 class SLRDFSCtrlWriteException(SLRDRuntimeException):
     """XOPOS file system controller failed to write to a file."""
+
+
+class SLRDGPGCtrlEncryptException(SLRDRuntimeException):
+    """SLRD GPG controller failed to encrypt data."""
+
+
+class SLRDGPGCtrlDecryptException(SLRDRuntimeException):
+    """SLRD GPG controller failed to decrypt data."""
+
+
+class SLRDGitCtrlCommitException(SLRDRuntimeException):
+    """SLRD git controller failed to commit changes."""
+
+
+class SLRDGitCtrlSyncException(SLRDRuntimeException):
+    """SLRD git controller failed to pull from or push to a remote."""
@@ -6,3 +6,39 @@ from slrd.exceptions import SLRDRuntimeException, SLRDImplementationError
 
 class SLRDBaseDirAllocationError(SLRDRuntimeException):
     """SLRD failed to allocate a base directory for storing a data."""
+
+
+class SLRDExecutorBusyError(SLRDRuntimeException):
+    """SLRD executor has too much pending work to accept more."""
+
+
+class SLRDSharedIndexError(SLRDRuntimeException):
+    """SLRD shared index is unavailable or malformed."""
+
+
+class SLRDTemplateValidationError(SLRDRuntimeException):
+    """SLRD linkfile keys do not satisfy a template they are created with."""
+
+    def __init__(self, msg, errors=()):
+        """Initialization method.
+
+        :param msg:    message to print when being raised
+        :param errors: every single problem found
+
+        :type msg:    str
+        :type errors: iterable of str
+        """
+        super().__init__(msg)
+        self.errors = tuple(errors)
+
+
+class SLRDImportError(SLRDRuntimeException):
+    """SLRD failed to parse an export file being imported."""
+
+
+class SLRDBackupError(SLRDRuntimeException):
+    """SLRD failed to create or restore a backup archive."""
+
+
+class SLRDKeyRotationError(SLRDRuntimeException):
+    """SLRD failed to re-encrypt containers with a new GPG key."""
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Per-process backend state shared by all request handlers.
+
+A production server runs several worker processes with many threads (or an
+event loop) each. Every process gets one set of bounded executors and one
+view of a shared index (see slrd.managers.shared_index_manager), shared by
+all of its request handlers. The first process to take a writer lock builds
+the index, keeps it in sync with a base directory and publishes every change;
+all other processes only map a published index, so they serve their first
+request without building anything. When a writer exits its lock is
+released and the next process started (i.e. a replacement worker) takes
+over. Templates are compiled into validators once per process (see
+slrd.managers.template_manager).
+
+If a shared index can't be used (there is no private RAM backed directory
+for it, a published file is malformed or nothing is published in time), a
+process falls back to an index of its own (built and watched like the one a
+writer keeps) for the rest of its life.
+
+Given a GPG controller, a writer restores its index from an encrypted
+snapshot and reconciles only files changed since then (see
+slrd.managers.snapshot_manager) instead of parsing a whole base directory;
+a snapshot is refreshed when a writer shuts down. It also attaches
+containers to the index, so linkfiles stored in them (i.e. imported ones)
+are indexed; without a GPG controller only linkfiles/ is.
+
+State is created lazily on first use and is re-created in a child after
+a fork (i.e. when a server preloads an app before starting workers), since
+threads, locks and inotify descriptors don't survive a fork.
+
+Classes:
+    - BackendManager
+"""
+from os import getpid, register_at_fork
+from os.path import abspath, expanduser
+from threading import Lock
+from slrd.exceptions import SLRDRuntimeException, SLRDSharedIndexError
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.executor_manager import ExecutorManager
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.shared_index_manager import SharedIndexManager
+from slrd.managers.snapshot_manager import SnapshotManager
+from slrd.managers.template_manager import TemplateManager
+from slrd.managers.watch_manager import WatchManager
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class BackendManager(object):
+    """Lazily create and share backend state within a process."""
+
+    WAIT_TIMEOUT = 30.0  # seconds to wait for a first published index
+
+    LOGSTR_STARTED = 'backend started in process %i: %s, writer: %s'
+    LOGSTR_STOPPED = 'backend stopped in process %i'
+    LOGSTR_PUBLISH_FAIL = 'failed to publish a shared index: %s'
+    LOGSTR_SNAPSHOT_FAIL = 'failed to save an index snapshot: %s'
+    LOGSTR_LOCAL = 'shared index is unusable, using a process-local ' \
+                   'index: %s'
+
+    def __init__(self, base_dir='~/.slrd/', watch=True, gpgctrl=None,
+                 **executor_args):
+        """Initialization method.
+
+        Nothing is created here; see self.index and self.executors.
+
+        :param base_dir:      path to a data storage root
+        :param watch:         keep a shared index in sync with a base
+                              directory (in a writer process)
+        :param gpgctrl:       controller to encrypt an index snapshot and
+                              decrypt containers with (an index is built
+                              from scratch on every start and linkfiles in
+                              containers are left out without one)
+        :param executor_args: arguments to create ExecutorManager with
+
+        :type base_dir:      str
+        :type watch:         bool
+        :type gpgctrl:       slrd.controllers.gpg_controller.GPGController
+        :type executor_args: dict
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        self.watch = watch
+        self.gpgctrl = gpgctrl
+        self.executor_args = executor_args
+        self._lock = Lock()
+        self._pid = None
+        self._shared = None
+        self._source = None  # index a writer publishes
+        self._snapshot = None
+        self._local = None   # index used instead of a shared one
+        self._watcher = None
+        self._executors = None
+        self._validators = None
+        # a lock held by another thread at fork time is never released in
+        # a child
+        register_at_fork(after_in_child=self.__reset_lock)
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __reset_lock(self):
+        """Replace a lock inherited from a parent process."""
+        self._lock = Lock()
+
+    def __ensure(self):
+        """Create process state if it doesn't exist in this process yet."""
+        if self._pid == getpid():
+            return
+        with self._lock:
+            if self._pid == getpid():
+                return
+            # state inherited from a parent process (if any) is unusable
+            self._executors = ExecutorManager(**self.executor_args)
+            self._shared = SharedIndexManager(self.base_dir)
+            self._validators = TemplateManager(self.__get_template)
+            self._source = self._watcher = self._snapshot = None
+            self._local = None
+            try:
+                writer = self._shared.acquire_writer()
+            except SLRDSharedIndexError as e:
+                self.logger.error(self.LOGSTR_LOCAL, e)
+                writer = False
+                self.__start_local()
+            if writer:
+                self._source = self.__new_index()
+                load = self._source.load
+                if self.gpgctrl is not None:
+                    self._snapshot = SnapshotManager(self._source,
+                                                     self.gpgctrl)
+                    load = self._snapshot.load_index
+                self._executors.run(ExecutorManager.IO, load)
+                self.__publish(0)
+                if self.watch:
+                    self._watcher = WatchManager(self._source,
+                                                 on_apply=self.__publish)
+                    self._watcher.start()
+            self._pid = getpid()
+            self.logger.info(self.LOGSTR_STARTED, self._pid, self.base_dir,
+                             self._shared.is_writer)
+
+    def __start_local(self):
+        """Use a process-local index from now on (lock must be held).
+
+        A writer falls back to an index it publishes, any other process
+        builds one of its own. It's built right in a calling thread: that
+        may be an executor thread already (see slrd.views.views), which must
+        not wait for another one.
+        """
+        if self._source is None:
+            self._source = self.__new_index()
+            self._source.load()
+            if self.watch:
+                self._watcher = WatchManager(self._source)
+                self._watcher.start()
+        self._local = self._source
+
+    def __new_index(self):
+        """Create an index (attached to containers if they can be read)."""
+        containers = None
+        if self.gpgctrl is not None:
+            containers = ContainerManager(self.base_dir, self.gpgctrl)
+        return IndexManager(self.base_dir, containers=containers)
+
+    def __get_template(self, name):
+        """Get a template out of the latest published index."""
+        return self.index.get_template(name)
+
+    def __publish(self, count):
+        """Publish an index after a watcher re-indexed changed files."""
+        try:
+            self._shared.publish(self._source)
+        except SLRDRuntimeException as e:
+            self.logger.error(self.LOGSTR_PUBLISH_FAIL, e)
+
+    @property
+    def index(self):
+        """Get the latest published generation of a shared index.
+
+        Hold on to a returned index while serving a single request: it stays
+        consistent even if a new generation is published meanwhile. A
+        process-local index is returned if a shared one is unusable.
+
+        :rtype: slrd.managers.shared_index_manager.SharedIndex or
+                slrd.managers.index_manager.IndexManager
+        """
+        self.__ensure()
+        if self._local is None:
+            try:
+                return self._shared.wait(self.WAIT_TIMEOUT)
+            except SLRDSharedIndexError as e:
+                with self._lock:
+                    if self._local is None:
+                        self.logger.error(self.LOGSTR_LOCAL, e)
+                        self.__start_local()
+        return self._local
+
+    @property
+    def executors(self):
+        """Get executors of this process.
+
+        :rtype: slrd.managers.executor_manager.ExecutorManager
+        """
+        self.__ensure()
+        return self._executors
+
+    @property
+    def validators(self):
+        """Get compiled template validators of this process.
+
+        :rtype: slrd.managers.template_manager.TemplateManager
+        """
+        self.__ensure()
+        return self._validators
+
+    def shutdown(self):
+        """Stop a watcher and executors and give a writer lock up.
+
+        A writer saves an index snapshot first (if it keeps one).
+        """
+        with self._lock:
+            if self._pid != getpid():
+                return
+            if self._watcher is not None:
+                self._watcher.stop()
+            if self._snapshot is not None:
+                try:
+                    self._snapshot.save()
+                except SLRDRuntimeException as e:
+                    self.logger.error(self.LOGSTR_SNAPSHOT_FAIL, e)
+            self._shared.release_writer()
+            self._executors.shutdown()
+            self._pid = self._shared = self._source = self._watcher = \
+                self._snapshot = self._local = self._executors = \
+                self._validators = None
+            self.logger.info(self.LOGSTR_STOPPED, getpid())
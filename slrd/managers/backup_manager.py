@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Streaming encrypted backups of a base directory.
+
+A whole base directory (containers, keyfiles, linkfiles, templates and keys)
+goes into a single archive file, so a backup is one sequential write instead
+of a copy of every file (slow on network file systems) and it doesn't tell
+how many containers there are. Files flow through a pipeline and only a
+single chunk of a single file is ever kept in RAM:
+
+1. walk:     files are listed with FSController.walk_dir() (derived and
+             temporary files like index snapshots and import checkpoints are
+             left out);
+2. read:     every file is memory-mapped and read in chunks (containers are
+             copied as they are, nothing is decrypted);
+3. pack:     chunks are framed as a tar stream and gzip-compressed;
+4. encrypt:  a compressed stream is piped into a gpg process
+             (GPGController.encrypt_stream()) which writes an archive;
+5. commit:   an archive appears atomically once it's complete
+             (FSController.atomic_output()).
+
+Packing runs in a separate thread and reports progress (files, bytes and
+throughput) as it goes. A restore decrypts an archive into a temporary file
+inside a target directory and unpacks it from there (both are bounded by a
+disk rather than RAM).
+
+Classes:
+    - BackupManager
+"""
+from os import close, listdir, makedirs, pipe, stat, unlink
+from os import open as osopen
+from os import O_WRONLY, O_CREAT, O_EXCL, O_CLOEXEC
+from os.path import abspath, expanduser, join, relpath
+import tarfile
+from threading import Thread
+from time import monotonic
+from secrets import token_hex
+import zlib
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDBackupError, SLRDFSCtrlReadException
+from slrd.managers.import_manager import ImportManager
+from slrd.managers.snapshot_manager import SnapshotManager
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class BackupManager(object):
+    """Back up a base directory into a single encrypted archive."""
+
+    ARCHIVE_MODE = 0o600
+    DIR_MODE = 0o700
+    # containers are ciphertext in ASCII armor: there are no repeated strings
+    # to find, entropy coding alone takes a quarter off at 3x the speed
+    COMPRESS_LEVEL = 1
+    COMPRESS_STRATEGY = zlib.Z_HUFFMAN_ONLY
+    GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip header and trailer
+    CHUNK_SIZE = 1024 * 1024
+    PROGRESS_INTERVAL = 1.0  # seconds between progress log lines
+    MB = 1024 * 1024
+    # never backed up: rebuilt from other files or only exist temporarily
+    SKIP_NAMES = ('.git', SnapshotManager.SNAPSHOT_NAME,
+                  ImportManager.CHECKPOINT_NAME)
+
+    LOGSTR_START = 'backing up %s into %s: %i files, %i bytes'
+    LOGSTR_PROGRESS = 'backup progress: %i/%i files, %i/%i bytes, %.1f MB/s'
+    LOGSTR_DONE = 'backup done: %i files, %i bytes -> %i bytes in %.1fs ' \
+                  '(%.1f MB/s)'
+    LOGSTR_VANISHED = 'file removed while backing up, skipped: %s'
+    LOGSTR_RESTORED = 'restored %i files (%i bytes) into %s'
+
+    ERRMSG_PACK_FAIL = 'failed to pack a backup archive: %s'
+    ERRMSG_NOT_EMPTY = 'restore target is not empty: %s'
+    ERRMSG_BAD_MEMBER = 'unexpected archive member: %s'
+    ERRMSG_UNPACK_FAIL = 'failed to unpack a backup archive: %s'
+
+    def __init__(self, base_dir, gpgctrl):
+        """Initialization method.
+
+        :param base_dir: path to a data storage root
+        :param gpgctrl:  controller to encrypt and decrypt archives with
+
+        :type base_dir: str
+        :type gpgctrl:  slrd.controllers.gpg_controller.GPGController
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        self.gpgctrl = gpgctrl
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    @staticmethod
+    def __stats(files, total_files, size, total_size, started):
+        """Get a progress report."""
+        elapsed = monotonic() - started
+        return {
+            'files': files,
+            'total_files': total_files,
+            'bytes': size,
+            'total_bytes': total_size,
+            'elapsed': elapsed,
+            'rate': size / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def __pack(self, files, out, stats, progress):
+        """Write files as a gzip-compressed tar stream.
+
+        Files are framed by hand (a header, content streamed out of a mapping,
+        zero padding) since a size in a header has to be one of a mapping,
+        not of an earlier stat() call.
+
+        :param files:    [(absolute file path, signature)]
+        :param out:      binary file object to write a stream to
+        :param stats:    progress report updated in place
+        :param progress: function called with stats after every file
+        """
+        started = monotonic()
+        logged = started
+        total_files = len(files)
+        total_size = sum(sig[1] for _, sig in files)
+        done = size = 0
+        gz = zlib.compressobj(self.COMPRESS_LEVEL, zlib.DEFLATED,
+                              self.GZIP_WBITS, zlib.DEF_MEM_LEVEL,
+                              self.COMPRESS_STRATEGY)
+        for path, sig in files:
+            try:
+                with fsctrl.map_file(path) as view:
+                    info = tarfile.TarInfo(relpath(path, self.base_dir))
+                    info.size = len(view)
+                    info.mtime = sig[0] // 10 ** 9
+                    info.mode = self.ARCHIVE_MODE
+                    out.write(gz.compress(info.tobuf(tarfile.PAX_FORMAT)))
+                    for offset in range(0, len(view), self.CHUNK_SIZE):
+                        with view[offset:offset + self.CHUNK_SIZE] as chunk:
+                            out.write(gz.compress(chunk))
+            except SLRDFSCtrlReadException:
+                if fsctrl.file_exists(path):
+                    raise
+                self.logger.warning(self.LOGSTR_VANISHED, path)
+                continue
+            out.write(gz.compress(
+                    tarfile.NUL * (-info.size % tarfile.BLOCKSIZE)))
+            done += 1
+            size += info.size
+            stats.update(self.__stats(done, total_files, size, total_size,
+                                      started))
+            if progress is not None:
+                progress(dict(stats))
+            if monotonic() - logged >= self.PROGRESS_INTERVAL:
+                logged = monotonic()
+                self.logger.info(self.LOGSTR_PROGRESS, done, total_files,
+                                 size, total_size, stats['rate'] / self.MB)
+        out.write(gz.compress(tarfile.NUL * (2 * tarfile.BLOCKSIZE)))
+        out.write(gz.flush())
+
+    def __pack_into(self, fd, files, stats, progress, errors):
+        """Pack files into a pipe (runs in a packing thread)."""
+        try:
+            with open(fd, 'wb', buffering=self.CHUNK_SIZE) as out:
+                self.__pack(files, out, stats, progress)
+        except BaseException as e:
+            errors.append(e)
+
+    def backup(self, path, progress=None, force=False):
+        """Write a single encrypted archive of a base directory.
+
+        :param path:     path to an archive to create (it's left out of an
+                         archive if it's inside a base directory)
+        :param progress: function called with a progress report (dict with
+                         files, total_files, bytes, total_bytes, elapsed and
+                         rate in bytes per second) after every file; it's
+                         called from a packing thread, an exception it raises
+                         aborts a backup
+        :param force:    override an existing archive
+
+        :type path:     str
+        :type progress: function
+        :type force:    bool
+
+        :return: final progress report with an archive size added (size)
+        :rtype:  dict
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDBackupError,
+                 slrd.exceptions.controller_exceptions.
+                 SLRDGPGCtrlEncryptException,
+                 slrd.exceptions.controller_exceptions.
+                 SLRDFSCtrlWriteException
+        """
+        path = abspath(expanduser(path))
+        files = [(file_path, sig) for file_path, sig
+                 in fsctrl.walk_dir(self.base_dir, self.SKIP_NAMES)
+                 if file_path != path]
+        self.logger.info(self.LOGSTR_START, self.base_dir, path, len(files),
+                         sum(sig[1] for _, sig in files))
+        stats = self.__stats(0, len(files), 0, 0, monotonic())
+        errors = []
+        with fsctrl.atomic_output(path, self.ARCHIVE_MODE, force) as tmp_path:
+            read_fd, write_fd = pipe()
+            packer = Thread(target=self.__pack_into, name='slrd-backup',
+                            args=(write_fd, files, stats, progress, errors))
+            try:
+                packer.start()
+            except BaseException:
+                close(write_fd)
+                close(read_fd)
+                raise
+            try:
+                # a packer fails with a broken pipe if gpg stops reading
+                with open(read_fd, 'rb', buffering=self.CHUNK_SIZE) as src:
+                    self.gpgctrl.encrypt_stream(src, tmp_path)
+            finally:
+                packer.join()
+            if errors:
+                errmsg = self.ERRMSG_PACK_FAIL % errors[0]
+                self.logger.error(errmsg)
+                raise SLRDBackupError(errmsg) from errors[0]
+        stats['size'] = stat(path).st_size
+        self.logger.info(self.LOGSTR_DONE, stats['files'], stats['bytes'],
+                         stats['size'], stats['elapsed'],
+                         stats['rate'] / self.MB)
+        return stats
+
+    def restore(self, path, target_dir=None, progress=None):
+        """Unpack an archive written by self.backup().
+
+        :param path:       path to an archive
+        :param target_dir: empty (or missing) directory to restore into;
+                           defaults to a base directory
+        :param progress:   function called with a progress report after
+                           every file (total_files and total_bytes are None)
+
+        :type path:       str
+        :type target_dir: str
+        :type progress:   function
+
+        :return: final progress report
+        :rtype:  dict
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDBackupError,
+                 slrd.exceptions.controller_exceptions.
+                 SLRDGPGCtrlDecryptException
+        """
+        target = abspath(expanduser(target_dir or self.base_dir))
+        makedirs(target, mode=self.DIR_MODE, exist_ok=True)
+        if listdir(target):
+            errmsg = self.ERRMSG_NOT_EMPTY % target
+            self.logger.error(errmsg)
+            raise SLRDBackupError(errmsg)
+        started = monotonic()
+        done = size = 0
+        tmp_path = join(target, '%s%s%s' % (fsctrl.TMP_PREFIX, token_hex(4),
+                                            fsctrl.TMP_SUFFIX))
+        close(osopen(tmp_path, O_WRONLY | O_CREAT | O_EXCL | O_CLOEXEC,
+                     self.ARCHIVE_MODE))
+        try:
+            with open(abspath(expanduser(path)), 'rb') as src:
+                self.gpgctrl.decrypt_stream(src, tmp_path)
+            with tarfile.open(tmp_path, 'r:gz') as tar:
+                for member in tar:
+                    if not member.isfile():
+                        raise SLRDBackupError(
+                                self.ERRMSG_BAD_MEMBER % member.name)
+                    tar.extract(member, target, filter='data')
+                    done += 1
+                    size += member.size
+                    if progress is not None:
+                        progress(self.__stats(done, None, size, None,
+                                              started))
+        except (OSError, tarfile.TarError) as e:
+            errmsg = self.ERRMSG_UNPACK_FAIL % e
+            self.logger.error(errmsg)
+            raise SLRDBackupError(errmsg)
+        finally:
+            unlink(tmp_path)
+        self.logger.info(self.LOGSTR_RESTORED, done, size, target)
+        return self.__stats(done, None, size, None, started)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Cache decrypted container plain text in RAM.
+
+Repeated reads of the same container (i.e. autofill hitting the same site
+over and over) should not spawn gpg every time. This module keeps decrypted
+plain text keyed by a container name and a digest of its encrypted content so
+that a container that was rewritten is never served stale.
+
+Plain text must not stay in memory forever, so the cache is bounded:
+
+- by size: least recently used entries are evicted once a byte budget is
+  exceeded;
+- by time: entries not accessed for ttl seconds are dropped (checked on
+  access and by a background thread that runs while anything is cached);
+- on demand: self.lock() wipes everything (i.e. when a user locks a vault).
+
+Every entry lives in its own bytearray that is locked in RAM with mlock(2)
+where the platform allows it (so it's never swapped out) and overwritten with
+zeros before it's released. Callers get copies: a buffer may be wiped by
+another thread any time after a lookup.
+
+Classes:
+    - CacheManager
+"""
+from collections import OrderedDict
+import ctypes
+import ctypes.util
+from hashlib import blake2b
+from threading import Event, Lock, Thread, current_thread
+from time import monotonic
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class _Entry(object):
+    """Single cached plain text."""
+
+    __slots__ = ('buf', 'locked', 'atime')
+
+    def __init__(self, data, mlock):
+        """Copy data into a fresh buffer and lock it in RAM if possible."""
+        self.buf = bytearray(data)
+        self.locked = mlock(self.buf) if self.buf else False
+        self.atime = monotonic()
+
+    def wipe(self, munlock):
+        """Zero a buffer and unlock it."""
+        size = len(self.buf)
+        if size:
+            ctypes.memset((ctypes.c_char * size).from_buffer(self.buf), 0,
+                          size)
+            if self.locked:
+                munlock(self.buf)
+                self.locked = False
+
+
+class CacheManager(object):
+    """Size and time bounded LRU cache of decrypted containers."""
+
+    DEF_MAX_BYTES = 4 * 1024 * 1024
+    DEF_TTL = 300
+
+    LOGSTR_NO_MLOCK = 'mlock is unavailable: cached plain text may be ' + \
+                      'swapped out: %s'
+    LOGSTR_WIPED = 'plain text cache wiped: %i entries'
+
+    def __init__(self, gpgctrl, max_bytes=None, ttl=None, use_mlock=True,
+                 expire_interval=None):
+        """Initialization method.
+
+        :param gpgctrl:         controller to decrypt cache misses with
+        :param max_bytes:       byte budget of cached plain text
+        :param ttl:             seconds an entry may stay unused before it's
+                                dropped
+        :param use_mlock:       lock cached plain text in RAM where possible
+        :param expire_interval: seconds between background expiry runs
+                                (half of ttl by default)
+
+        :type gpgctrl:         slrd.controllers.gpg_controller.GPGController
+        :type max_bytes:       int
+        :type ttl:             float
+        :type use_mlock:       bool
+        :type expire_interval: float
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.gpgctrl = gpgctrl
+        self.max_bytes = max_bytes or self.DEF_MAX_BYTES
+        self.ttl = ttl or self.DEF_TTL
+        self.expire_interval = expire_interval or self.ttl / 2
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (name, digest) -> _Entry
+        self._names = {}               # name -> (name, digest)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None  # expiry thread, runs while entries exist
+        self._libc = None
+        if use_mlock:
+            try:
+                self._libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                         use_errno=True)
+                self._libc.mlock
+            except (OSError, AttributeError) as e:
+                self._libc = None
+                self.logger.warning(self.LOGSTR_NO_MLOCK, e)
+        self._use_mlock = self._libc is not None
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __mlock(self, buf):
+        """Lock a bytearray in RAM.
+
+        :return: whether a buffer was locked
+        :rtype:  bool
+        """
+        if not self._use_mlock:
+            return False
+        cbuf = (ctypes.c_char * len(buf)).from_buffer(buf)
+        if self._libc.mlock(ctypes.addressof(cbuf), len(buf)) == 0:
+            return True
+        # most likely RLIMIT_MEMLOCK: don't try again
+        self.logger.warning(self.LOGSTR_NO_MLOCK, ctypes.get_errno())
+        self._use_mlock = False
+        return False
+
+    def __munlock(self, buf):
+        """Unlock a bytearray locked with self.__mlock()."""
+        if self._libc is not None:
+            cbuf = (ctypes.c_char * len(buf)).from_buffer(buf)
+            self._libc.munlock(ctypes.addressof(cbuf), len(buf))
+
+    @staticmethod
+    def digest(data):
+        """Get a digest of encrypted container content.
+
+        :param data: encrypted data
+        :type data:  str or bytes-like
+
+        :rtype: bytes
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        return blake2b(data, digest_size=16).digest()
+
+    def __drop(self, key):
+        """Remove and wipe an entry (lock must be held)."""
+        entry = self._entries.pop(key)
+        if self._names.get(key[0]) == key:
+            del self._names[key[0]]
+        self.size -= len(entry.buf)
+        entry.wipe(self.__munlock)
+
+    def __expire(self, now):
+        """Drop entries idle for longer than self.ttl (lock must be held)."""
+        deadline = now - self.ttl
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry.atime > deadline:
+                break
+            self.__drop(key)
+
+    def __run(self):
+        """Expiry thread main loop: exits once nothing is cached."""
+        while True:
+            stopped = self._stop.wait(self.expire_interval)
+            with self._lock:
+                self.__expire(monotonic())
+                if stopped or not self._entries:
+                    # put() checks for a running thread under the same lock
+                    if self._thread is current_thread():
+                        self._thread = None
+                    return
+
+    def get(self, name, digest):
+        """Get cached plain text of a container.
+
+        :param name:   container name
+        :param digest: digest of encrypted content (see self.digest())
+
+        :type name:   str
+        :type digest: bytes
+
+        :return: copy of plain text or None on a miss
+        :rtype:  bytes
+        """
+        key = (name, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = monotonic()
+            if now - entry.atime > self.ttl:
+                self.__drop(key)
+                self.misses += 1
+                return None
+            entry.atime = now
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return bytes(entry.buf)
+
+    def put(self, name, digest, data):
+        """Cache plain text of a container.
+
+        An older version of the same container is dropped. Data larger than
+        the whole byte budget is not cached.
+
+        :param name:   container name
+        :param digest: digest of encrypted content (see self.digest())
+        :param data:   plain text
+
+        :type name:   str
+        :type digest: bytes
+        :type data:   bytes-like
+
+        :return: whether data was cached
+        :rtype:  bool
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            return False
+        key = (name, digest)
+        with self._lock:
+            old = self._names.get(name)
+            if old is not None:
+                self.__drop(old)
+            self.__expire(monotonic())
+            while self._entries and self.size + size > self.max_bytes:
+                self.__drop(next(iter(self._entries)))
+            self._entries[key] = _Entry(data, self.__mlock)
+            self._names[name] = key
+            self.size += size
+            if self._thread is None:
+                self._thread = Thread(target=self.__run, name='slrd-cache',
+                                      daemon=True)
+                self._thread.start()
+            return True
+
+    def decrypt(self, name, data):
+        """Decrypt container content serving repeated reads from the cache.
+
+        :param name: container name
+        :param data: encrypted container content
+
+        :type name: str
+        :type data: str
+
+        :return: plain text
+        :rtype:  bytes
+
+        :raises: slrd.exceptions.controller_exceptions.
+                 SLRDGPGCtrlDecryptException
+        """
+        digest = self.digest(data)
+        cached = self.get(name, digest)
+        if cached is not None:
+            return cached
+        plain = self.gpgctrl.decrypt(data)
+        self.put(name, digest, plain)
+        return plain
+
+    def invalidate(self, name):
+        """Drop a cached container (i.e. after it was rewritten).
+
+        :param name: container name
+        :type name:  str
+        """
+        with self._lock:
+            key = self._names.get(name)
+            if key is not None:
+                self.__drop(key)
+
+    def expire(self):
+        """Drop entries idle for longer than self.ttl."""
+        with self._lock:
+            self.__expire(monotonic())
+
+    def lock(self):
+        """Wipe all cached plain text."""
+        with self._lock:
+            count = len(self._entries)
+            while self._entries:
+                self.__drop(next(iter(self._entries)))
+        self.logger.info(self.LOGSTR_WIPED, count)
+
+    def close(self):
+        """Stop a background expiry thread and wipe all cached plain text.
+
+        A cache may still be used afterwards: a thread is started again once
+        something is cached.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+        if thread is not None:
+            thread.join()
+        self._stop.clear()
+        self.lock()
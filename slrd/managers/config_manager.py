@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 # vi: set ft=python sw=4 :
 """."""
-import logging
+from os.path import abspath, expanduser
 from slrd.strings import comlogstr
 from slrd.controllers import fsctrl
 
 # bundle in slrd.exceptions.__init__.py and import in a single line
 from slrd.exceptions.controller_exceptions import SLRDFSCtrlCreateException
 from slrd.exceptions.manager_exceptions import SLRDBaseDirAllocationError
+from slrd.utils.lazy_logger import LazyLogger
 
 
 # NOTE: TODO: might be a good idea to refactor to DataManager
@@ -36,22 +37,22 @@ class ConfigManager(object):
         :raise: slrd.exceptions.controller_exceptions.SLRDFSCtrlCreateException
                 slrd.exceptions.manager_exceptions.SLRDFSBaseDirAllocationError
         """
-        self.logger = logging.getLogger(__name__)
+        self.logger = LazyLogger(__name__)
         self.logger.debug(comlogstr.LOG_INIT_START)
-        self.base_dir = base_dir
+        self.base_dir = abspath(expanduser(base_dir))
         self.base_dir_mode = base_dir_mode
-        if not fsctrl.it_exists(base_dir):
+        if not fsctrl.it_exists(self.base_dir):
             try:
                 self.logger.info(self.LOGSTR_BDIR_NFOUND)
-                fsctrl.create_dir(self.base_dir, self.base_dir_mode)
+                fsctrl.create_dir(self.base_dir, int(self.base_dir_mode, 8))
             except SLRDFSCtrlCreateException as e:
                 raise SLRDBaseDirAllocationError(
                         self.ERRMSG_BDIR_CRERROR % e)
         # path exists but not a directory
-        elif not fsctrl.dir_exists(base_dir):
+        elif not fsctrl.dir_exists(self.base_dir):
             self.logger.critical(self.LOGSTR_BDIR_NDIR)
             raise SLRDBaseDirAllocationError(
-                    self.ERRMSG_BDIR_NOT_DIR % base_dir)
-        elif # TODO: check mode of a directory; assert match self.base_dir_mode
+                    self.ERRMSG_BDIR_NOT_DIR % self.base_dir)
+        # TODO: check mode of a directory; assert match self.base_dir_mode
         # TODO: put SLRD config file there or locate an existing one
         self.logger.debug(comlogstr.LOG_INIT_END)
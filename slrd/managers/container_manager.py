@@ -0,0 +1,712 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Pack key-value records into fixed-size encrypted containers.
+
+Every container holds exactly GPGController.pt_length bytes of plain text
+(padded by GPGController), has a random name and a random timestamp. Many
+small records are bin-packed into a single container; a value that doesn't fit
+into a container is split into parts stored in several containers.
+
+A free-space map of partially filled containers is kept in RAM so that new
+records go to the container that fits them best instead of a fresh one.
+Changes are accumulated in RAM and written out on self.flush(), one GPG
+operation per modified container. Containers are encrypted and decrypted in
+batches through GPGController.encrypt_many()/decrypt_many().
+
+Unmodified containers can be re-encrypted in place (see self.rewrite()) to
+mask which containers real updates touched. Names of written and deleted
+containers are kept until they're committed (see self.take_changed()), so
+real updates and masking rewrites go into the same commits.
+
+A single lock guards state in RAM and container writes, so records can be
+read and written from several threads while another one rewrites idle
+containers.
+
+Containers changed on disk by someone else (i.e. a `git pull`) are re-read
+one by one (see self.reindex_path()), so a ContainerManager can be kept in
+sync by slrd.managers.watch_manager without reloading every container.
+
+Container plain text layout (repeated for every record):
+
+```
+| key length: 2 | part: 2 | parts total: 2 | value length: 4 | key | value |
+```
+
+Classes:
+    - ContainerManager
+"""
+from bisect import bisect_left, insort
+from contextlib import ExitStack
+from os import stat
+from os.path import abspath, expanduser, join, split
+from struct import Struct
+from threading import RLock
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDIllegalArgumentError, SLRDRuntimeException
+from slrd.exceptions import SLRDFSCtrlReadException
+from slrd.strings import comlogstr
+from slrd.utils import random_utils
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class _Container(object):
+    """State of a single container."""
+
+    __slots__ = ('name', 'used', 'records', 'dirty', 'gen', 'parts', 'sig')
+
+    def __init__(self, name, used=0, records=None):
+        """Initialization method.
+
+        :param name:    container (file) name
+        :param used:    amount of bytes taken by records
+        :param records: {(key, part): (parts total, value)}; None while
+                        a container content is not loaded
+        """
+        self.name = name
+        self.used = used
+        self.records = records
+        self.dirty = False
+        self.gen = 0  # bumped on every write of a container file
+        self.parts = ()  # (key, part) of records in a container file
+        self.sig = None  # stat signature of a file as last read or written
+
+
+class ContainerManager(object):
+    """Bin-pack records into fixed-size containers."""
+
+    CONTAINER_DIR = 'containers'
+    CONTAINER_MODE = 0o600
+    NAME_LENGTH = 32
+    RECORD_HEADER = Struct('>HHHI')
+    MIN_PART = 64  # minimum room left for a value next to a record key
+    BATCH_SIZE = 256  # containers encrypted/decrypted in a single batch
+
+    LOGSTR_LOADED = 'loaded %i containers, %i records'
+    LOGSTR_FLUSHED = 'flushed containers: %i written, %i deleted'
+    LOGSTR_SKIP = 'skipping container that failed to load: %s: %s'
+    LOGSTR_REWRITTEN = 'rewritten %i of %i idle containers'
+    LOGSTR_BAD_PARTS = 'skipping key with parts that do not add up: %s'
+    LOGSTR_REINDEXED = 'container changed on disk, re-read: %s, records: %i'
+
+    ERRMSG_KEY_TOO_LONG = 'key is too long to fit a container: %s'
+    ERRMSG_BAD_CONTAINER = 'malformed container: %s'
+    ERRMSG_MISSING_PART = 'container with part %i of key %s is missing'
+
+    def __init__(self, base_dir, gpgctrl, cache=None):
+        """Initialization method.
+
+        Nothing is loaded here; call self.load() to read existing containers.
+
+        :param base_dir: path to a data storage root
+        :param gpgctrl:  controller to encrypt and decrypt containers with
+        :param cache:    cache to serve repeated container reads from
+
+        :type base_dir: str
+        :type gpgctrl:  slrd.controllers.gpg_controller.GPGController
+        :type cache:    slrd.managers.cache_manager.CacheManager
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.container_dir = join(abspath(expanduser(base_dir)),
+                                  self.CONTAINER_DIR)
+        self.gpgctrl = gpgctrl
+        self.cache = cache
+        self.capacity = gpgctrl.max_data_len
+        self._containers = {}  # name -> _Container
+        self._locations = {}   # key -> [container name of each part]
+        self._free = []        # sorted [(free bytes, name)]
+        self._changed = set()  # names written or deleted but not committed
+        self._lock = RLock()   # guards all of the above and writes
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    @classmethod
+    def _encode(cls, records):
+        """Serialize container records.
+
+        :param records: {(key, part): (parts total, value)}
+        :type records:  dict
+
+        :rtype: bytes
+        """
+        pack = cls.RECORD_HEADER.pack
+        chunks = []
+        for (key, part), (total, value) in records.items():
+            bkey = key.encode()
+            chunks.append(pack(len(bkey), part, total, len(value)))
+            chunks.append(bkey)
+            chunks.append(value)
+        return b''.join(chunks)
+
+    @classmethod
+    def _decode(cls, payload):
+        """Parse container records.
+
+        :param payload: serialized records
+        :type payload:  bytes
+
+        :return: {(key, part): (parts total, value)}
+        :rtype:  dict
+
+        :raises: ValueError, struct.error on malformed payload
+        """
+        unpack_from, hsize = cls.RECORD_HEADER.unpack_from, \
+            cls.RECORD_HEADER.size
+        view = memoryview(payload)
+        records = {}
+        offset, end = 0, len(payload)
+        while offset < end:
+            klen, part, total, vlen = unpack_from(view, offset)
+            offset += hsize
+            key = str(view[offset:offset + klen], 'utf-8')
+            offset += klen
+            value = bytes(view[offset:offset + vlen])
+            offset += vlen
+            if offset > end or part >= total:
+                raise ValueError(offset)
+            records[(key, part)] = (total, value)
+        return records
+
+    def _record_size(self, key, value):
+        """Get amount of container bytes a record takes."""
+        return self.RECORD_HEADER.size + len(key.encode()) + len(value)
+
+    def __path(self, name):
+        """Get an absolute path to a container."""
+        return join(self.container_dir, name)
+
+    def __signature(self, name):
+        """Get a stat signature of a container file (None if it's gone)."""
+        try:
+            st = stat(self.__path(name), follow_symlinks=False)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def __read(self, name):
+        """Read and decrypt container records.
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with fsctrl.map_file(self.__path(name)) as data:
+            if self.cache is not None:
+                payload = self.cache.decrypt(name, data)
+            else:
+                payload = self.gpgctrl.decrypt(data)
+        try:
+            return self._decode(payload)
+        except Exception:
+            raise SLRDFSCtrlReadException(self.ERRMSG_BAD_CONTAINER % name)
+
+    def __records(self, cont):
+        """Get records of a container loading them if needed."""
+        if cont.records is None:
+            cont.records = self.__read(cont.name)
+        return cont.records
+
+    def __set_used(self, cont, used):
+        """Update used space of a container keeping the free map sorted."""
+        free = self.capacity - cont.used
+        if cont.name in self._containers and free > 0:
+            idx = bisect_left(self._free, (free, cont.name))
+            if idx < len(self._free) and self._free[idx][1] == cont.name:
+                del self._free[idx]
+        cont.used = used
+        free = self.capacity - used
+        if free > self.RECORD_HEADER.size:
+            insort(self._free, (free, cont.name))
+
+    def __new_container(self):
+        """Allocate a new empty container with a random unused name."""
+        name = random_utils.get_random_string(self.NAME_LENGTH)
+        while name in self._containers:
+            name = random_utils.get_random_string(self.NAME_LENGTH)
+        cont = _Container(name, records={})
+        self.__set_used(cont, 0)
+        self._containers[name] = cont
+        return cont
+
+    def __best_fit(self, need):
+        """Get a partially filled container with the least free space >= need.
+
+        :return: container or None
+        :rtype:  _Container
+        """
+        idx = bisect_left(self._free, (need, ''))
+        if idx == len(self._free):
+            return None
+        return self._containers[self._free[idx][1]]
+
+    def load(self, values=None):
+        """Read all existing containers and build the free-space map.
+
+        Container contents are not kept in RAM, only their metadata is.
+        Containers that fail to load are logged and skipped, so are keys
+        whose parts don't add up (see self.__check_parts()).
+
+        :param values: dict to put every loaded value into (under its key),
+                       so that a caller needing all of them doesn't decrypt
+                       every container again
+
+        :type values: dict
+        """
+        with self._lock:
+            self._containers, self._locations, self._free = {}, {}, []
+            parts = {}  # key -> {parts total -> [container of each part]}
+            conflicts = set()
+            chunks = {}  # (key, total, part) -> value part (if wanted)
+            sigs = fsctrl.scan_dir(self.container_dir)
+            names = [path.rsplit('/', 1)[1] for path in sorted(sigs)]
+            for idx in range(0, len(names), self.BATCH_SIZE):
+                batch = names[idx:idx + self.BATCH_SIZE]
+                for name, records in zip(batch, self.__read_many(batch)):
+                    if records is None:
+                        continue
+                    cont = _Container(name)
+                    cont.parts = tuple(records)
+                    cont.sig = sigs[self.__path(name)]
+                    self._containers[name] = cont
+                    used = 0
+                    for (key, part), (total, value) in records.items():
+                        used += self._record_size(key, value)
+                        found = parts.setdefault(key, {}).setdefault(
+                                total, [None] * total)
+                        if found[part] is not None:
+                            conflicts.add(key)
+                        found[part] = name
+                        if values is not None:
+                            chunks[(key, total, part)] = value
+                    self.__set_used(cont, used)
+            self._locations = self.__check_parts(parts, conflicts)
+            if values is not None:
+                for key, names in self._locations.items():
+                    total = len(names)
+                    values[key] = b''.join(chunks[(key, total, part)]
+                                           for part in range(total))
+            self.logger.info(self.LOGSTR_LOADED, len(self._containers),
+                             len(self._locations))
+
+    def __check_parts(self, parts, conflicts):
+        """Keep keys whose parts make up exactly one complete value.
+
+        Parts of a key may not add up if a flush was interrupted between
+        batches or containers were merged from two histories: parts of an
+        old and a new version (with different totals) are left behind. A key
+        is kept if only one of its versions is complete; otherwise it's
+        logged and skipped (its records stay in containers untouched).
+
+        :param parts:     {key: {parts total: [container of each part]}}
+        :param conflicts: keys with a part found in several containers
+
+        :type parts:     dict
+        :type conflicts: set
+
+        :return: {key: [container name of each part]}
+        :rtype:  dict
+        """
+        locations = {}
+        for key, versions in parts.items():
+            complete = [names for names in versions.values()
+                        if None not in names]
+            if len(complete) == 1 and key not in conflicts:
+                locations[key] = complete[0]
+            else:
+                self.logger.warning(self.LOGSTR_BAD_PARTS, key)
+        return locations
+
+    def __read_many(self, names):
+        """Read and decrypt records of many containers in a single batch.
+
+        Containers are memory-mapped and handed to GPGController as is, so
+        no copy of encrypted content is made. If a batch fails containers are
+        re-read one by one so that a single broken container doesn't take the
+        rest of a batch down with it.
+
+        :return: records of each container (None for ones that failed)
+        :rtype:  list
+        """
+        try:
+            with ExitStack() as stack:
+                payloads = self.gpgctrl.decrypt_many(
+                        [stack.enter_context(fsctrl.map_file(self.__path(n)))
+                         for n in names])
+            return [self._decode(payload) for payload in payloads]
+        except Exception:
+            pass
+        result = []
+        for name in names:
+            try:
+                result.append(self.__read(name))
+            except (SLRDRuntimeException, SLRDIllegalArgumentError) as e:
+                self.logger.error(self.LOGSTR_SKIP, name, e)
+                result.append(None)
+        return result
+
+    def put(self, key, value):
+        """Store a value under a key (replacing an existing one).
+
+        :param key:   record key
+        :param value: record value
+        :type key:    str
+        :type value:  bytes
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with self._lock:
+            overhead = self._record_size(key, b'')
+            if overhead + self.MIN_PART > self.capacity:
+                errmsg = self.ERRMSG_KEY_TOO_LONG % key
+                self.logger.error(errmsg)
+                raise SLRDIllegalArgumentError(errmsg)
+            if isinstance(value, str):
+                value = value.encode()
+            # an old version is only restored if placing a new one fails
+            names = self._locations.get(key)
+            old = [(self._containers.get(name) if name else None, part)
+                   for part, name in enumerate(names or ())]
+            old = [(cont, part, self.__records(cont).get((key, part)),
+                    cont.dirty) for cont, part in old if cont is not None]
+            self.delete(key)
+            placed = []  # (container, whether it's new, dirty before)
+            try:
+                self.__place(key, value, overhead, placed)
+            except BaseException:
+                self.__unplace(key, placed)
+                for cont, part, record, dirty in old:
+                    if record is not None:
+                        cont.records[(key, part)] = record
+                        self.__set_used(cont, cont.used +
+                                        self._record_size(key, record[1]))
+                    cont.dirty = dirty
+                if names is not None:
+                    self._locations[key] = names
+                raise
+            self._locations[key] = [cont.name for cont, _, _ in placed]
+
+    def __place(self, key, value, overhead, placed):
+        """Put parts of a value into containers (lock must be held).
+
+        A container is loaded before anything is put into it, so a failure
+        leaves every container but the ones in placed untouched. Parts get
+        their final total once all of them are placed.
+
+        :param placed: [(container, whether it's new, dirty before)] of
+                       every part placed so far (filled in as parts go)
+        """
+        view = memoryview(value)
+        offset, remaining = 0, len(value)
+        while True:
+            need = overhead + remaining
+            cont = self.__best_fit(need) if need <= self.capacity else None
+            new = cont is None
+            if new:
+                cont = self.__new_container()
+                records = cont.records
+            else:
+                records = self.__records(cont)
+            size = min(remaining, self.capacity - cont.used - overhead)
+            records[(key, len(placed))] = \
+                (None, bytes(view[offset:offset + size]))
+            placed.append((cont, new, cont.dirty))
+            cont.dirty = True
+            self.__set_used(cont, cont.used + overhead + size)
+            offset, remaining = offset + size, remaining - size
+            if not remaining:
+                break
+        total = len(placed)
+        for part, (cont, _, _) in enumerate(placed):
+            cont.records[(key, part)] = (total, cont.records[(key, part)][1])
+
+    def __unplace(self, key, placed):
+        """Take back parts put by self.__place() (lock must be held)."""
+        for part, (cont, new, dirty) in enumerate(placed):
+            record = cont.records.pop((key, part))
+            self.__set_used(cont, cont.used -
+                            self._record_size(key, record[1]))
+            cont.dirty = dirty
+            if new:
+                self.__set_used(cont, self.capacity)
+                del self._containers[cont.name]
+
+    def get(self, key):
+        """Get a value stored under a key.
+
+        :param key: record key
+        :type key:  str
+
+        :return: value or None if there is no such key
+        :rtype:  bytes
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with self._lock:
+            names = self._locations.get(key)
+            if names is None:
+                return None
+            chunks = []
+            for part, name in enumerate(names):
+                cont = self._containers.get(name) if name else None
+                if cont is None:
+                    raise SLRDFSCtrlReadException(
+                            self.ERRMSG_MISSING_PART % (part, key))
+                records = cont.records
+                if records is None:
+                    records = self.__read(name)
+                record = records.get((key, part))
+                if record is None:  # changed on disk since it was loaded
+                    raise SLRDFSCtrlReadException(
+                            self.ERRMSG_MISSING_PART % (part, key))
+                chunks.append(record[1])
+            return b''.join(chunks)
+
+    def delete(self, key):
+        """Delete a value stored under a key (no-op if there is no such key).
+
+        :param key: record key
+        :type key:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with self._lock:
+            names = self._locations.pop(key, None)
+            for part, name in enumerate(names or ()):
+                cont = self._containers.get(name) if name else None
+                if cont is None:
+                    continue
+                records = self.__records(cont)
+                record = records.pop((key, part), None)
+                if record is not None:
+                    cont.dirty = True
+                    self.__set_used(cont, cont.used -
+                                    self._record_size(key, record[1]))
+
+    def keys(self):
+        """Get all stored keys.
+
+        :rtype: tuple
+        """
+        with self._lock:
+            return tuple(self._locations)
+
+    def flush(self):
+        """Write all modified containers and drop their plain text from RAM.
+
+        Containers left empty are deleted, but only after every other one is
+        written: a record moved out of a container that became empty must be
+        on disk before that container is gone. An empty container is
+        forgotten once its file is deleted. Containers are replaced
+        atomically and the whole flush is a single group commit.
+
+        :return: amount of containers written and deleted
+        :rtype:  tuple
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with self._lock, fsctrl.group_commit():  # one directory fsync
+            dirty = [c for c in self._containers.values() if c.dirty]
+            empty = [c for c in dirty if not c.records]
+            dirty = [c for c in dirty if c.records]
+            if dirty and not fsctrl.dir_exists(self.container_dir):
+                fsctrl.create_dir(self.container_dir, 0o700)
+            for idx in range(0, len(dirty), self.BATCH_SIZE):
+                batch = dirty[idx:idx + self.BATCH_SIZE]
+                encrypted = self.gpgctrl.encrypt_many(
+                        [self._encode(cont.records) for cont in batch])
+                fsctrl.write_many(
+                        self.container_dir,
+                        {c.name: data for c, data in zip(batch, encrypted)},
+                        mode=self.CONTAINER_MODE,
+                        timestamp=random_utils.get_random_datetime, force=True)
+                for cont in batch:
+                    cont.parts = tuple(cont.records)
+                    cont.records, cont.dirty = None, False
+                    cont.gen += 1
+                    cont.sig = self.__signature(cont.name)
+                    self._changed.add(cont.name)
+                    if self.cache is not None:
+                        self.cache.invalidate(cont.name)
+            if empty:
+                fsctrl.delete_many(self.container_dir,
+                                   [cont.name for cont in empty])
+            for cont in empty:
+                self.__set_used(cont, self.capacity)
+                del self._containers[cont.name]
+                self._changed.add(cont.name)
+                if self.cache is not None:
+                    self.cache.invalidate(cont.name)
+        self.logger.info(self.LOGSTR_FLUSHED, len(dirty), len(empty))
+        return len(dirty), len(empty)
+
+    def idle_names(self):
+        """Get names of containers that are neither loaded nor modified.
+
+        :rtype: list
+        """
+        with self._lock:
+            return [name for name, cont in self._containers.items()
+                    if cont.records is None and not cont.dirty]
+
+    def rewrite(self, names):
+        """Re-encrypt unmodified containers with fresh padding.
+
+        Plain text of containers stays the same, but every byte of their
+        files changes and they get new random timestamps. Encryption is done
+        without holding a lock so that self.flush() and record access are
+        never delayed by more than writing a single batch of files.
+        A container that was modified or written in the meantime is skipped.
+
+        :param names: names of containers to rewrite
+        :type names:  iterable of str
+
+        :return: amount of containers and amount of bytes written
+        :rtype:  tuple
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        with self._lock:
+            conts = [self._containers[name] for name in names
+                     if name in self._containers]
+            conts = [(c, c.gen) for c in conts if c.records is None and
+                     not c.dirty][:self.BATCH_SIZE]
+        if not conts:
+            return 0, 0
+        with ExitStack() as stack:
+            payloads = self.gpgctrl.decrypt_many(
+                    [stack.enter_context(fsctrl.map_file(self.__path(c.name)))
+                     for c, _ in conts])
+        encrypted = self.gpgctrl.encrypt_many(payloads)
+        with self._lock:
+            files = {c.name: data for (c, gen), data in zip(conts, encrypted)
+                     if self._containers.get(c.name) is c and
+                     not c.dirty and c.gen == gen}
+            fsctrl.write_many(self.container_dir, files,
+                              mode=self.CONTAINER_MODE,
+                              timestamp=random_utils.get_random_datetime,
+                              force=True)
+            for name in files:
+                self._containers[name].gen += 1
+                self._containers[name].sig = self.__signature(name)
+                if self.cache is not None:
+                    self.cache.invalidate(name)
+            self._changed.update(files)
+        self.logger.debug(self.LOGSTR_REWRITTEN, len(files), len(conts))
+        return len(files), sum(len(data) for data in files.values())
+
+    def watch_dirs(self):
+        """Get directories containers are stored in (see WatchManager).
+
+        :rtype: tuple
+        """
+        return (self.container_dir,)
+
+    def reindex_path(self, path, keys=None):
+        """Bring a single container changed on disk in sync.
+
+        Records of a container are re-read and replace what was known about
+        it; a deleted container is dropped. A file this manager wrote itself
+        (same stat signature) is left alone, so are containers modified in
+        RAM: a next flush overwrites them anyway. Parts of a value written
+        elsewhere may arrive in several containers one by one: get() fails
+        for it until all of them are re-read.
+
+        :param path: absolute path to a changed file
+        :param keys: set to add keys of records a container held before and
+                     holds now to (values of those may have changed)
+
+        :type path: str
+        :type keys: set
+
+        :return: whether the path is a container
+        :rtype:  bool
+        """
+        parent, name = split(path)
+        if parent != self.container_dir or fsctrl.is_temp_name(name):
+            return False
+        with self._lock:
+            cont = self._containers.get(name)
+            sig = self.__signature(name)
+            if cont is not None and (cont.dirty or cont.sig == sig):
+                return True
+            records = None
+            if sig is not None:
+                try:
+                    records = self.__read(name)
+                except (SLRDRuntimeException, SLRDIllegalArgumentError) as e:
+                    self.logger.error(self.LOGSTR_SKIP, name, e)
+            if keys is not None:
+                if cont is not None:
+                    keys.update(key for key, _ in (
+                            cont.parts if cont.records is None
+                            else cont.records))
+                keys.update(key for key, _ in records or ())
+            if cont is not None:
+                self.__drop(cont)
+            if records is not None:
+                self.__adopt(name, records, sig)
+            self.logger.debug(self.LOGSTR_REINDEXED, name,
+                              len(records or ()))
+        return True
+
+    def __drop(self, cont):
+        """Forget a container and locations of parts stored in it."""
+        for key, part in (cont.parts if cont.records is None
+                          else cont.records):
+            names = self._locations.get(key)
+            if names is not None and part < len(names) and \
+                    names[part] == cont.name:
+                names[part] = None
+                if not any(names):
+                    del self._locations[key]
+        self.__set_used(cont, self.capacity)
+        del self._containers[cont.name]
+        if self.cache is not None:
+            self.cache.invalidate(cont.name)
+
+    def __adopt(self, name, records, sig):
+        """Add a container written elsewhere and locations of its parts."""
+        cont = _Container(name)
+        cont.parts, cont.sig = tuple(records), sig
+        self._containers[name] = cont
+        used = 0
+        for (key, part), (total, value) in records.items():
+            used += self._record_size(key, value)
+            names = self._locations.get(key)
+            if names is None or len(names) != total:  # a new version
+                names = self._locations[key] = [None] * total
+            names[part] = name
+        self.__set_used(cont, used)
+
+    def take_changed(self):
+        """Get and reset paths of containers written or deleted since then.
+
+        Pass the paths back to self.restore_changed() if committing them
+        fails.
+
+        :rtype: list
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return sorted(self.__path(name) for name in changed)
+
+    def restore_changed(self, paths):
+        """Queue paths returned by self.take_changed() again.
+
+        :param paths: paths that weren't committed
+        :type paths:  iterable of str
+        """
+        with self._lock:
+            self._changed.update(path.rsplit('/', 1)[1] for path in paths)
+
+    def stats(self):
+        """Get packing statistics.
+
+        :return: amount of containers and records, used and total bytes
+        :rtype:  dict
+        """
+        with self._lock:
+            return {
+                'containers': len(self._containers),
+                'records': len(self._locations),
+                'used': sum(c.used for c in self._containers.values()),
+                'capacity': self.capacity * len(self._containers),
+            }
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Bounded executors for blocking work of request handlers.
+
+Request handlers must not run GPG and disk I/O on a server's event loop (or
+tie up every server thread with it). Such work is handed to one of two
+thread pools instead:
+
+- crypto: GPG operations; sized to CPU count since GPG is CPU bound (the
+  work is done in gpg subprocesses so threads don't fight for the GIL);
+- io:     file system reads and writes; a bit larger since it mostly waits.
+
+Every pool accepts a bounded amount of pending work. Once it's full new work
+is rejected right away with SLRDExecutorBusyError (to be turned into
+HTTP 503) instead of queueing up without bound during a burst of requests.
+
+Work can be waited for synchronously (self.run(), for WSGI workers) or
+awaited (self.run_async(), for async views and ASGI servers).
+
+Classes:
+    - ExecutorManager
+"""
+from asyncio import wrap_future
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from threading import BoundedSemaphore
+from slrd.exceptions import SLRDExecutorBusyError, SLRDIllegalArgumentError
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class ExecutorManager(object):
+    """Hand blocking work to bounded thread pools."""
+
+    CRYPTO = 'crypto'
+    IO = 'io'
+    QUEUE_FACTOR = 4  # pending work allowed per worker thread
+
+    LOGSTR_POOLS = 'executors started: crypto: %i, io: %i workers'
+    LOGSTR_BUSY = 'executor is busy: %s'
+
+    ERRMSG_BUSY = 'too many pending %s tasks, try again later'
+    ERRMSG_NO_POOL = 'unknown executor: %s'
+
+    def __init__(self, crypto_workers=None, io_workers=None,
+                 queue_factor=None):
+        """Initialization method.
+
+        :param crypto_workers: threads running GPG operations
+        :param io_workers:     threads running file system operations
+        :param queue_factor:   pending tasks allowed per thread (running ones
+                               included)
+
+        :type crypto_workers: int
+        :type io_workers:     int
+        :type queue_factor:   int
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        cpus = cpu_count() or 1
+        factor = queue_factor or self.QUEUE_FACTOR
+        workers = {self.CRYPTO: crypto_workers or cpus,
+                   self.IO: io_workers or min(32, cpus * 4)}
+        self._pools = {}  # name -> (executor, semaphore)
+        for name, count in workers.items():
+            self._pools[name] = (
+                ThreadPoolExecutor(max_workers=count,
+                                   thread_name_prefix='slrd-' + name),
+                BoundedSemaphore(count * factor))
+        self.logger.info(self.LOGSTR_POOLS, workers[self.CRYPTO],
+                         workers[self.IO])
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def submit(self, pool, func, *args, **kwargs):
+        """Schedule func(*args, **kwargs) in a pool.
+
+        :param pool: 'crypto' or 'io'
+        :param func: function to call
+
+        :type pool: str
+        :type func: function
+
+        :return: future of a call result
+        :rtype:  concurrent.futures.Future
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.manager_exceptions.SLRDExecutorBusyError
+        """
+        try:
+            executor, slots = self._pools[pool]
+        except KeyError:
+            raise SLRDIllegalArgumentError(self.ERRMSG_NO_POOL % pool)
+        if not slots.acquire(blocking=False):
+            self.logger.warning(self.LOGSTR_BUSY, pool)
+            raise SLRDExecutorBusyError(self.ERRMSG_BUSY % pool)
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def run(self, pool, func, *args, **kwargs):
+        """Call func(*args, **kwargs) in a pool and wait for a result.
+
+        :return: result of a call
+        :raises: slrd.exceptions.manager_exceptions.SLRDExecutorBusyError or
+                 anything a call raises
+        """
+        return self.submit(pool, func, *args, **kwargs).result()
+
+    async def run_async(self, pool, func, *args, **kwargs):
+        """Await func(*args, **kwargs) called in a pool.
+
+        :return: result of a call
+        :raises: slrd.exceptions.manager_exceptions.SLRDExecutorBusyError or
+                 anything a call raises
+        """
+        return await wrap_future(self.submit(pool, func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        """Stop all pools.
+
+        :param wait: wait for pending tasks to finish
+        :type wait:  bool
+        """
+        for executor, _ in self._pools.values():
+            executor.shutdown(wait=wait)
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Streaming import of password manager exports (CSV or JSON).
+
+An export file flows through a pipeline of generators, so only a single
+batch of entries is ever kept in RAM no matter how large an export is:
+
+1. parse:  rows are read one by one (csv.DictReader or a pull JSON parser
+           that handles a top-level array, an object with an 'items' array
+           like Bitwarden exports do, and JSON Lines);
+2. map:    export columns are mapped to template keys (see FIELD_ALIASES and
+           a mapping passed to self.run());
+3. build:  every row becomes a linkfile checked against a compiled template
+           validator (see slrd.managers.template_manager);
+4. pack:   linkfiles are packed into containers under their ids (JSON
+           records an index attached to containers reads them back from,
+           see slrd.managers.index_manager);
+5. commit: every self.batch_size entries containers are encrypted in batches
+           and written (ContainerManager.flush()), a keyfile referencing
+           new linkfiles of a batch (sites shortcut and non-secret keys) is
+           written through FSController and a checkpoint is saved.
+
+Existing keyfiles are never read or rewritten: every batch gets a keyfile of
+its own with just its references (an index merges postings of keys defined
+by several keyfiles, see slrd.managers.index_manager), so a commit costs the
+same no matter how many rows were imported before it.
+
+A checkpoint records how many rows are done. An interrupted import started
+again with the same export file resumes after the last committed batch.
+Linkfile ids and keyfile names are derived from a random token of an import
+and a row (batch) number, so rows of a batch that was interrupted half-way
+are overwritten rather than imported twice.
+
+Classes:
+    - ImportManager
+"""
+import csv
+from datetime import datetime, timezone
+from hashlib import sha256
+from itertools import islice
+import json
+from os import stat
+from os.path import abspath, expanduser, join, splitext
+from urllib.parse import urlsplit
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDIllegalArgumentError, SLRDImportError
+from slrd.exceptions import SLRDFSCtrlReadException
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.timeline_manager import TimelineManager
+from slrd.strings import comlogstr
+from slrd.types.link_type import LinkType
+from slrd.utils import codec_registry, random_utils
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class _JSONStream(object):
+    """Pull JSON values out of a text file one at a time."""
+
+    def __init__(self, f, chunk_size):
+        """Initialization method.
+
+        :param f:          text file to read
+        :param chunk_size: amount of characters to read at once
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf, self.pos, self.eof = '', 0, False
+
+    def __fill(self):
+        """Read a next chunk dropping whatever was consumed already."""
+        chunk = self.f.read(self.chunk_size)
+        self.buf, self.pos, self.eof = self.buf[self.pos:] + chunk, 0, \
+            not chunk
+
+    def peek(self):
+        """Get a next non-whitespace character ('' at the end of a file)."""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            self.pos = pos
+            if pos < len(buf) or self.eof:
+                return buf[pos:pos + 1]
+            self.__fill()
+
+    def take(self, char):
+        """Consume an expected character.
+
+        :raises: ValueError
+        """
+        if self.peek() != char:
+            raise ValueError('%r expected at %r' % (char, self.peek()))
+        self.pos += 1
+
+    def value(self):
+        """Parse a next value.
+
+        :raises: ValueError
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                self.__fill()
+                continue
+            if end == len(self.buf) and not self.eof:  # i.e. a cut number
+                self.__fill()
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Iterate values of an array one by one.
+
+        :raises: ValueError
+        """
+        self.take('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() != ',':
+                self.take(']')
+                return
+            self.pos += 1
+
+
+class ImportManager(object):
+    """Import password manager exports in bounded batches."""
+
+    CSV = 'csv'
+    JSON = 'json'
+    FORMATS = {'.csv': CSV, '.json': JSON, '.jsonl': JSON}
+    CHECKPOINT_NAME = '.import.checkpoint'
+    FILE_MODE = 0o600
+    BATCH_SIZE = 1000
+    READ_CHUNK = 64 * 1024
+    ID_LENGTH = 32
+    MAX_ERRORS = 100  # rejected rows reported in detail
+    RECORD_FORMAT = IndexManager.RECORD_FORMAT  # of packed linkfiles
+    ITEMS_KEY = 'items'
+    SITES_KEY = IndexManager.SITES_KEY
+    KEYFILE_NAME = 'import-%s-%08i'  # token, batch number
+    # export columns (dotted paths for nested JSON) tried for every field
+    FIELD_ALIASES = {
+        'site': ('url', 'login_uri', 'login.uris.0.uri', 'uri', 'website',
+                 'hostname'),
+        'title': ('name', 'title'),
+        'notes': ('notes', 'note', 'extra', 'comments'),
+        'created_on': ('created_on', 'creationDate', 'created'),
+        'username': ('username', 'login_username', 'login.username',
+                     'user', 'login'),
+        'email': ('email', 'login.email'),
+        'password': ('password', 'login_password', 'login.password'),
+    }
+    META_FIELDS = ('site', 'title', 'notes', 'created_on')
+    # keys whose values never go into (plain text) keyfiles
+    SECRET_KEYS = LinkType.SECRET_KEYS
+
+    LOGSTR_START = 'importing %s (%s), resuming after row %i'
+    LOGSTR_BATCH = 'import batch committed: %i rows, %i imported'
+    LOGSTR_DONE = 'import done: %i rows, %i imported, %i skipped'
+    LOGSTR_REJECTED = 'import row %i rejected: %s'
+    LOGSTR_STALE = 'ignoring checkpoint of another export: %s'
+
+    ERRMSG_FORMAT = 'unknown export format: %s'
+    ERRMSG_MALFORMED = 'malformed export %s: %s'
+    ERRMSG_NO_VALIDATORS = 'template validators are required to import ' \
+                           'with a template: %s'
+
+    def __init__(self, base_dir, containers, validators=None, lformat='yaml',
+                 batch_size=None):
+        """Initialization method.
+
+        :param base_dir:   path to a data storage root
+        :param containers: loaded containers to pack linkfiles into
+        :param validators: compiled templates to check linkfiles against
+        :param lformat:    format keyfiles are stored in
+        :param batch_size: entries committed at once
+
+        :type base_dir:   str
+        :type containers: slrd.managers.container_manager.ContainerManager
+        :type validators: slrd.managers.template_manager.TemplateManager
+        :type lformat:    str
+        :type batch_size: int
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        self.keyfile_dir = join(self.base_dir, IndexManager.KEYFILE_DIR)
+        self.checkpoint_path = join(self.base_dir, self.CHECKPOINT_NAME)
+        self.containers = containers
+        self.validators = validators
+        self.codec = codec_registry.get(lformat)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.record_codec = codec_registry.get(self.RECORD_FORMAT)
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def read(self, path, fmt=None):
+        """Iterate rows of an export file.
+
+        :param path: path to an export file
+        :param fmt:  'csv' or 'json'; guessed from a file extension if not
+                     passed
+
+        :type path: str
+        :type fmt:  str
+
+        :return: generator of rows
+        :rtype:  generator of dict
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDImportError
+        """
+        fmt = fmt or self.FORMATS.get(splitext(path)[1].lower())
+        if fmt not in (self.CSV, self.JSON):
+            raise SLRDImportError(self.ERRMSG_FORMAT % (fmt or path))
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                if fmt == self.CSV:
+                    yield from csv.DictReader(f)
+                else:
+                    yield from self.__iter_json(_JSONStream(f,
+                                                            self.READ_CHUNK))
+        except (OSError, ValueError, csv.Error) as e:
+            raise SLRDImportError(self.ERRMSG_MALFORMED % (path, e))
+
+    def __iter_json(self, stream):
+        """Iterate records of a JSON export.
+
+        A top-level array is a list of records. A top-level object is either
+        a wrapper with an 'items' array or a first record of JSON Lines.
+        """
+        first = stream.peek()
+        if first == '[':
+            yield from stream.items()
+            return
+        if first == '{':
+            stream.take('{')
+            record = {}
+            while stream.peek() != '}':
+                key = stream.value()
+                stream.take(':')
+                if key == self.ITEMS_KEY and stream.peek() == '[':
+                    yield from stream.items()
+                    return
+                record[key] = stream.value()
+                if stream.peek() == ',':
+                    stream.take(',')
+            stream.take('}')
+            yield record
+        while stream.peek():
+            yield stream.value()
+
+    @staticmethod
+    def __field(row, path):
+        """Get a (nested) field of a row by a dotted path."""
+        value = row
+        for part in path.split('.'):
+            if isinstance(value, dict):
+                value = value.get(part)
+            elif isinstance(value, list) and part.isdigit() and \
+                    int(part) < len(value):
+                value = value[int(part)]
+            else:
+                return None
+        return value
+
+    def __mapped(self, rows, keys, mapping):
+        """Map rows to (template keys, meta fields)."""
+        columns = {name: (mapping[name],) if name in mapping else
+                   self.FIELD_ALIASES.get(name, (name,))
+                   for name in keys + self.META_FIELDS}
+        field = self.__field
+        for row in rows:
+            mapped = {}
+            for name, paths in columns.items():
+                for path in paths:
+                    value = field(row, path)
+                    if value not in (None, ''):
+                        mapped[name] = value
+                        break
+            yield ({k: mapped[k] for k in keys if k in mapped},
+                   {k: mapped.get(k) for k in self.META_FIELDS})
+
+    @staticmethod
+    def site_of(url):
+        """Get a site name (as in the sites keyfile) of a URL.
+
+        :param url: URL of an export entry (i.e. https://www.fb.com/login)
+        :type url:  str
+
+        :return: site name (i.e. fb.com) or None
+        :rtype:  str
+        """
+        if not isinstance(url, str) or not url.strip():
+            return None
+        url = url.strip()
+        try:
+            host = urlsplit(url if '//' in url else '//' + url).hostname
+        except ValueError:
+            return None
+        if host and host.startswith('www.'):
+            host = host[4:]
+        return host or None
+
+    def __linkfile(self, token, number, keys, meta, template):
+        """Build a linkfile of a mapped row."""
+        lid = sha256(b'%s:%i' % (token.encode(), number)).hexdigest()
+        created_on = meta['created_on']
+        if TimelineManager.parse_stamp(created_on) is None:
+            created_on = datetime.now(timezone.utc).strftime(
+                    TimelineManager.CREATED_ON_FORMAT) + ' UTC'
+        data = {'id': lid[:self.ID_LENGTH], 'template': template,
+                'keys': keys, 'created_on': created_on}
+        for field in ('notes', 'title'):
+            if meta[field] is not None:
+                data[field] = meta[field]
+        return LinkType.from_parsed(data)
+
+    def __write_keyfile(self, state, pending):
+        """Write {key: {value: [linkfile ids]}} of a batch into a keyfile."""
+        if not pending:
+            return
+        if not fsctrl.dir_exists(self.keyfile_dir):
+            fsctrl.create_dir(self.keyfile_dir, 0o700)
+        batch = (state['rows'] - 1) // self.batch_size
+        name = self.KEYFILE_NAME % (state['token'][:16], batch)
+        fsctrl.write_to_file(self.codec.dumps(pending),
+                             join(self.keyfile_dir, name),
+                             mode=self.FILE_MODE, force=True)
+
+    def __commit(self, state, pending):
+        """Write a batch out and save a checkpoint after it."""
+        self.containers.flush()
+        with fsctrl.group_commit():
+            self.__write_keyfile(state, pending)
+            fsctrl.write_to_file(codec_registry.get('json').dumps(state),
+                                 self.checkpoint_path, mode=self.FILE_MODE,
+                                 force=True)
+        pending.clear()
+        self.logger.info(self.LOGSTR_BATCH, state['rows'], state['imported'])
+
+    def __checkpoint(self, source, st, resume):
+        """Get a state of an import to resume (a fresh one if there's none)."""
+        if resume and fsctrl.file_exists(self.checkpoint_path):
+            try:
+                state = codec_registry.get('json').loads(
+                        fsctrl.read_file(self.checkpoint_path))
+                if (state['source'], state['size'], state['mtime']) == \
+                        (source, st.st_size, st.st_mtime_ns):
+                    return state
+            except (SLRDFSCtrlReadException, ValueError, KeyError,
+                    TypeError):
+                pass
+            self.logger.warning(self.LOGSTR_STALE, self.checkpoint_path)
+        return {'source': source, 'size': st.st_size,
+                'mtime': st.st_mtime_ns,
+                'token': random_utils.get_random_string(self.ID_LENGTH),
+                'rows': 0, 'imported': 0, 'skipped': 0}
+
+    def run(self, path, fmt=None, template=None, mapping=None, resume=True):
+        """Import an export file.
+
+        :param path:     path to an export file
+        :param fmt:      'csv' or 'json' (guessed from an extension if not
+                         passed)
+        :param template: name of a template to create linkfiles with; keys
+                         of a template are filled from export columns (see
+                         self.FIELD_ALIASES) and linkfiles are validated
+        :param mapping:  {key or meta field name: export column} overriding
+                         self.FIELD_ALIASES (i.e. {'site': 'login_url'})
+        :param resume:   continue after a checkpoint of an interrupted
+                         import of the same file
+
+        :type path:     str
+        :type fmt:      str
+        :type template: str
+        :type mapping:  dict
+        :type resume:   bool
+
+        :return: amounts of rows, imported and skipped entries and
+                 [(row number, error messages)] of first rejected rows
+        :rtype:  dict
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDImportError,
+                 slrd.exceptions.manager_exceptions.
+                 SLRDTemplateValidationError,
+                 slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        source = abspath(expanduser(path))
+        try:
+            st = stat(source)
+        except OSError as e:
+            raise SLRDImportError(self.ERRMSG_MALFORMED % (source, e))
+        validator = None
+        if template is not None:
+            if self.validators is None:
+                raise SLRDIllegalArgumentError(self.ERRMSG_NO_VALIDATORS %
+                                               template)
+            validator = self.validators.validator(template)
+            keys = validator.template.keys
+        else:
+            keys = tuple(k for k in self.FIELD_ALIASES
+                         if k not in self.META_FIELDS)
+        state = self.__checkpoint(source, st, resume)
+        self.logger.info(self.LOGSTR_START, source, fmt or 'auto',
+                         state['rows'])
+        rows = islice(self.__mapped(self.read(source, fmt), keys,
+                                    mapping or {}), state['rows'], None)
+        errors, pending = [], {}
+        for number, (found, meta) in enumerate(rows, state['rows'] + 1):
+            linkfile = self.__linkfile(state['token'], number, found, meta,
+                                       template)
+            problems = validator.errors(found) if validator else []
+            if problems:
+                state['skipped'] += 1
+                if len(errors) < self.MAX_ERRORS:
+                    errors.append((number, problems))
+                self.logger.warning(self.LOGSTR_REJECTED, number,
+                                    '; '.join(problems))
+            else:
+                self.containers.put(linkfile.id, self.record_codec.dumps(
+                        linkfile.to_dict()))
+                self.__index(pending, linkfile, self.site_of(meta['site']))
+                state['imported'] += 1
+            state['rows'] = number
+            if number % self.batch_size == 0:
+                self.__commit(state, pending)
+        self.__commit(state, pending)
+        fsctrl.delete_file(self.checkpoint_path)
+        self.logger.info(self.LOGSTR_DONE, state['rows'], state['imported'],
+                         state['skipped'])
+        return {'rows': state['rows'], 'imported': state['imported'],
+                'skipped': state['skipped'], 'errors': errors}
+
+    def __index(self, pending, linkfile, site):
+        """Queue keyfile references of an imported linkfile."""
+        refs = [(self.SITES_KEY, site)] if site else []
+        refs.extend((key, value) for key, value in
+                    zip(linkfile.key_names, linkfile.key_values)
+                    if key not in self.SECRET_KEYS and
+                    isinstance(value, (str, int, float)))
+        for key, value in refs:
+            pending.setdefault(key, {}).setdefault(str(value), []).append(
+                    linkfile.id)
@@ -0,0 +1,756 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""In-memory index over keyfiles and linkfiles.
+
+This module provides an index that is built once from the keyfiles and
+linkfiles stored in a base directory and then answers all queries from hash
+maps kept in RAM. Files are parsed only on load (or when a single file is
+re-indexed), never on query.
+
+Layout of a base directory expected by the index:
+
+```
+<base_dir>/
+    keyfiles/   # first_name: {John: [linkfile ids]}, sites: {...} etc.
+    linkfiles/  # id: <id>, template: <name>, keys: {...}, created_on: ...
+    templates/  # name: <name>, link: fb.com/login, keys: [...] etc.
+```
+
+Linkfile ids are mapped to small integer ordinals so that posting lists can be
+stored as compact unsigned int arrays instead of lists of strings. All keys,
+values and ids are interned. Linkfiles are kept as slrd.types.LinkType models
+(__slots__, no per-linkfile dicts).
+
+Several keyfiles may define the same key: their postings are merged, and
+every keyfile keeps its own postings so that it can be re-indexed or removed
+without touching what other keyfiles define.
+
+Registration times (linkfile created_on) are kept in a time-ordered index
+updated along with linkfiles (see slrd.managers.timeline_manager).
+
+Site names and template links can be searched by prefix or fuzzily (see
+slrd.managers.search_manager); a search index is built on first search and
+dropped whenever sites or templates change.
+
+Linkfiles may also be stored as records of encrypted containers (i.e. ones
+imported by slrd.managers.import_manager). If a container manager is
+attached, those records are decrypted and indexed along with linkfiles/ on
+every load; they're registered under <container dir>/<record key> instead of
+a file path.
+
+Files are re-indexed one by one as they change (see self.reindex_path() and
+slrd.managers.watch_manager); containers are re-read too if a container
+manager is attached, and so are linkfiles stored in them. Every public
+method holds an index lock, so readers never see a file half re-indexed
+(removed but not added back yet).
+
+Classes:
+    - IndexManager
+"""
+from array import array
+from functools import wraps
+from itertools import chain
+from os import scandir
+from os.path import abspath, expanduser, isfile, join, relpath, split
+from sys import intern
+from threading import RLock
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDIllegalArgumentError, SLRDRuntimeException
+from slrd.exceptions import SLRDFSCtrlReadException
+from slrd.managers.search_manager import SearchManager
+from slrd.managers.timeline_manager import TimelineManager
+from slrd.strings import comlogstr
+from slrd.types.key_type import KeyType
+from slrd.types.link_type import LinkType
+from slrd.types.template_type import TemplateType
+from slrd.utils import codec_registry
+from slrd.utils.lazy_logger import LazyLogger
+
+
+def _locked(method):
+    """Run a method of an index holding its lock."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class IndexManager(object):
+    """Keep an index of keyfiles and linkfiles in RAM."""
+
+    KEYFILE_DIR = 'keyfiles'
+    LINKFILE_DIR = 'linkfiles'
+    TEMPLATE_DIR = 'templates'
+    SITES_KEY = 'sites'
+    ID_ARRAY_TYPE = 'I'
+    RECORD_FORMAT = 'json'  # of linkfiles stored as container records
+
+    LOGSTR_LOAD_START = 'loading index from: %s'
+    LOGSTR_LOAD_END = 'index loaded: %i keyfiles, %i linkfiles, ' \
+                      '%i templates, %i ids'
+    LOGSTR_NO_DIR = 'index directory do not exist -> nothing to load: %s'
+    LOGSTR_SKIP_FILE = 'skipping file that failed to load: %s: %s'
+    LOGSTR_ADD_KEYFILE = 'indexed keyfile: %s, keys: %s'
+    LOGSTR_ADD_LINKFILE = 'indexed linkfile: %s, id: %s'
+    LOGSTR_DEL_KEYFILE = 'removed keyfile from index: %s'
+    LOGSTR_DEL_LINKFILE = 'removed linkfile from index: %s'
+    LOGSTR_ADD_TEMPLATE = 'indexed template: %s, name: %s'
+    LOGSTR_DEL_TEMPLATE = 'removed template from index: %s'
+
+    ERRMSG_BAD_KEYFILE = 'malformed keyfile: %s'
+    ERRMSG_BAD_LINKFILE = 'malformed linkfile (no id): %s'
+    ERRMSG_BAD_TEMPLATE = 'malformed template (no name): %s'
+
+    def __init__(self, base_dir, lformat='yaml', containers=None):
+        """Initialization method.
+
+        Nothing is loaded here; call self.load() to build the index.
+
+        :param base_dir:   path to a data storage root
+        :param lformat:    format keyfiles, linkfiles and templates are
+                           stored in (see slrd.utils.codec_registry)
+        :param containers: containers to index linkfile records of and to
+                           re-read along with changed files (see
+                           self.reindex_path())
+
+        :type base_dir:   str
+        :type lformat:    str
+        :type containers: slrd.managers.container_manager.ContainerManager
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        self.keyfile_dir = join(self.base_dir, self.KEYFILE_DIR)
+        self.linkfile_dir = join(self.base_dir, self.LINKFILE_DIR)
+        self.template_dir = join(self.base_dir, self.TEMPLATE_DIR)
+        self.lformat = lformat
+        self.containers = containers
+        codec_registry.get(lformat)  # fail early on unknown formats
+        self.record_codec = codec_registry.get(self.RECORD_FORMAT)
+        self._lock = RLock()
+        self._timeline = TimelineManager(
+                lambda ordinal: self._ids[ordinal], self.__find_ordinal,
+                self.__template_of)
+        self.clear()
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    @_locked
+    def clear(self):
+        """Drop everything that was indexed so far."""
+        self._ids = []             # ordinal -> linkfile id
+        self._ordinals = {}        # linkfile id -> ordinal
+        self._keys = {}            # key -> {value -> array of ordinals}
+        self._linkfiles = {}       # ordinal -> LinkType
+        self._keyfile_keys = {}    # keyfile path -> {key -> {value -> array}}
+        self._key_owners = {}      # key -> paths of keyfiles defining it
+        self._linkfile_paths = {}  # linkfile path -> ordinal
+        self._templates = {}       # template path -> TemplateType
+        self._template_paths = {}  # template name -> template path
+        self._search = None        # built on first search
+        self._timeline.clear()
+
+    def __find_ordinal(self, lid):
+        """Get an ordinal of a linkfile id (None if there is none)."""
+        return self._ordinals.get(lid)
+
+    def __template_of(self, ordinal):
+        """Get a template name of a linkfile (None if there is none)."""
+        linkfile = self._linkfiles.get(ordinal)
+        return None if linkfile is None else linkfile.template
+
+    @_locked
+    def load(self):
+        """(Re)build the whole index from a base directory.
+
+        Files that fail to load or parse are logged and skipped so that a
+        single broken file does not prevent the index from being built.
+        """
+        self.logger.info(self.LOGSTR_LOAD_START, self.base_dir)
+        self.clear()
+        for path in self.__list_files(self.keyfile_dir):
+            self.__safe_add(self.add_keyfile, path)
+        for path in self.__list_files(self.linkfile_dir):
+            self.__safe_add(self.add_linkfile, path)
+        for path in self.__list_files(self.template_dir):
+            self.__safe_add(self.add_template, path)
+        self.__load_records()
+        self.logger.info(self.LOGSTR_LOAD_END, len(self._keyfile_keys),
+                         len(self._linkfile_paths), len(self._templates),
+                         len(self._ids))
+
+    def __list_files(self, path):
+        """List regular files in a directory (non-recursive, sorted).
+
+        :param path: absolute path to a directory
+        :type path:  str
+
+        :return: absolute paths to files
+        :rtype:  list
+        """
+        if not fsctrl.dir_exists(path):
+            self.logger.warning(self.LOGSTR_NO_DIR, path)
+            return []
+        with scandir(path) as it:
+            return sorted(e.path for e in it if e.is_file() and
+                          not fsctrl.is_temp_name(e.name))
+
+    def __load_records(self):
+        """(Re)index all linkfiles stored in attached containers.
+
+        Containers are (re)loaded as well: record values come out of that
+        single pass, so no container is decrypted twice.
+        """
+        if self.containers is None:
+            return
+        for path in [path for path in self._linkfile_paths
+                     if split(path)[0] == self.containers.container_dir]:
+            self.remove_linkfile(path)
+        values = {}
+        self.containers.load(values)
+        for key in sorted(values):
+            self.__add_record(key, values[key])
+
+    def __add_record(self, key, value):
+        """Index (or drop if value is None) a linkfile stored in containers.
+
+        :param key:   record key (linkfile id)
+        :param value: encoded linkfile
+        :type key:    str
+        :type value:  bytes
+        """
+        path = join(self.containers.container_dir, key)
+        if value is None:
+            self.remove_linkfile(path)
+            return
+        try:
+            content = self.record_codec.loads(value)
+        except ValueError as e:
+            self.logger.error(self.LOGSTR_SKIP_FILE, path, e)
+            return
+        self.__safe_add(self.add_linkfile, path, content)
+
+    def __safe_add(self, add_func, path, content=None):
+        """Call add_func(path, content) logging and swallowing load errors."""
+        try:
+            add_func(path, content)
+        except (SLRDFSCtrlReadException, SLRDIllegalArgumentError) as e:
+            self.logger.error(self.LOGSTR_SKIP_FILE, path, e)
+
+    def __ordinal(self, lid):
+        """Get (allocate if needed) an ordinal of a linkfile id.
+
+        :param lid: linkfile id
+        :type lid:  str
+
+        :return: ordinal of a linkfile id
+        :rtype:  int
+        """
+        ordinal = self._ordinals.get(lid)
+        if ordinal is None:
+            lid = intern(lid)
+            ordinal = len(self._ids)
+            self._ids.append(lid)
+            self._ordinals[lid] = ordinal
+        return ordinal
+
+    def __postings(self, ids):
+        """Convert a tuple of linkfile ids into a compact array of ordinals.
+
+        Duplicates are dropped, an order of first occurrence is kept.
+        """
+        ordinal = self.__ordinal
+        return array(self.ID_ARRAY_TYPE, dict.fromkeys(map(ordinal, ids)))
+
+    def __merge(self, key, values):
+        """Recompute merged postings of key values after a keyfile change.
+
+        A value defined by a single keyfile shares its postings array.
+
+        :param key:    key name
+        :param values: values to recompute
+
+        :type key:    str
+        :type values: iterable of str
+        """
+        owners = self._key_owners.get(key)
+        if not owners:
+            self._keys.pop(key, None)
+            return
+        defined = [self._keyfile_keys[path][key] for path in owners]
+        merged = self._keys.setdefault(key, {})
+        for value in values:
+            found = [own[value] for own in defined if value in own]
+            if not found:
+                merged.pop(value, None)
+            elif len(found) == 1:
+                merged[value] = found[0]
+            else:
+                merged[value] = array(self.ID_ARRAY_TYPE, dict.fromkeys(
+                        chain.from_iterable(found)))
+
+    @_locked
+    def add_keyfile(self, path, content=None):
+        """Index (or re-index) a single keyfile.
+
+        Values a keyfile defines are merged with values other keyfiles
+        define for the same keys; whatever it defined before is replaced.
+
+        :param path:    absolute path to a keyfile
+        :param content: already parsed content of a keyfile; loaded from path
+                        when not passed
+
+        :type path:    str
+        :type content: dict
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        if content is None:
+            content = fsctrl.load_formatted_file(path, self.lformat)
+        try:
+            keys = KeyType.from_keyfile(content)
+        except SLRDIllegalArgumentError:
+            raise SLRDFSCtrlReadException(self.ERRMSG_BAD_KEYFILE % path)
+        parsed = {key.name: {value: self.__postings(ids)
+                             for value, ids in key.items()}
+                  for key in keys}
+        self.remove_keyfile(path)
+        self._keyfile_keys[path] = parsed
+        for key, values in parsed.items():
+            self._key_owners.setdefault(key, []).append(path)
+            self.__merge(key, values)
+        if self.SITES_KEY in parsed:
+            self._search = None
+        self.logger.debug(self.LOGSTR_ADD_KEYFILE, path, tuple(parsed))
+
+    @_locked
+    def remove_keyfile(self, path):
+        """Drop values defined by a keyfile from the index.
+
+        Values other keyfiles define for the same keys are kept.
+
+        :param path: absolute path to a keyfile
+        :type path:  str
+        """
+        keys = self._keyfile_keys.pop(path, None)
+        if keys is None:
+            return
+        for key, values in keys.items():
+            owners = self._key_owners[key]
+            owners.remove(path)
+            if not owners:
+                del self._key_owners[key]
+            self.__merge(key, values)
+        if self.SITES_KEY in keys:
+            self._search = None
+        self.logger.debug(self.LOGSTR_DEL_KEYFILE, path)
+
+    @_locked
+    def add_linkfile(self, path, content=None):
+        """Index (or re-index) a single linkfile.
+
+        :param path:    absolute path to a linkfile
+        :param content: already parsed content of a linkfile; loaded from path
+                        when not passed
+
+        :type path:    str
+        :type content: dict
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        if content is None:
+            content = fsctrl.load_formatted_file(path, self.lformat)
+        try:
+            linkfile = LinkType.from_parsed(content)
+        except SLRDIllegalArgumentError:
+            raise SLRDFSCtrlReadException(self.ERRMSG_BAD_LINKFILE % path)
+        self.remove_linkfile(path)
+        ordinal = self.__ordinal(linkfile.id)
+        self._linkfiles[ordinal] = linkfile
+        self._linkfile_paths[path] = ordinal
+        self._timeline.add(ordinal,
+                           TimelineManager.parse_stamp(linkfile.created_on))
+        self.logger.debug(self.LOGSTR_ADD_LINKFILE, path, linkfile.id)
+
+    @_locked
+    def remove_linkfile(self, path):
+        """Drop a linkfile from the index.
+
+        An ordinal of a linkfile id is kept as keyfiles may still refer to it.
+
+        :param path: absolute path to a linkfile
+        :type path:  str
+        """
+        ordinal = self._linkfile_paths.pop(path, None)
+        if ordinal is None:
+            return
+        self._linkfiles.pop(ordinal, None)
+        self._timeline.remove(ordinal)
+        self.logger.debug(self.LOGSTR_DEL_LINKFILE, path)
+
+    @_locked
+    def add_template(self, path, content=None):
+        """Index (or re-index) a single template.
+
+        :param path:    absolute path to a template
+        :param content: already parsed content of a template; loaded from path
+                        when not passed
+
+        :type path:    str
+        :type content: dict
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError,
+                 slrd.exceptions.controller_exceptions.SLRDFSCtrlReadException
+        """
+        if content is None:
+            content = fsctrl.load_formatted_file(path, self.lformat)
+        try:
+            template = TemplateType.from_parsed(content)
+        except SLRDIllegalArgumentError:
+            raise SLRDFSCtrlReadException(self.ERRMSG_BAD_TEMPLATE % path)
+        self.remove_template(path)
+        self._templates[path] = template
+        self._template_paths[template.name] = path
+        self._search = None
+        self.logger.debug(self.LOGSTR_ADD_TEMPLATE, path, template.name)
+
+    @_locked
+    def remove_template(self, path):
+        """Drop a template from the index.
+
+        :param path: absolute path to a template
+        :type path:  str
+        """
+        template = self._templates.pop(path, None)
+        if template is None:
+            return
+        if self._template_paths.get(template.name) == path:
+            del self._template_paths[template.name]
+            for other, rest in self._templates.items():  # same name elsewhere
+                if rest.name == template.name:
+                    self._template_paths[template.name] = other
+        self._search = None
+        self.logger.debug(self.LOGSTR_DEL_TEMPLATE, path)
+
+    @_locked
+    def dump_state(self):
+        """Export the index as built-in types only (for serialization).
+
+        Paths are stored relative to self.base_dir and posting lists as raw
+        bytes of id ordinal arrays: merged ones under keys and ones of every
+        keyfile under keyfile_keys.
+
+        :return: index state
+        :rtype:  dict
+        """
+        base = self.base_dir
+        return {
+            'ids': list(self._ids),
+            'keys': {key: {value: postings.tobytes()
+                           for value, postings in values.items()}
+                     for key, values in self._keys.items()},
+            'linkfiles': {ordinal: linkfile.to_dict()
+                          for ordinal, linkfile in self._linkfiles.items()},
+            'keyfile_keys': {relpath(path, base): {
+                                 key: {value: postings.tobytes()
+                                       for value, postings in values.items()}
+                                 for key, values in keys.items()}
+                             for path, keys in self._keyfile_keys.items()},
+            'linkfile_paths': {relpath(path, base): ordinal
+                               for path, ordinal in
+                               self._linkfile_paths.items()},
+            'templates': {relpath(path, base): template.to_dict()
+                          for path, template in self._templates.items()},
+        }
+
+    @_locked
+    def shared_state(self):
+        """Export what a shared index is built from.
+
+        Unlike self.dump_state() keyfiles and paths are left out and
+        linkfiles and templates are not copied: they are replaced on
+        re-indexing, never changed in place, so a shared index can tell
+        unchanged ones by identity (see slrd.managers.shared_index_manager).
+
+        :return: {'ids': [ids], 'keys': {key: {value: postings as bytes}},
+                 'linkfiles': {ordinal: LinkType},
+                 'templates': {path: TemplateType}}
+        :rtype:  dict
+        """
+        return {
+            'ids': list(self._ids),
+            'keys': {key: {value: postings.tobytes()
+                           for value, postings in values.items()}
+                     for key, values in self._keys.items()},
+            'linkfiles': dict(self._linkfiles),
+            'templates': dict(self._templates),
+        }
+
+    @_locked
+    def load_state(self, state):
+        """Replace the index with a state exported by self.dump_state().
+
+        :param state: index state
+        :type state:  dict
+
+        :raises: KeyError, TypeError, ValueError on a malformed state
+        """
+        ids = [intern(lid) for lid in state['ids']]
+        base = self.base_dir
+        keyfiles = {}
+        for path, keys in state['keyfile_keys'].items():
+            parsed = keyfiles[join(base, path)] = {}
+            for key, values in keys.items():
+                postings = parsed[intern(key)] = {}
+                for value, raw in values.items():
+                    own = postings[intern(value)] = array(self.ID_ARRAY_TYPE)
+                    own.frombytes(raw)
+        linkfiles = {}
+        try:
+            for ordinal, linkfile in state['linkfiles'].items():
+                linkfiles[ordinal] = LinkType.from_parsed(linkfile)
+            templates = {path: TemplateType.from_parsed(template)
+                         for path, template in state['templates'].items()}
+        except SLRDIllegalArgumentError as e:
+            raise ValueError(e)
+        self.clear()
+        self._ids = ids
+        self._ordinals = {lid: ordinal for ordinal, lid in enumerate(ids)}
+        self._linkfiles = linkfiles
+        self._keyfile_keys = keyfiles
+        for path in sorted(keyfiles):  # same merge order as self.load()
+            for key in keyfiles[path]:
+                self._key_owners.setdefault(key, []).append(path)
+        for key, owners in self._key_owners.items():
+            self.__merge(key, dict.fromkeys(chain.from_iterable(
+                    keyfiles[path][key] for path in owners)))
+        self._linkfile_paths = {join(base, path): ordinal for path, ordinal
+                                in state['linkfile_paths'].items()}
+        self._templates = {join(base, path): template
+                           for path, template in templates.items()}
+        self._template_paths = {template.name: path for path, template
+                                in self._templates.items()}
+        self._timeline.load(
+                (ordinal, TimelineManager.parse_stamp(linkfile.created_on))
+                for ordinal, linkfile in linkfiles.items())
+        self.__load_records()
+
+    def watch_dirs(self):
+        """Get directories the index is built from.
+
+        :return: absolute paths to directories
+        :rtype:  tuple
+        """
+        dirs = (self.keyfile_dir, self.linkfile_dir, self.template_dir)
+        if self.containers is not None:
+            dirs += tuple(self.containers.watch_dirs())
+        return dirs
+
+    def reindex_path(self, path):
+        """Bring a single changed file in sync with the index.
+
+        The file is re-indexed if it exists and dropped from the index
+        otherwise; a container is handed to an attached container manager
+        and linkfiles stored in it are re-indexed.
+        Files outside of self.watch_dirs() and temporary files of writes in
+        progress are ignored. A file is parsed before an index lock is taken,
+        so readers only wait for its old entry to be swapped for a new one.
+
+        :param path: absolute path to a changed file
+        :type path:  str
+
+        :return: whether the path belongs to the index
+        :rtype:  bool
+        """
+        keys = set()
+        if self.containers is not None and \
+                self.containers.reindex_path(path, keys):
+            for key in sorted(keys):
+                try:
+                    value = self.containers.get(key)
+                except SLRDRuntimeException as e:  # parts still on their way
+                    self.logger.error(self.LOGSTR_SKIP_FILE, path, e)
+                    continue
+                self.__add_record(key, value)
+            return True
+        parent, name = split(path)
+        if fsctrl.is_temp_name(name):
+            return False
+        if parent == self.keyfile_dir:
+            add_func, rm_func = self.add_keyfile, self.remove_keyfile
+        elif parent == self.linkfile_dir:
+            add_func, rm_func = self.add_linkfile, self.remove_linkfile
+        elif parent == self.template_dir:
+            add_func, rm_func = self.add_template, self.remove_template
+        else:
+            return False
+        if not isfile(path):
+            rm_func(path)
+            return True
+        try:
+            content = fsctrl.load_formatted_file(path, self.lformat)
+        except (SLRDFSCtrlReadException, SLRDIllegalArgumentError) as e:
+            self.logger.error(self.LOGSTR_SKIP_FILE, path, e)
+            return True
+        self.__safe_add(add_func, path, content)
+        return True
+
+    @_locked
+    def lookup(self, key, value):
+        """Get ids of linkfiles a key value is used in.
+
+        :param key:   key name (i.e. first_name)
+        :param value: key value (i.e. John)
+
+        :type key:   str
+        :type value: str
+
+        :return: linkfile ids
+        :rtype:  tuple
+        """
+        postings = self._keys.get(key, {}).get(value)
+        if not postings:
+            return ()
+        ids = self._ids
+        return tuple([ids[o] for o in postings])
+
+    def lookup_site(self, site):
+        """Get ids of linkfiles registered on a site.
+
+        :param site: site name as stored in the sites keyfile (i.e. fb.com)
+        :type site:  str
+
+        :return: linkfile ids
+        :rtype:  tuple
+        """
+        return self.lookup(self.SITES_KEY, site)
+
+    @_locked
+    def values(self, key):
+        """Get all indexed values of a key.
+
+        :param key: key name
+        :type key:  str
+
+        :return: values of a key
+        :rtype:  tuple
+        """
+        return tuple(self._keys.get(key, ()))
+
+    @_locked
+    def keys(self):
+        """Get all indexed key names.
+
+        :return: key names
+        :rtype:  tuple
+        """
+        return tuple(self._keys)
+
+    def sites(self):
+        """Get all indexed site names.
+
+        :return: site names
+        :rtype:  tuple
+        """
+        return self.values(self.SITES_KEY)
+
+    @_locked
+    def get_linkfile(self, lid):
+        """Get a parsed linkfile by its id.
+
+        :param lid: linkfile id
+        :type lid:  str
+
+        :return: linkfile or None if it's not indexed
+        :rtype:  slrd.types.link_type.LinkType
+        """
+        ordinal = self._ordinals.get(lid)
+        if ordinal is None:
+            return None
+        return self._linkfiles.get(ordinal)
+
+    @_locked
+    def linkfile_count(self):
+        """Get an amount of indexed linkfiles.
+
+        :rtype: int
+        """
+        return len(self._linkfiles)
+
+    @_locked
+    def templates(self):
+        """Get all indexed templates.
+
+        :return: templates
+        :rtype:  tuple
+        """
+        return tuple(self._templates.values())
+
+    @_locked
+    def get_template(self, name):
+        """Get a template by its name.
+
+        :param name: template name (i.e. Facebook registration template)
+        :type name:  str
+
+        :return: template or None if it's not indexed
+        :rtype:  slrd.types.template_type.TemplateType
+        """
+        return self._templates.get(self._template_paths.get(name))
+
+    @_locked
+    def search(self, query, limit=None):
+        """Find site names and template links by a (partial) query.
+
+        :param query: text typed by a user (i.e. faceb)
+        :param limit: maximum amount of results
+
+        :type query: str
+        :type limit: int
+
+        :return: ranked [(term, kind, reference, score)], see
+                 slrd.managers.search_manager.SearchManager.search()
+        :rtype:  list
+        """
+        search = self._search
+        if search is None:
+            search = self._search = SearchManager.from_index(
+                    self.sites(), self._templates.values())
+        return search.search(query, limit)
+
+    @_locked
+    def timeline(self, start=None, end=None, site=None, template=None,
+                 limit=None, cursor=None, reverse=False):
+        """Get a page of linkfiles ordered by registration time.
+
+        Linkfiles without a parsable created_on field are not on a timeline.
+
+        :param start:    lowest UNIX timestamp (inclusive)
+        :param end:      highest UNIX timestamp (exclusive)
+        :param site:     only registrations on a site (i.e. fb.com)
+        :param template: only registrations made with a template
+        :param limit:    maximum amount of entries
+        :param cursor:   cursor returned along with a previous page
+        :param reverse:  newest entries first
+
+        :type start:    int
+        :type end:      int
+        :type site:     str
+        :type template: str
+        :type limit:    int
+        :type cursor:   tuple
+        :type reverse:  bool
+
+        :return: [(linkfile id, timestamp)] and a cursor of a next page (None
+                 if it's the last one)
+        :rtype:  tuple
+        """
+        candidates = None
+        if site is not None:
+            candidates = self._keys.get(self.SITES_KEY, {}).get(site, ())
+        return self._timeline.query(start, end, candidates, template, limit,
+                                    cursor, reverse)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Persist data keys used by a hybrid GPG controller mode.
+
+Data keys are generated by GPGController, wrapped with a GPG key and stored
+in a base directory, one file per epoch. A separate file points to the
+current epoch (the one new data is sealed with). Keys of previous epochs are
+kept and loaded so that data sealed with them can still be decrypted.
+
+Classes:
+    - KeyManager
+"""
+from os.path import abspath, expanduser, join
+from slrd.controllers import fsctrl
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class KeyManager(object):
+    """Load, create and rotate wrapped data keys."""
+
+    KEY_DIR = 'keys'
+    CURRENT_NAME = 'current'
+    KEY_DIR_MODE = 0o700
+    KEY_MODE = 0o600
+
+    LOGSTR_LOADED = 'loaded %i data keys, current epoch: %s'
+    LOGSTR_ROTATED = 'started a new data key epoch: %s'
+    LOGSTR_REPLACED = 'data key epoch %s replaced %i other keys'
+
+    def __init__(self, base_dir, gpgctrl):
+        """Initialization method.
+
+        :param base_dir: path to a data storage root
+        :param gpgctrl:  controller to load data keys into
+
+        :type base_dir: str
+        :type gpgctrl:  slrd.controllers.gpg_controller.GPGController
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.key_dir = join(abspath(expanduser(base_dir)), self.KEY_DIR)
+        self.current_path = join(self.key_dir, self.CURRENT_NAME)
+        self.gpgctrl = gpgctrl
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def wrapped_keys(self):
+        """Get every stored data key (still wrapped).
+
+        :return: {epoch: ASCII-armored wrapped data key}
+        :rtype:  dict
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        return {path.rsplit('/', 1)[1]: fsctrl.read_file(path)
+                for path in sorted(fsctrl.scan_dir(self.key_dir))
+                if path != self.current_path}
+
+    def load(self):
+        """Load all data keys and switch a controller to hybrid mode.
+
+        A first data key is created if there are none yet.
+
+        :return: current epoch
+        :rtype:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        paths = [path for path in sorted(fsctrl.scan_dir(self.key_dir))
+                 if path != self.current_path]
+        for path in paths:
+            self.gpgctrl.load_data_key(fsctrl.read_file(path), current=False)
+        if not paths or not fsctrl.file_exists(self.current_path):
+            return self.rotate()
+        epoch = fsctrl.read_file(self.current_path).strip()
+        current = fsctrl.read_file(join(self.key_dir, epoch))
+        epoch = self.gpgctrl.load_data_key(current)
+        self.logger.info(self.LOGSTR_LOADED, len(paths), epoch)
+        return epoch
+
+    def rotate(self):
+        """Start a new epoch: new data is sealed with a fresh data key.
+
+        :return: new epoch
+        :rtype:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        if not fsctrl.dir_exists(self.key_dir):
+            fsctrl.create_dir(self.key_dir, self.KEY_DIR_MODE)
+        wrapped = self.gpgctrl.generate_data_key()
+        epoch = self.gpgctrl.load_data_key(wrapped, current=False)
+        fsctrl.write_to_file(wrapped, join(self.key_dir, epoch),
+                             mode=self.KEY_MODE, force=True)
+        fsctrl.write_to_file(epoch, self.current_path, mode=self.KEY_MODE,
+                             force=True)
+        self.gpgctrl.load_data_key(wrapped)
+        self.logger.info(self.LOGSTR_ROTATED, epoch)
+        return epoch
+
+    def replace(self, wrapped):
+        """Make a data key the only (and current) one.
+
+        Meant for the end of a GPG key rotation: once every container is
+        sealed with a new data key, keys wrapped with a retired GPG key are
+        deleted.
+
+        :param wrapped: data key wrapped with a current GPG key
+        :type wrapped:  str
+
+        :return: epoch of a data key
+        :rtype:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        if not fsctrl.dir_exists(self.key_dir):
+            fsctrl.create_dir(self.key_dir, self.KEY_DIR_MODE)
+        self.gpgctrl.unload_data_keys()
+        epoch = self.gpgctrl.load_data_key(wrapped)
+        fsctrl.write_to_file(wrapped, join(self.key_dir, epoch),
+                             mode=self.KEY_MODE, force=True)
+        fsctrl.write_to_file(epoch, self.current_path, mode=self.KEY_MODE,
+                             force=True)
+        stale = [path.rsplit('/', 1)[1]
+                 for path in fsctrl.scan_dir(self.key_dir)
+                 if path not in (self.current_path, join(self.key_dir, epoch))]
+        if stale:
+            fsctrl.delete_many(self.key_dir, stale)
+        self.logger.info(self.LOGSTR_REPLACED, epoch, len(stale))
+        return epoch
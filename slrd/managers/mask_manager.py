@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Mask real updates with fake ones.
+
+Every now and then a random subset of idle containers is re-encrypted with
+fresh padding and given random timestamps (see ContainerManager.rewrite()).
+Since all containers have the same size, a rewritten container can't be told
+apart from one holding real changes, neither on disk nor in git history.
+
+Masking never slows down real writes: it runs in a background thread, takes
+a container write lock only while renaming a small batch of files and skips
+containers that are being modified. Fake updates are committed together with
+real ones: every round commits all containers changed since the previous one
+in a single commit.
+
+Masking I/O is limited by a token bucket (bytes per second) so that both disk
+load and repository growth are bounded by a budget.
+
+Classes:
+    - MaskManager
+"""
+from threading import Event, Thread
+from slrd.exceptions import SLRDRuntimeException
+from slrd.strings import comlogstr
+from slrd.utils import random_utils
+from slrd.utils.lazy_logger import LazyLogger
+from slrd.utils.rate_limiter import TokenBucket
+
+
+class MaskManager(object):
+    """Rewrite random containers and commit them along with real changes."""
+
+    DEF_RATE = 512          # bytes per second (~42 MiB a day)
+    DEF_BURST = 64 * 1024
+    DEF_INTERVAL = 300.0    # mean seconds between rounds
+    MAX_BATCH = 16          # containers rewritten per round
+    COMMIT_MESSAGE = 'update'
+
+    LOGSTR_ROUND = 'masking round: %i bytes rewritten, commit: %s'
+    LOGSTR_FAIL = 'masking round failed: %s'
+    LOGSTR_STOPPED = 'masking stopped'
+
+    def __init__(self, containers, gitctrl=None, rate=None, burst=None,
+                 interval=None, max_batch=None):
+        """Initialization method.
+
+        :param containers: containers to mask updates of
+        :param gitctrl:    controller to commit changed containers with (no
+                           commits are made if not passed)
+        :param rate:       masking I/O budget in bytes per second
+        :param burst:      maximum bytes written in a single round
+        :param interval:   mean seconds between rounds (randomized)
+        :param max_batch:  maximum containers rewritten in a single round
+
+        :type containers: slrd.managers.container_manager.ContainerManager
+        :type gitctrl:    slrd.controllers.git_controller.GitController
+        :type rate:       float
+        :type burst:      float
+        :type interval:   float
+        :type max_batch:  int
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.containers = containers
+        self.gitctrl = gitctrl
+        self.bucket = TokenBucket(rate or self.DEF_RATE,
+                                  burst or self.DEF_BURST)
+        self.interval = interval or self.DEF_INTERVAL
+        self.max_batch = max_batch or self.MAX_BATCH
+        self._size = None  # bytes of a container file (known after a round)
+        self._stop = Event()
+        self._thread = None
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def mask(self):
+        """Rewrite as many random idle containers as a budget allows.
+
+        :return: amount of bytes written
+        :rtype:  int
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        size = self._size or self.containers.capacity
+        count = min(self.max_batch, int(self.bucket.available() // size))
+        if count <= 0:
+            return 0
+        names = random_utils.get_random_sample(self.containers.idle_names(),
+                                               count)
+        if not names:
+            return 0
+        # busy or changed containers are skipped: some names aren't written
+        count, written = self.containers.rewrite(names)
+        if count:
+            self._size = written // count
+            self.bucket.consume(written)
+        return written
+
+    def commit(self):
+        """Commit all containers changed since the previous commit.
+
+        :return: commit id or None if there was nothing to commit
+        :rtype:  str
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        if self.gitctrl is None:
+            return None
+        paths = self.containers.take_changed()
+        if not paths:
+            return None
+        try:
+            return self.gitctrl.commit(paths, self.COMMIT_MESSAGE)
+        except Exception:
+            self.containers.restore_changed(paths)
+            raise
+
+    def run_once(self):
+        """Do a single masking round: rewrite containers and commit.
+
+        :return: amount of bytes written and commit id
+        :rtype:  tuple
+        """
+        written = self.mask()
+        commit = self.commit()
+        self.logger.debug(self.LOGSTR_ROUND, written, commit)
+        return written, commit
+
+    def __run(self):
+        """Masking thread main loop."""
+        while not self._stop.wait(random_utils.get_random_delay(
+                self.interval)):
+            try:
+                self.run_once()
+            except SLRDRuntimeException as e:
+                self.logger.error(self.LOGSTR_FAIL, e)
+        self.logger.debug(self.LOGSTR_STOPPED)
+
+    def start(self):
+        """Start masking in a background (daemon) thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self.__run, name='slrd-masker',
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop a background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Re-encrypt every container with a new GPG key.
+
+When a GPG key is rotated every container has to be decrypted and encrypted
+again. Containers are split into batches which run on a pool of worker
+processes, each with its own pair of GPG controllers (an old key to decrypt,
+a new one to encrypt) and its own gpg processes. A worker reads (maps),
+decrypts and encrypts a whole batch and writes it atomically as a single
+batch of files (one directory fsync); several batches are in flight at once,
+so reads, gpg runs and writes of different batches overlap.
+
+In hybrid mode (see slrd.managers.key_manager) data keys are wrapped with
+a GPG key, so containers are sealed with a fresh data key wrapped with
+a new GPG key; once every container is done old data keys are deleted.
+
+Progress is kept in a journal next to containers: a header (keys being
+rotated) and a line per finished batch with signatures of written files.
+A rotation started again resumes: only containers whose signature doesn't
+match a journal are processed.
+
+A server must be stopped while a rotation runs: checking that a container is
+unchanged and replacing it is not atomic, so a concurrent write could be
+lost, and old data keys are deleted at the end while a server may still seal
+with them. This is enforced with a shared index writer lock (see
+slrd.managers.shared_index_manager), which a running server holds: a
+rotation refuses to start next to one and a server started meanwhile can't
+take it. Containers changed by anybody else (i.e. an import) are still
+skipped and picked up by a next pass; passes are repeated until one finds
+nothing left to do.
+
+Batches are submitted within an I/O budget (bytes read and written per
+second, see slrd.utils.rate_limiter) so that a rotation doesn't starve other
+users of a disk.
+
+Classes:
+    - RotationManager
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+from os import cpu_count, stat
+from os.path import abspath, expanduser, join
+from time import monotonic, sleep
+from slrd.controllers import fsctrl
+from slrd.controllers.gpg_controller import GPGController
+from slrd.exceptions import SLRDKeyRotationError, SLRDRuntimeException
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.key_manager import KeyManager
+from slrd.managers.shared_index_manager import SharedIndexManager
+from slrd.strings import comlogstr
+from slrd.utils import random_utils
+from slrd.utils.lazy_logger import LazyLogger
+from slrd.utils.rate_limiter import TokenBucket
+
+
+# (decrypting controller, encrypting controller) of a worker process
+_controllers = None
+
+
+def _init_worker(home, pt_length, old_key_id, new_key_id, old_keys, new_key):
+    """Create GPG controllers of a worker process (pool initializer).
+
+    :param home:       GnuPG home directory with both keys
+    :param pt_length:  container plain text length
+    :param old_key_id: GPG key containers are encrypted with
+    :param new_key_id: GPG key to encrypt containers with
+    :param old_keys:   wrapped data keys containers may be sealed with
+    :param new_key:    wrapped data key to seal containers with (None in
+                       GPG-only mode)
+    """
+    global _controllers
+    dec = GPGController(old_key_id, home, pt_length, workers=1)
+    for wrapped in old_keys:
+        dec.load_data_key(wrapped, current=False)
+    enc = GPGController(new_key_id, home, pt_length, workers=1)
+    if new_key is not None:
+        enc.load_data_key(new_key)
+        # containers of an interrupted rotation are sealed with it already
+        dec.load_data_key(new_key, current=False)
+    _controllers = dec, enc
+
+
+def _signature(path):
+    """Get a stat signature of a file (as FSController.scan_dir() does)."""
+    st = stat(path)
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def _rotate_batch(container_dir, batch):
+    """Re-encrypt a batch of containers (runs in a worker process).
+
+    A container changed since it was scanned is left alone: writing it
+    would overwrite someone else's update. It's picked up by a next pass.
+
+    :param container_dir: path to a container directory
+    :param batch:         [(container name, signature when scanned)]
+
+    :return: {name: signature of a written file}, {name: error message} and
+             amount of bytes read and written
+    :rtype:  tuple
+    """
+    dec, enc = _controllers
+    files, failed, size = {}, {}, 0
+    for name, sig in batch:
+        path = join(container_dir, name)
+        try:
+            with fsctrl.map_file(path) as data:
+                size += len(data)
+                payload = dec.decrypt_blob(data)
+            files[name] = enc.encrypt_blob(payload)
+        except SLRDRuntimeException as e:
+            failed[name] = str(e)
+    for name, sig in batch:
+        try:
+            if name in files and _signature(join(container_dir,
+                                                 name)) == list(sig):
+                continue
+        except FileNotFoundError:
+            pass
+        files.pop(name, None)
+    if files:
+        fsctrl.write_many(container_dir, files,
+                          mode=ContainerManager.CONTAINER_MODE,
+                          timestamp=random_utils.get_random_datetime,
+                          force=True)
+    for name, data in files.items():
+        size += len(data)
+        files[name] = _signature(join(container_dir, name))
+    return files, failed, size
+
+
+class RotationManager(object):
+    """Re-encrypt containers with a new GPG key on a process pool."""
+
+    JOURNAL_NAME = '.rotation.journal'
+    JOURNAL_MODE = 0o600
+    BATCH_SIZE = 64
+    MAX_PASSES = 5  # passes over containers changing under a rotation
+    IN_FLIGHT = 2   # batches submitted per worker
+    PROGRESS_INTERVAL = 5.0
+    MB = 1024 * 1024
+
+    LOGSTR_START = 'rotating containers %s -> %s: %i workers, hybrid: %s'
+    LOGSTR_PASS = 'rotation pass %i: %i containers left'
+    LOGSTR_PROGRESS = 'rotation progress: %i/%i containers, %.1f MB/s'
+    LOGSTR_FAILED = 'failed to rotate container: %s: %s'
+    LOGSTR_DONE = 'rotation done: %i containers, %i bytes in %.1fs'
+    LOGSTR_TORN_JOURNAL = 'journal without a header, starting over: %s'
+
+    ERRMSG_JOURNAL = 'journal of another rotation exists: %s -> %s'
+    ERRMSG_BAD_JOURNAL = 'journal has batches but no valid header, ' \
+                         'remove it to start over: %s'
+    ERRMSG_FAILED = '%i containers failed to rotate (journal kept): %s'
+    ERRMSG_UNSTABLE = 'containers keep changing after %i passes'
+    ERRMSG_LOCKED = 'a server (or another rotation) is running on %s: ' \
+                    'stop it first'
+
+    def __init__(self, base_dir, gpgctrl, new_key_id, workers=None,
+                 io_rate=None, batch_size=None):
+        """Initialization method.
+
+        :param base_dir:   path to a data storage root
+        :param gpgctrl:    controller of a key being retired (its GnuPG home
+                           must hold a new key too)
+        :param new_key_id: ID of a GPG key to re-encrypt containers with
+        :param workers:    worker processes (CPU count by default)
+        :param io_rate:    I/O budget in bytes per second (unlimited if not
+                           passed)
+        :param batch_size: containers re-encrypted and written at once
+
+        :type base_dir:   str
+        :type gpgctrl:    slrd.controllers.gpg_controller.GPGController
+        :type new_key_id: str
+        :type workers:    int
+        :type io_rate:    float
+        :type batch_size: int
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        self.container_dir = join(self.base_dir,
+                                  ContainerManager.CONTAINER_DIR)
+        self.journal_path = join(self.base_dir, self.JOURNAL_NAME)
+        self.gpgctrl = gpgctrl
+        self.new_key_id = new_key_id
+        self.new_gpgctrl = GPGController(new_key_id, gpgctrl.gpg_home_dir,
+                                         gpgctrl.pt_length)
+        self.keys = KeyManager(self.base_dir, self.new_gpgctrl)
+        self.workers = workers or cpu_count() or 1
+        self.bucket = TokenBucket(io_rate) if io_rate else None
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __load_journal(self, old_keys):
+        """Load a journal of an interrupted rotation or start a new one.
+
+        :return: wrapped new data key (None in GPG-only mode) and
+                 {container name: signature} of rotated containers
+        :rtype:  tuple
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDKeyRotationError
+        """
+        done = {}
+        if fsctrl.file_exists(self.journal_path):
+            lines = fsctrl.read_file(self.journal_path).splitlines()
+            header = self.__header(lines[0] if lines else '')
+            if header is None:
+                # torn while a header was appended: nothing was rotated yet
+                if any(line.strip() for line in lines[1:]):
+                    errmsg = self.ERRMSG_BAD_JOURNAL % self.journal_path
+                    self.logger.error(errmsg)
+                    raise SLRDKeyRotationError(errmsg)
+                self.logger.warning(self.LOGSTR_TORN_JOURNAL,
+                                    self.journal_path)
+                fsctrl.delete_file(self.journal_path)
+                return self.__load_journal(old_keys)
+            if header['old'] != self.gpgctrl.gpg_key_id or \
+                    header['new'] != self.new_key_id:
+                errmsg = self.ERRMSG_JOURNAL % (header['old'],
+                                                header['new'])
+                self.logger.error(errmsg)
+                raise SLRDKeyRotationError(errmsg)
+            for line in lines[1:]:
+                try:
+                    done.update(json.loads(line))
+                except ValueError:  # a tail torn by a crash
+                    break
+            return header['data_key'], done
+        new_key = self.new_gpgctrl.generate_data_key() if old_keys else None
+        header = {'old': self.gpgctrl.gpg_key_id, 'new': self.new_key_id,
+                  'data_key': new_key}
+        fsctrl.append_to_file(json.dumps(header) + '\n', self.journal_path,
+                              self.JOURNAL_MODE)
+        return new_key, done
+
+    @staticmethod
+    def __header(line):
+        """Parse a journal header line.
+
+        :return: header or None if it's malformed
+        :rtype:  dict
+        """
+        try:
+            header = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(header, dict) or \
+                not {'old', 'new', 'data_key'} <= header.keys():
+            return None
+        return header
+
+    def __throttle(self, batch):
+        """Wait until an I/O budget allows to read and write a batch."""
+        if self.bucket is None:
+            return
+        cost = 2 * sum(sig[1] for _, sig in batch)
+        delay = self.bucket.delay(cost)
+        if delay:
+            sleep(delay)
+        self.bucket.consume(cost)
+
+    def __pass(self, pool, pending, done, failed, stats):
+        """Rotate containers of a single pass.
+
+        :param pending: [(container name, signature)] to rotate
+        :param done:    {name: signature} updated as batches finish
+        :param failed:  {name: (signature, error)} updated as batches finish
+        :param stats:   totals updated as batches finish
+        """
+        batches = [pending[idx:idx + self.batch_size]
+                   for idx in range(0, len(pending), self.batch_size)]
+        batches.reverse()
+        sigs = dict(pending)
+        running = set()
+        logged = monotonic()
+        while batches or running:
+            while batches and len(running) < self.workers * self.IN_FLIGHT:
+                batch = batches.pop()
+                self.__throttle(batch)
+                running.add(pool.submit(_rotate_batch, self.container_dir,
+                                        batch))
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                files, errors, size = future.result()
+                if files:
+                    fsctrl.append_to_file(json.dumps(files) + '\n',
+                                          self.journal_path,
+                                          self.JOURNAL_MODE)
+                    done.update(files)
+                for name, error in errors.items():
+                    self.logger.error(self.LOGSTR_FAILED, name, error)
+                    failed[name] = (sigs[name], error)
+                stats['containers'] += len(files)
+                stats['bytes'] += size
+            if monotonic() - logged >= self.PROGRESS_INTERVAL:
+                logged = monotonic()
+                elapsed = logged - stats['started']
+                self.logger.info(self.LOGSTR_PROGRESS, stats['containers'],
+                                 len(pending),
+                                 stats['bytes'] / elapsed / self.MB)
+
+    def run(self):
+        """Re-encrypt every container with a new key.
+
+        A server must be stopped first (see the module docstring). Point it
+        to a new key once this returns. A rotation that fails part-way keeps
+        its journal; run it again to resume.
+
+        :return: amount of containers rotated (containers), bytes read and
+                 written (bytes), passes made (passes) and seconds taken
+                 (elapsed)
+        :rtype:  dict
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDKeyRotationError,
+                 slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        lock = SharedIndexManager(self.base_dir)
+        if not lock.acquire_writer():
+            errmsg = self.ERRMSG_LOCKED % self.base_dir
+            self.logger.error(errmsg)
+            raise SLRDKeyRotationError(errmsg)
+        try:
+            return self.__rotate()
+        finally:
+            lock.release_writer()
+
+    def __rotate(self):
+        """Re-encrypt every container (a writer lock must be held)."""
+        stats = {'containers': 0, 'bytes': 0, 'passes': 0,
+                 'started': monotonic()}
+        old_keys = list(KeyManager(self.base_dir,
+                                   self.gpgctrl).wrapped_keys().values())
+        new_key, done = self.__load_journal(old_keys)
+        self.logger.info(self.LOGSTR_START, self.gpgctrl.gpg_key_id,
+                         self.new_key_id, self.workers, new_key is not None)
+        failed = {}
+        with ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(self.gpgctrl.gpg_home_dir, self.gpgctrl.pt_length,
+                          self.gpgctrl.gpg_key_id, self.new_key_id, old_keys,
+                          new_key)) as pool:
+            while True:
+                state = fsctrl.scan_dir(self.container_dir)
+                pending = [(path.rsplit('/', 1)[1], list(sig))
+                           for path, sig in sorted(state.items())]
+                pending = [(name, sig) for name, sig in pending
+                           if done.get(name) != sig and
+                           failed.get(name, (None,))[0] != sig]
+                if not pending:
+                    break
+                if stats['passes'] == self.MAX_PASSES:
+                    errmsg = self.ERRMSG_UNSTABLE % self.MAX_PASSES
+                    self.logger.error(errmsg)
+                    raise SLRDKeyRotationError(errmsg)
+                stats['passes'] += 1
+                self.logger.info(self.LOGSTR_PASS, stats['passes'],
+                                 len(pending))
+                self.__pass(pool, pending, done, failed, stats)
+        if failed:
+            errmsg = self.ERRMSG_FAILED % (len(failed),
+                                           ', '.join(sorted(failed)[:10]))
+            self.logger.error(errmsg)
+            raise SLRDKeyRotationError(errmsg)
+        if new_key is not None:
+            self.keys.replace(new_key)
+        fsctrl.delete_file(self.journal_path)
+        stats['elapsed'] = monotonic() - stats.pop('started')
+        self.logger.info(self.LOGSTR_DONE, stats['containers'],
+                         stats['bytes'], stats['elapsed'])
+        return stats
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Prefix and fuzzy search over site names and template links.
+
+Terms are site names (from the sites keyfile shortcut section) and links of
+templates (link and first_time_link). Terms and queries are normalized the
+same way: lowercased, with a URL scheme and a leading 'www.' stripped.
+
+Two indexes are built once and then only searched:
+
+- prefix: sorted arrays of whole terms and of term tokens (suffixes starting
+  after '.', '/', '-' or '_', so 'book' finds 'facebook.com' only through
+  fuzzy search but 'google' finds 'mail.google.com'); a prefix is a range
+  found with two bisections;
+- trigram: term ids of every trigram (with word boundaries); candidates are
+  scored by the share of trigrams they have in common with a query (Dice
+  coefficient), so typos like 'facebok' still find 'facebook.com'.
+
+Results are ranked: an exact match first, then prefixes of whole terms,
+then prefixes of tokens and then fuzzy matches by similarity; shorter terms
+go first within a rank.
+
+Classes:
+    - SearchManager
+"""
+from array import array
+from bisect import bisect_left
+from sys import intern
+
+
+class SearchManager(object):
+    """Search terms by prefix and by similarity."""
+
+    SITE = 'site'
+    TEMPLATE = 'template'
+    SEPARATORS = frozenset('./-_ ')
+    SCHEMES = ('https://', 'http://')
+    WWW = 'www.'
+    TERM_ARRAY_TYPE = 'I'
+    DEF_LIMIT = 10
+    MIN_SIMILARITY = 0.3
+    EXACT, PREFIX, TOKEN = 3.0, 2.0, 1.0  # scores of non-fuzzy matches
+
+    def __init__(self, entries=()):
+        """Initialization method.
+
+        :param entries: (text, kind, reference) of every term, i.e.
+                        ('fb.com/login', 'template', 'Facebook template')
+        :type entries:  iterable of tuple
+        """
+        terms, seen = [], set()
+        for text, kind, ref in entries:
+            norm = self.normalize(text)
+            if norm and (norm, kind, ref) not in seen:
+                seen.add((norm, kind, ref))
+                terms.append((norm, intern(kind), ref))
+        self._terms = terms
+        order = sorted(range(len(terms)), key=lambda i: terms[i][0])
+        self._full = [terms[i][0] for i in order]
+        self._full_ids = array(self.TERM_ARRAY_TYPE, order)
+        tokens = sorted((norm[pos:], tid)
+                        for tid, (norm, _, _) in enumerate(terms)
+                        for pos in self.__token_starts(norm))
+        self._tokens = [token for token, _ in tokens]
+        self._token_ids = array(self.TERM_ARRAY_TYPE,
+                                (tid for _, tid in tokens))
+        grams, self._gram_counts = {}, array(self.TERM_ARRAY_TYPE)
+        for tid, (norm, _, _) in enumerate(terms):
+            term_grams = self.trigrams(norm)
+            self._gram_counts.append(len(term_grams))
+            for gram in term_grams:
+                grams.setdefault(gram, array(self.TERM_ARRAY_TYPE)).append(
+                        tid)
+        self._grams = grams
+
+    @classmethod
+    def from_index(cls, sites, templates):
+        """Build a search index over sites and template links.
+
+        :param sites:     site names
+        :param templates: templates
+
+        :type sites:     iterable of str
+        :type templates: iterable of slrd.types.template_type.TemplateType
+
+        :rtype: SearchManager
+        """
+        entries = [(site, cls.SITE, site) for site in sites]
+        for template in templates:
+            for link in (template.link, template.first_time_link):
+                if isinstance(link, str):
+                    entries.append((link, cls.TEMPLATE, template.name))
+        return cls(entries)
+
+    @classmethod
+    def normalize(cls, text):
+        """Normalize a term or a query.
+
+        :param text: site name, link or query
+        :type text:  str
+
+        :rtype: str
+        """
+        text = text.strip().lower()
+        for scheme in cls.SCHEMES:
+            if text.startswith(scheme):
+                text = text[len(scheme):]
+                break
+        if text.startswith(cls.WWW):
+            text = text[len(cls.WWW):]
+        return text
+
+    @classmethod
+    def __token_starts(cls, norm):
+        """Get positions tokens of a term start at (except for 0)."""
+        seps = cls.SEPARATORS
+        return [pos for pos in range(1, len(norm))
+                if norm[pos - 1] in seps and norm[pos] not in seps]
+
+    @staticmethod
+    def trigrams(text):
+        """Get trigrams of a text with word boundaries marked.
+
+        :param text: normalized text
+        :type text:  str
+
+        :rtype: set
+        """
+        padded = '  ' + text + ' '
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def __range(keys, prefix):
+        """Get a range of sorted keys starting with a prefix."""
+        lo = bisect_left(keys, prefix)
+        return lo, bisect_left(keys, prefix + '\U0010ffff', lo)
+
+    def __len__(self):
+        """Get an amount of indexed terms."""
+        return len(self._terms)
+
+    def search(self, query, limit=None):
+        """Find terms matching a (partial) query.
+
+        :param query: text typed by a user (i.e. 'faceb')
+        :param limit: maximum amount of results
+
+        :type query: str
+        :type limit: int
+
+        :return: ranked [(term, kind, reference, score)]
+        :rtype:  list
+        """
+        limit = limit or self.DEF_LIMIT
+        query = self.normalize(query)
+        if not query:
+            return []
+        scores = {}
+        lo, hi = self.__range(self._full, query)
+        for idx in range(lo, hi):
+            scores[self._full_ids[idx]] = self.EXACT \
+                if self._full[idx] == query else self.PREFIX
+        lo, hi = self.__range(self._tokens, query)
+        for idx in range(lo, hi):
+            scores.setdefault(self._token_ids[idx], self.TOKEN)
+        if len(scores) < limit:
+            self.__fuzzy(query, scores)
+        terms = self._terms
+        ranked = sorted(scores.items(),
+                        key=lambda item: (-item[1], len(terms[item[0]][0]),
+                                          terms[item[0]][0]))
+        return [terms[tid] + (score,) for tid, score in ranked[:limit]]
+
+    def __fuzzy(self, query, scores):
+        """Add terms similar to a query (that are not matched yet)."""
+        query_grams = self.trigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for tid in self._grams.get(gram, ()):
+                shared[tid] = shared.get(tid, 0) + 1
+        total, counts = len(query_grams), self._gram_counts
+        for tid, count in shared.items():
+            if tid in scores:
+                continue
+            similarity = 2.0 * count / (total + counts[tid])
+            if similarity >= self.MIN_SIMILARITY:
+                scores[tid] = similarity
@@ -0,0 +1,623 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Read-only index shared by all server processes through a mapped file.
+
+A single writer process (the one holding a lock file) builds an
+IndexManager, serializes it into a flat binary file under a base directory
+and publishes every new version with an atomic rename (a generation swap).
+Every other process maps that file read-only and answers queries straight
+from the mapping: nothing is rebuilt or deserialized up front, pages are
+shared through the page cache, so memory stays flat no matter how many
+workers there are.
+
+Readers notice a new generation by a cheap stat() (at most once per
+check interval) and map the new file; requests still using an old
+generation keep a consistent view of it until they drop it.
+
+The file holds plain text of keyfiles and linkfiles (passwords included), so
+it never touches a base directory (which is backed up and may sit on a
+persistent disk): it lives in a RAM backed runtime directory (/dev/shm or
+$XDG_RUNTIME_DIR) private to an owner, along with a writer lock. A directory
+that is not owned by a current user or is accessible by anybody else is
+refused.
+
+Encoded linkfiles are cached by a writer between generations, so publishing
+a change re-encodes only linkfiles that changed since a previous generation.
+
+File layout (native byte order, sections are arrays of fixed-size entries,
+strings are referenced by (offset, length) in a strings section):
+
+```
+| header | stamps | timeline | ids | id order | keys | values | postings |
+| links | templates | catalog | strings |
+```
+
+- stamps:     registration timestamp of each ordinal
+- timeline:   timestamps and ordinals sorted by time (two sections)
+- ids:        linkfile id of each ordinal
+- id order:   ordinals sorted by id (to find an ordinal of an id)
+- keys:       key names sorted, each one with a range of values
+- values:     values of every key sorted, each one with a range of postings
+- postings:   linkfile ordinals
+- links:      binary codec encoded linkfile of each ordinal (empty if none)
+- templates:  template name of each ordinal (empty if none)
+- catalog:    binary codec encoded list of all templates (a single string
+              reference)
+
+A search index over sites and template links (see
+slrd.managers.search_manager) is not stored; every process builds one on
+first search and keeps it along with a generation it was built from.
+
+Classes:
+    - SharedIndex
+    - SharedIndexManager
+"""
+from fcntl import LOCK_EX, LOCK_NB, LOCK_UN, flock
+from hashlib import blake2b
+from os import O_CLOEXEC, O_CREAT, O_RDWR, close, environ, getuid, lstat, \
+    mkdir, open as osopen, stat
+from os.path import abspath, expanduser, isdir, join
+from stat import S_ISDIR
+from struct import Struct
+from sys import byteorder
+from time import monotonic, sleep
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDSharedIndexError
+from slrd.managers.search_manager import SearchManager
+from slrd.managers.timeline_manager import TimelineManager
+from slrd.strings import comlogstr
+from slrd.types.link_type import LinkType
+from slrd.types.template_type import TemplateType
+from slrd.utils import codec_registry
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class SharedIndex(object):
+    """Query a single generation of a published index.
+
+    Mirrors read methods of slrd.managers.index_manager.IndexManager.
+    """
+
+    __slots__ = ('generation', 'inode', 'n_ids', 'n_links', '_ids',
+                 '_order', '_keys', '_values', '_postings', '_links',
+                 '_templates', '_catalog', '_strings', '_timeline',
+                 '_template_map', '_search')
+
+    MAGIC = b'SLRDIX3' + byteorder[0].upper().encode()
+    # magic, generation, file size, amount of ids, keys, values, postings,
+    # linkfiles and timeline entries, offsets of sections (in file order)
+    HEADER = Struct('=8s2Q6I12Q')
+    REF = Struct('=II')         # string offset, length
+    RANGE = Struct('=IIII')     # string offset, length, first item, count
+    ORDINAL = Struct('=I')
+    STAMP = Struct('=q')
+    SITES_KEY = 'sites'
+
+    ERRMSG_BAD_INDEX = 'malformed shared index: %s'
+
+    def __init__(self, view, inode=None):
+        """Initialization method.
+
+        :param view:  content of a published index file
+        :param inode: inode of a file view was mapped from
+
+        :type view:  memoryview
+        :type inode: int
+
+        :raise: slrd.exceptions.manager_exceptions.SLRDSharedIndexError
+        """
+        header = self.HEADER
+        if len(view) < header.size:
+            raise SLRDSharedIndexError(self.ERRMSG_BAD_INDEX % len(view))
+        magic, self.generation, size, self.n_ids, n_keys, n_values, \
+            n_postings, self.n_links, n_timeline, *offsets = \
+            header.unpack_from(view)
+        # 8-byte items go first so that they stay aligned
+        sizes = (self.STAMP.size * self.n_ids, self.STAMP.size * n_timeline,
+                 self.ORDINAL.size * n_timeline,
+                 self.REF.size * self.n_ids, self.ORDINAL.size * self.n_ids,
+                 self.RANGE.size * n_keys, self.RANGE.size * n_values,
+                 self.ORDINAL.size * n_postings, self.REF.size * self.n_ids,
+                 self.REF.size * self.n_ids, self.REF.size)
+        if magic != self.MAGIC or size != len(view) or any(
+                off + length > size for off, length in zip(offsets, sizes)):
+            raise SLRDSharedIndexError(self.ERRMSG_BAD_INDEX % magic)
+        by_ordinal, stamps, ordinals, self._ids, self._order, self._keys, \
+            self._values, self._postings, self._links, self._templates, \
+            self._catalog = (view[off:off + length]
+                             for off, length in zip(offsets, sizes))
+        self._order = self._order.cast('I')
+        self._postings = self._postings.cast('I')
+        self._strings = view[offsets[-1]:]
+        self._timeline = TimelineManager(
+                self.__id, self.__ordinal, self.__template,
+                stamps.cast('q'), ordinals.cast('I'), by_ordinal.cast('q'))
+        self.inode = inode
+        self._template_map = self._search = None  # parsed on first use
+
+    @classmethod
+    def build(cls, state, generation, blobs=None):
+        """Serialize an index state.
+
+        :param state:      index state (see IndexManager.shared_state())
+        :param generation: generation number of a published index
+        :param blobs:      {ordinal: (linkfile, encoded linkfile)} of a
+                           previous build; linkfiles that are still the same
+                           objects are not encoded again, the cache is
+                           updated in place
+
+        :type state:      dict
+        :type generation: int
+        :type blobs:      dict
+
+        :return: content of an index file
+        :rtype:  bytes
+        """
+        strings, refs = bytearray(), {}
+
+        def ref(text, dedup=True):
+            """Put a string into the strings section."""
+            data = text.encode() if isinstance(text, str) else text
+            if dedup and data in refs:
+                return refs[data]
+            refs[data] = (len(strings), len(data))
+            strings.extend(data)
+            return refs[data]
+
+        ids = state['ids']
+        id_refs = [ref(lid) for lid in ids]
+        order = sorted(range(len(ids)), key=lambda o: ids[o].encode())
+        keys, values, postings = [], [], bytearray()
+        for key in sorted(state['keys'], key=str.encode):
+            key_values = state['keys'][key]
+            keys.append(ref(key) + (len(values), len(key_values)))
+            for value in sorted(key_values, key=str.encode):
+                raw = key_values[value]
+                values.append(ref(value) +
+                              (len(postings) // cls.ORDINAL.size,
+                               len(raw) // cls.ORDINAL.size))
+                postings.extend(raw)
+        codec, linkfiles = codec_registry.get('binary'), state['linkfiles']
+        old, encoded = blobs or {}, {}
+        for o, link in linkfiles.items():
+            cached = old.get(o)
+            encoded[o] = cached if cached is not None and \
+                cached[0] is link else (link, codec.dumps(link.to_dict()))
+        if blobs is not None:
+            blobs.clear()
+            blobs.update(encoded)
+        links = [ref(encoded[o][1], False) if o in encoded else (0, 0)
+                 for o in range(len(ids))]
+        templates = [ref(linkfiles[o].template or '')
+                     if o in linkfiles else (0, 0) for o in range(len(ids))]
+        catalog = ref(codec.dumps([template.to_dict() for template in
+                                   state['templates'].values()]), False)
+        timeline = TimelineManager(None, None, None)
+        timeline.load((o, TimelineManager.parse_stamp(link.created_on))
+                      for o, link in linkfiles.items())
+        by_ordinal = timeline.by_ordinal
+        by_ordinal.extend([timeline.NO_STAMP] *
+                          (len(ids) - len(by_ordinal)))
+        sections = [
+            by_ordinal.tobytes(),
+            timeline.stamps.tobytes(),
+            timeline.ordinals.tobytes(),
+            b''.join(cls.REF.pack(*r) for r in id_refs),
+            b''.join(cls.ORDINAL.pack(o) for o in order),
+            b''.join(cls.RANGE.pack(*k) for k in keys),
+            b''.join(cls.RANGE.pack(*v) for v in values),
+            bytes(postings),
+            b''.join(cls.REF.pack(*r) for r in links),
+            b''.join(cls.REF.pack(*r) for r in templates),
+            cls.REF.pack(*catalog),
+            bytes(strings),
+        ]
+        offsets, offset = [], cls.HEADER.size
+        for section in sections:
+            offsets.append(offset)
+            offset += len(section)
+        header = cls.HEADER.pack(
+                cls.MAGIC, generation, offset, len(ids), len(keys),
+                len(values), len(postings) // cls.ORDINAL.size,
+                len(linkfiles), len(timeline.stamps), *offsets)
+        return b''.join([header] + sections)
+
+    def __str(self, offset, length):
+        """Get a string out of the strings section."""
+        return str(self._strings[offset:offset + length], 'utf-8')
+
+    def __search(self, entries, fmt, lo, hi, target):
+        """Binary search sorted entries [lo, hi) for a string.
+
+        :return: entry or None
+        :rtype:  tuple
+        """
+        target, strings, unpack_from = target.encode(), self._strings, \
+            fmt.unpack_from
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = unpack_from(entries, mid * fmt.size)
+            found = bytes(strings[entry[0]:entry[0] + entry[1]])
+            if found == target:
+                return entry
+            if found < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def __key(self, key):
+        """Get a key entry (name offset, length, first value, count)."""
+        return self.__search(self._keys, self.RANGE, 0,
+                             len(self._keys) // self.RANGE.size, key)
+
+    def __id(self, ordinal):
+        """Get a linkfile id of an ordinal."""
+        return self.__str(*self.REF.unpack_from(self._ids,
+                                                ordinal * self.REF.size))
+
+    def __ordinal(self, lid):
+        """Get an ordinal of a linkfile id (None if there is none)."""
+        target, order = lid.encode(), self._order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__id(order[mid]).encode() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(order) or self.__id(order[lo]) != lid:
+            return None
+        return order[lo]
+
+    def __template(self, ordinal):
+        """Get a template name of a linkfile (None if there is none)."""
+        offset, length = self.REF.unpack_from(self._templates,
+                                              ordinal * self.REF.size)
+        return self.__str(offset, length) if length else None
+
+    def __postings(self, key, value):
+        """Get ordinals a key value is used in (empty if none)."""
+        entry = self.__key(key)
+        if entry is None:
+            return ()
+        entry = self.__search(self._values, self.RANGE, entry[2],
+                              entry[2] + entry[3], value)
+        if entry is None:
+            return ()
+        first, count = entry[2:]
+        return self._postings[first:first + count]
+
+    def lookup(self, key, value):
+        """Get ids of linkfiles a key value is used in.
+
+        :param key:   key name (i.e. first_name)
+        :param value: key value (i.e. John)
+
+        :type key:   str
+        :type value: str
+
+        :return: linkfile ids
+        :rtype:  tuple
+        """
+        return tuple([self.__id(o) for o in self.__postings(key, value)])
+
+    def lookup_site(self, site):
+        """Get ids of linkfiles registered on a site.
+
+        :param site: site name as stored in the sites keyfile (i.e. fb.com)
+        :type site:  str
+
+        :return: linkfile ids
+        :rtype:  tuple
+        """
+        return self.lookup(self.SITES_KEY, site)
+
+    def values(self, key):
+        """Get all indexed values of a key (sorted).
+
+        :param key: key name
+        :type key:  str
+
+        :return: values of a key
+        :rtype:  tuple
+        """
+        entry = self.__key(key)
+        if entry is None:
+            return ()
+        size, unpack_from = self.RANGE.size, self.RANGE.unpack_from
+        return tuple([self.__str(*unpack_from(self._values, i * size)[:2])
+                      for i in range(entry[2], entry[2] + entry[3])])
+
+    def keys(self):
+        """Get all indexed key names (sorted).
+
+        :return: key names
+        :rtype:  tuple
+        """
+        return tuple([self.__str(*entry[:2])
+                      for entry in self.RANGE.iter_unpack(self._keys)])
+
+    def sites(self):
+        """Get all indexed site names (sorted).
+
+        :return: site names
+        :rtype:  tuple
+        """
+        return self.values(self.SITES_KEY)
+
+    def get_linkfile(self, lid):
+        """Get a parsed linkfile by its id.
+
+        :param lid: linkfile id
+        :type lid:  str
+
+        :return: linkfile or None if it's not indexed
+        :rtype:  slrd.types.link_type.LinkType
+        """
+        ordinal = self.__ordinal(lid)
+        if ordinal is None:
+            return None
+        offset, length = self.REF.unpack_from(self._links,
+                                              ordinal * self.REF.size)
+        if not length:
+            return None
+        return LinkType.from_parsed(codec_registry.get('binary').loads(
+                self._strings[offset:offset + length]))
+
+    def linkfile_count(self):
+        """Get an amount of indexed linkfiles.
+
+        :rtype: int
+        """
+        return self.n_links
+
+    def timeline(self, start=None, end=None, site=None, template=None,
+                 limit=None, cursor=None, reverse=False):
+        """Get a page of linkfiles ordered by registration time.
+
+        See IndexManager.timeline() for parameters.
+
+        :return: [(linkfile id, timestamp)] and a cursor of a next page (None
+                 if it's the last one)
+        :rtype:  tuple
+        """
+        candidates = None if site is None else \
+            self.__postings(self.SITES_KEY, site)
+        return self._timeline.query(start, end, candidates, template, limit,
+                                    cursor, reverse)
+
+    def templates(self):
+        """Get all indexed templates.
+
+        :return: templates
+        :rtype:  tuple
+        """
+        return tuple(self.__templates().values())
+
+    def __templates(self):
+        """Get {template name: template} (parsed on first use)."""
+        templates = self._template_map
+        if templates is None:
+            offset, length = self.REF.unpack_from(self._catalog)
+            templates = {}
+            for data in codec_registry.get('binary').loads(
+                    self._strings[offset:offset + length]):
+                template = TemplateType.from_parsed(data)
+                templates[template.name] = template
+            self._template_map = templates
+        return templates
+
+    def get_template(self, name):
+        """Get a template by its name.
+
+        :param name: template name (i.e. Facebook registration template)
+        :type name:  str
+
+        :return: template or None if it's not indexed
+        :rtype:  slrd.types.template_type.TemplateType
+        """
+        return self.__templates().get(name)
+
+    def search(self, query, limit=None):
+        """Find site names and template links by a (partial) query.
+
+        See IndexManager.search() for parameters.
+
+        :return: ranked [(term, kind, reference, score)]
+        :rtype:  list
+        """
+        search = self._search
+        if search is None:
+            search = self._search = SearchManager.from_index(
+                    self.sites(), self.templates())
+        return search.search(query, limit)
+
+
+class SharedIndexManager(object):
+    """Publish an index from a single writer and map it in every process."""
+
+    INDEX_NAME = 'index'
+    LOCK_NAME = 'index.lock'
+    DIR_MODE = 0o700
+    INDEX_MODE = 0o600
+    RUNTIME_DIRS = ('/dev/shm', environ.get('XDG_RUNTIME_DIR'))
+    CHECK_INTERVAL = 0.5
+    WAIT_INTERVAL = 0.05
+
+    LOGSTR_WRITER = 'became a shared index writer: %s'
+    LOGSTR_PUBLISHED = 'shared index published: generation %i, %i bytes'
+    LOGSTR_MAPPED = 'shared index mapped: generation %i'
+
+    ERRMSG_NOT_WRITER = 'shared index writer lock is not held: %s'
+    ERRMSG_NOT_PUBLISHED = 'shared index was not published in %.1fs: %s'
+    ERRMSG_NO_RUNTIME_DIR = 'no RAM backed runtime directory for a shared ' \
+                            'index: %s'
+    ERRMSG_UNSAFE_DIR = 'shared index directory is not private to a ' \
+                        'current user: %s'
+
+    def __init__(self, base_dir, check_interval=None, runtime_dir=None):
+        """Initialization method.
+
+        :param base_dir:       path to a data storage root
+        :param check_interval: seconds between checks for a new generation
+        :param runtime_dir:    directory to keep an index in (the first
+                               existing one of self.RUNTIME_DIRS by default);
+                               an index of every base directory gets its own
+                               subdirectory
+
+        :type base_dir:       str
+        :type check_interval: float
+        :type runtime_dir:    str
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.base_dir = abspath(expanduser(base_dir))
+        if runtime_dir is None:
+            runtime_dir = next((path for path in self.RUNTIME_DIRS
+                                if path and isdir(path)), None)
+        self.dir = None if runtime_dir is None else join(
+                runtime_dir, 'slrd-%i-%s' % (getuid(), blake2b(
+                    self.base_dir.encode(), digest_size=8).hexdigest()))
+        self.path = self.lock_path = None
+        if self.dir is not None:
+            self.path = join(self.dir, self.INDEX_NAME)
+            self.lock_path = join(self.dir, self.LOCK_NAME)
+        self.check_interval = self.CHECK_INTERVAL if check_interval is None \
+            else check_interval
+        self._lock_fd = None
+        self._index = None
+        self._blobs = {}  # linkfiles encoded by a previous publish
+        self._next_check = 0.0
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __check_dir(self):
+        """Make sure an index directory is private to a current user.
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDSharedIndexError
+        """
+        if self.dir is None:
+            raise SLRDSharedIndexError(self.ERRMSG_NO_RUNTIME_DIR %
+                                       (self.RUNTIME_DIRS,))
+        st = lstat(self.dir)
+        if not S_ISDIR(st.st_mode) or st.st_uid != getuid() or \
+                st.st_mode & 0o077:
+            raise SLRDSharedIndexError(self.ERRMSG_UNSAFE_DIR % self.dir)
+
+    @property
+    def is_writer(self):
+        """Check whether this instance holds a writer lock."""
+        return self._lock_fd is not None
+
+    def acquire_writer(self):
+        """Try to become the single writer (never blocks).
+
+        :return: whether a writer lock is held
+        :rtype:  bool
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDSharedIndexError
+        """
+        if self._lock_fd is not None:
+            return True
+        if self.dir is not None:
+            try:
+                mkdir(self.dir, self.DIR_MODE)
+            except FileExistsError:
+                pass
+        self.__check_dir()
+        fd = osopen(self.lock_path, O_RDWR | O_CREAT | O_CLOEXEC,
+                    self.INDEX_MODE)
+        try:
+            flock(fd, LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            close(fd)
+            return False
+        self._lock_fd = fd
+        self.logger.info(self.LOGSTR_WRITER, self.lock_path)
+        return True
+
+    def release_writer(self):
+        """Give a writer lock up."""
+        if self._lock_fd is not None:
+            flock(self._lock_fd, LOCK_UN)
+            close(self._lock_fd)
+            self._lock_fd = None
+            self._blobs = {}
+
+    def publish(self, index):
+        """Publish a new generation of an index.
+
+        :param index: index to publish
+        :type index:  slrd.managers.index_manager.IndexManager
+
+        :return: published generation
+        :rtype:  int
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDSharedIndexError,
+                 slrd.exceptions.controller_exceptions.
+                 SLRDFSCtrlWriteException
+        """
+        if self._lock_fd is None:
+            raise SLRDSharedIndexError(self.ERRMSG_NOT_WRITER %
+                                       self.lock_path)
+        current = self.current(force=True)
+        generation = current.generation + 1 if current is not None else 1
+        data = SharedIndex.build(index.shared_state(), generation,
+                                 self._blobs)
+        fsctrl.write_many(self.dir, {self.INDEX_NAME: data},
+                          mode=self.INDEX_MODE, force=True)
+        self.logger.info(self.LOGSTR_PUBLISHED, generation, len(data))
+        self.current(force=True)
+        return generation
+
+    def current(self, force=False):
+        """Get the latest published generation.
+
+        A file is stat'ed at most once per self.check_interval seconds.
+
+        :param force: check for a new generation right away
+
+        :return: index or None if none was published yet
+        :rtype:  SharedIndex
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDSharedIndexError
+        """
+        index, now = self._index, monotonic()
+        if index is not None and not force and now < self._next_check:
+            return index
+        self._next_check = now + self.check_interval
+        if self.path is None:
+            return index
+        try:
+            inode = stat(self.path).st_ino
+        except FileNotFoundError:
+            return index
+        if index is None or index.inode != inode:
+            self.__check_dir()
+            view, st = fsctrl.open_mapped(self.path)
+            index = self._index = SharedIndex(view, st.st_ino)
+            self.logger.debug(self.LOGSTR_MAPPED, index.generation)
+        return index
+
+    def wait(self, timeout):
+        """Get the latest generation waiting for a first one to appear.
+
+        :param timeout: seconds to wait at most
+        :type timeout:  float
+
+        :rtype: SharedIndex
+
+        :raises: slrd.exceptions.manager_exceptions.SLRDSharedIndexError
+        """
+        if self.path is None:
+            raise SLRDSharedIndexError(self.ERRMSG_NO_RUNTIME_DIR %
+                                       (self.RUNTIME_DIRS,))
+        deadline = monotonic() + timeout
+        index = self.current()
+        while index is None:
+            if monotonic() >= deadline:
+                raise SLRDSharedIndexError(self.ERRMSG_NOT_PUBLISHED %
+                                           (timeout, self.path))
+            sleep(self.WAIT_INTERVAL)
+            index = self.current(force=True)
+        return index
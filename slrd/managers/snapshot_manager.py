@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Persist the in-memory index as an encrypted snapshot.
+
+Building an index from scratch means loading and parsing every file in a base
+directory. To get a backend to the first query faster the index is dumped to a
+single binary snapshot encrypted with GPG and stored next to the data. The
+snapshot carries a manifest of stat signatures of all indexed files so that on
+startup only files changed since the snapshot was taken have to be re-indexed.
+A manifest is taken before an index is built (or reconciled): a file changed
+while an index is being built is then recorded with an old signature and
+re-indexed on a next start, never taken as up to date.
+
+The snapshot is serialized with the binary codec (marshal: built-in types
+only, no code is run on load). It is a cache: any problem with it (missing,
+foreign key, format version mismatch, corrupted) results in a full index
+rebuild.
+
+Classes:
+    - SnapshotManager
+"""
+from os.path import join
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDRuntimeException
+from slrd.strings import comlogstr
+from slrd.utils import codec_registry
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class SnapshotManager(object):
+    """Save and restore an index snapshot."""
+
+    SNAPSHOT_NAME = '.index.snapshot'
+    SNAPSHOT_MODE = 0o600
+    MAGIC = 'slrd-index-snapshot'
+    FORMAT_VERSION = 3
+
+    LOGSTR_SAVED = 'index snapshot saved: %s, files: %i, bytes: %i'
+    LOGSTR_LOADED = 'index snapshot loaded: %s, files: %i, reconciled: %i'
+    LOGSTR_NO_SNAPSHOT = 'no index snapshot found: %s'
+    LOGSTR_BAD_SNAPSHOT = 'index snapshot is unusable, rebuilding: %s'
+    LOGSTR_REBUILD = 'rebuilding index from scratch'
+
+    def __init__(self, index, gpgctrl, path=None):
+        """Initialization method.
+
+        :param index:   index to save and restore
+        :param gpgctrl: controller to encrypt and decrypt a snapshot with
+        :param path:    path to a snapshot file; defaults to
+                        self.SNAPSHOT_NAME in a base directory of an index
+
+        :type index:   slrd.managers.index_manager.IndexManager
+        :type gpgctrl: slrd.controllers.gpg_controller.GPGController
+        :type path:    str
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.index = index
+        self.gpgctrl = gpgctrl
+        self.path = path or join(index.base_dir, self.SNAPSHOT_NAME)
+        self.codec = codec_registry.get('binary')
+        self._manifest = None  # taken before an index was built
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def __manifest(self):
+        """Get stat signatures of all files an index is built from.
+
+        :return: {absolute path: (mtime_ns, size, inode)}
+        :rtype:  dict
+        """
+        manifest = {}
+        for path in self.index.watch_dirs():
+            manifest.update(fsctrl.scan_dir(path))
+        return manifest
+
+    def save(self):
+        """Write a snapshot of a current index state.
+
+        A manifest taken before an index was built by self.load_index() (or
+        reconciled by self.load()) is stored; if there is none, one is taken
+        right away, which is only right if no file changed since the index
+        was built.
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        base_dir = self.index.base_dir
+        if self._manifest is None:
+            self._manifest = self.__manifest()
+        manifest = {path[len(base_dir) + 1:]: sig
+                    for path, sig in self._manifest.items()}
+        payload = (self.MAGIC, self.FORMAT_VERSION, manifest,
+                   self.index.dump_state())
+        raw = self.codec.dumps(payload)
+        encrypted = self.gpgctrl.encrypt_blob(raw)
+        fsctrl.write_to_file(encrypted, self.path, mode=self.SNAPSHOT_MODE,
+                             force=True)
+        self.logger.info(self.LOGSTR_SAVED, self.path, len(manifest), len(raw))
+
+    def load(self):
+        """Restore an index from a snapshot and reconcile changed files.
+
+        :return: amount of files re-indexed after a snapshot was restored or
+                 None if a snapshot could not be used
+        :rtype:  int
+        """
+        if not fsctrl.file_exists(self.path):
+            self.logger.info(self.LOGSTR_NO_SNAPSHOT, self.path)
+            return None
+        try:
+            raw = self.gpgctrl.decrypt_blob(fsctrl.read_file(self.path))
+            magic, version, manifest, state = self.codec.loads(raw)
+            if magic != self.MAGIC or version != self.FORMAT_VERSION:
+                raise ValueError('format version: %s' % version)
+            self.index.load_state(state)
+        except (SLRDRuntimeException, EOFError, KeyError, IndexError,
+                TypeError, ValueError) as e:
+            self.logger.warning(self.LOGSTR_BAD_SNAPSHOT, e)
+            self.index.clear()
+            return None
+        base_dir = self.index.base_dir
+        old = {join(base_dir, path): tuple(sig)
+               for path, sig in manifest.items()}
+        new = self.__manifest()
+        changed = {path for path, sig in new.items() if old.get(path) != sig}
+        changed.update(old.keys() - new.keys())
+        self._manifest = new
+        for path in sorted(changed):
+            self.index.reindex_path(path)
+        self.logger.info(self.LOGSTR_LOADED, self.path, len(old), len(changed))
+        return len(changed)
+
+    def load_index(self):
+        """Bring an index up as fast as possible.
+
+        Restore it from a snapshot if possible, otherwise rebuild it and save
+        a fresh snapshot. A snapshot is refreshed as well if many files had to
+        be reconciled.
+
+        :raises: slrd.exceptions.base_exceptions.SLRDRuntimeException
+        """
+        reconciled = self.load()
+        if reconciled is None:
+            self.logger.info(self.LOGSTR_REBUILD)
+            self._manifest = self.__manifest()
+            self.index.load()
+            self.save()
+        elif reconciled:
+            self.save()
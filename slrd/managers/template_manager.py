@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Validation of linkfile keys against templates they are created with.
+
+Every template is compiled into a TemplateValidator once: a set of required
+key names and a tuple of precompiled checks per key (value type, named
+format, regular expression, length). Rules are given per key in a template:
+
+```
+keys:
+    - first_name                          # required, any scalar value
+    - email: {format: email}
+    - pin: {type: str, pattern: '[0-9]{4}'}
+    - nickname: {required: false, min_length: 2, max_length: 32}
+```
+
+A TemplateManager is a registry of compiled validators. Templates are taken
+from an index (IndexManager or SharedIndex) and a validator is compiled again
+only when an index returns a different template object, that is after the
+template was re-indexed; every linkfile created, updated or imported reuses
+a cached validator otherwise.
+
+Classes:
+    - TemplateValidator
+    - TemplateManager
+"""
+from datetime import date, datetime
+import re
+from slrd.exceptions import SLRDTemplateValidationError
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class TemplateValidator(object):
+    """Validate linkfile keys against a single compiled template."""
+
+    __slots__ = ('template', 'required', 'checks')
+
+    # YAML scalar types a key value may be declared as
+    TYPES = {
+        'str': (str,),
+        'int': (int,),
+        'float': (int, float),
+        'bool': (bool,),
+        'date': (date, datetime),
+    }
+    FORMATS = {
+        'email': re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+'),
+        'url': re.compile(r'(https?://)?[^\s/]+\.[^\s/]+(/\S*)?'),
+        'phone': re.compile(r'\+?[0-9][0-9 ()-]{3,}[0-9]'),
+        'digits': re.compile(r'[0-9]+'),
+    }
+    RULES = frozenset(('required', 'type', 'format', 'pattern', 'min_length',
+                       'max_length'))
+
+    ERRMSG_BAD_RULE = 'template %s: bad rule of key %s: %s: %r'
+    ERRMSG_MISSING = 'missing required key: %s'
+    ERRMSG_NOT_SCALAR = 'key %s: value is not a scalar'
+    ERRMSG_TYPE = 'key %s: %s expected'
+    ERRMSG_FORMAT = 'key %s: not a valid %s'
+    ERRMSG_PATTERN = 'key %s: does not match %s'
+    ERRMSG_MIN_LENGTH = 'key %s: shorter than %i characters'
+    ERRMSG_MAX_LENGTH = 'key %s: longer than %i characters'
+    ERRMSG_INVALID = 'keys do not satisfy template %s: %s'
+
+    def __init__(self, template):
+        """Compile a template.
+
+        :param template: template to validate keys against
+        :type template:  slrd.types.template_type.TemplateType
+
+        :raises: slrd.exceptions.manager_exceptions.
+                 SLRDTemplateValidationError on malformed rules
+        """
+        self.template = template
+        rules = template.rules or {}
+        required, checks = [], []
+        for key in template.keys:
+            key_rules = rules.get(key, {})
+            if key_rules.get('required', True):
+                required.append(key)
+            key_checks = self.__compile(key, key_rules)
+            if key_checks:
+                checks.append((key, key_checks))
+        self.required = frozenset(required)
+        self.checks = tuple(checks)
+
+    def __fail(self, key, rule, value):
+        """Raise an error about a malformed rule of a key."""
+        msg = self.ERRMSG_BAD_RULE % (self.template.name, key, rule, value)
+        raise SLRDTemplateValidationError(msg, (msg,))
+
+    def __compile(self, key, rules):
+        """Turn rules of a key into a tuple of (check, message) pairs.
+
+        A check is called with a value and returns whether it passes. Values
+        are never put into messages since they may be passwords.
+        """
+        checks = []
+        for rule in set(rules) - self.RULES:
+            self.__fail(key, rule, rules[rule])
+        if 'type' in rules:
+            types = self.TYPES.get(rules['type'])
+            if types is None:
+                self.__fail(key, 'type', rules['type'])
+            # bool is an int subclass but true is not a valid int
+            exclude = () if bool in types else (bool,)
+            checks.append((lambda v: isinstance(v, types) and
+                           not isinstance(v, exclude),
+                           self.ERRMSG_TYPE % (key, rules['type'])))
+        for rule, pattern, errmsg in (
+                ('format', self.FORMATS.get(rules.get('format')),
+                 self.ERRMSG_FORMAT),
+                ('pattern', rules.get('pattern'), self.ERRMSG_PATTERN)):
+            if rule not in rules:
+                continue
+            if pattern is None or not isinstance(pattern, (str, re.Pattern)):
+                self.__fail(key, rule, rules[rule])
+            try:
+                match = re.compile(pattern).fullmatch
+            except re.error:
+                self.__fail(key, rule, pattern)
+            checks.append((lambda v, match=match: match(str(v)) is not None,
+                           errmsg % (key, rules[rule])))
+        for rule, errmsg, passes in (
+                ('min_length', self.ERRMSG_MIN_LENGTH,
+                 lambda limit: lambda v: len(str(v)) >= limit),
+                ('max_length', self.ERRMSG_MAX_LENGTH,
+                 lambda limit: lambda v: len(str(v)) <= limit)):
+            if rule not in rules:
+                continue
+            limit = rules[rule]
+            if not isinstance(limit, int) or isinstance(limit, bool) or \
+                    limit < 0:
+                self.__fail(key, rule, limit)
+            checks.append((passes(limit), errmsg % (key, limit)))
+        return tuple(checks)
+
+    def errors(self, keys):
+        """Find every problem with linkfile keys.
+
+        Keys not declared by a template are allowed as they are.
+
+        :param keys: {key name: value}
+        :type keys:  dict
+
+        :return: error messages (empty if keys are valid)
+        :rtype:  list
+        """
+        errors = [self.ERRMSG_MISSING % key for key in self.required
+                  if keys.get(key) in (None, '')]
+        for key, checks in self.checks:
+            value = keys.get(key)
+            if value is None:
+                continue
+            if isinstance(value, (dict, list, tuple)):
+                errors.append(self.ERRMSG_NOT_SCALAR % key)
+                continue
+            errors.extend(errmsg for check, errmsg in checks
+                          if not check(value))
+        return errors
+
+    def validate(self, keys):
+        """Make sure linkfile keys satisfy a template.
+
+        :param keys: {key name: value}
+        :type keys:  dict
+
+        :raises: slrd.exceptions.manager_exceptions.
+                 SLRDTemplateValidationError
+        """
+        errors = self.errors(keys)
+        if errors:
+            raise SLRDTemplateValidationError(
+                    self.ERRMSG_INVALID % (self.template.name,
+                                           '; '.join(errors)), errors)
+
+
+class TemplateManager(object):
+    """Registry of compiled template validators."""
+
+    LOGSTR_COMPILED = 'template compiled: %s, %i required keys'
+
+    ERRMSG_NO_TEMPLATE = 'no such template: %s'
+
+    def __init__(self, source):
+        """Initialization method.
+
+        :param source: function to get a template by its name (None if there
+                       is no such template), i.e. IndexManager.get_template
+        :type source:  function
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.source = source
+        self._validators = {}  # template name -> TemplateValidator
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def validator(self, name):
+        """Get a compiled validator of a template.
+
+        :param name: template name (i.e. Facebook registration template)
+        :type name:  str
+
+        :rtype: TemplateValidator
+
+        :raises: slrd.exceptions.manager_exceptions.
+                 SLRDTemplateValidationError if there is no such template or
+                 it has malformed rules
+        """
+        template = self.source(name)
+        validator = self._validators.get(name)
+        if validator is not None and validator.template is template:
+            return validator
+        if template is None:
+            self._validators.pop(name, None)
+            msg = self.ERRMSG_NO_TEMPLATE % name
+            raise SLRDTemplateValidationError(msg, (msg,))
+        validator = self._validators[name] = TemplateValidator(template)
+        self.logger.debug(self.LOGSTR_COMPILED, name,
+                          len(validator.required))
+        return validator
+
+    def errors(self, linkfile):
+        """Find every problem with keys of a linkfile.
+
+        Linkfiles that are not created with a template are always valid.
+
+        :param linkfile: linkfile to check
+        :type linkfile:  slrd.types.link_type.LinkType
+
+        :return: error messages (empty if a linkfile is valid)
+        :rtype:  list
+        """
+        if linkfile.template is None:
+            return []
+        try:
+            validator = self.validator(linkfile.template)
+        except SLRDTemplateValidationError as e:
+            return list(e.errors)
+        return validator.errors(linkfile.keys)
+
+    def validate(self, linkfile):
+        """Make sure keys of a linkfile satisfy its template.
+
+        :param linkfile: linkfile about to be created or updated
+        :type linkfile:  slrd.types.link_type.LinkType
+
+        :raises: slrd.exceptions.manager_exceptions.
+                 SLRDTemplateValidationError
+        """
+        if linkfile.template is not None:
+            self.validator(linkfile.template).validate(linkfile.keys)
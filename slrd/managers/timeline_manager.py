@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Time-ordered index of registrations (linkfile created_on timestamps).
+
+Linkfiles are kept in two parallel arrays sorted by (timestamp, ordinal):
+a range of time is found with two bisections and a page of a timeline is
+a slice of those arrays, so nothing is scanned or sorted per query. A single
+linkfile is added or removed with a bisection and an insert/delete, which
+keeps the timeline in sync with an index incrementally.
+
+Pages are addressed by keyset cursors (timestamp and id of the last entry of
+a previous page) rather than offsets, so that pages stay consistent while
+registrations are added.
+
+Arrays may be any sequences of integers (array.array in RAM, memoryview of
+a mapped file for a shared index), a timeline over read-only sequences is
+read-only.
+
+Classes:
+    - TimelineManager
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+class TimelineManager(object):
+    """Query linkfiles ordered by registration time."""
+
+    NO_STAMP = -2 ** 63     # ordinal is not on a timeline
+    STAMP_ARRAY_TYPE = 'q'
+    ORDINAL_ARRAY_TYPE = 'I'
+    # created_on as in README: 02.02.2018 14:22 Africa/Accra
+    CREATED_ON_FORMAT = '%d.%m.%Y %H:%M'
+
+    def __init__(self, id_of, ordinal_of, template_of, stamps=None,
+                 ordinals=None, by_ordinal=None):
+        """Initialization method.
+
+        :param id_of:       function to get a linkfile id of an ordinal
+        :param ordinal_of:  function to get an ordinal of a linkfile id
+                            (None if there is no such id)
+        :param template_of: function to get a template name of an ordinal
+        :param stamps:      sorted timestamps
+        :param ordinals:    ordinals of each timestamp
+        :param by_ordinal:  timestamp of each ordinal (self.NO_STAMP if none)
+
+        :type id_of:       function
+        :type ordinal_of:  function
+        :type template_of: function
+        :type stamps:      sequence of int
+        :type ordinals:    sequence of int
+        :type by_ordinal:  sequence of int
+        """
+        self.id_of = id_of
+        self.ordinal_of = ordinal_of
+        self.template_of = template_of
+        self.stamps = array(self.STAMP_ARRAY_TYPE) if stamps is None \
+            else stamps
+        self.ordinals = array(self.ORDINAL_ARRAY_TYPE) if ordinals is None \
+            else ordinals
+        self.by_ordinal = array(self.STAMP_ARRAY_TYPE) if by_ordinal is None \
+            else by_ordinal
+
+    @classmethod
+    def parse_stamp(cls, created_on):
+        """Convert a created_on field to a UNIX timestamp.
+
+        Accepted are datetime/date objects (YAML parses ISO 8601 timestamps
+        into them), ISO 8601 strings and the README format with an optional
+        IANA time zone name. Naive times are taken as UTC.
+
+        :param created_on: created_on field of a linkfile
+
+        :return: timestamp or None if created_on can't be parsed
+        :rtype:  int
+        """
+        if isinstance(created_on, datetime):
+            stamp = created_on
+        elif isinstance(created_on, date):
+            stamp = datetime(created_on.year, created_on.month,
+                             created_on.day)
+        elif isinstance(created_on, str):
+            try:
+                stamp = datetime.fromisoformat(created_on)
+            except ValueError:
+                parts = created_on.split()
+                try:
+                    stamp = datetime.strptime(' '.join(parts[:2]),
+                                              cls.CREATED_ON_FORMAT)
+                except ValueError:
+                    return None
+                if len(parts) > 2:
+                    try:
+                        stamp = stamp.replace(tzinfo=ZoneInfo(parts[2]))
+                    except (ZoneInfoNotFoundError, ValueError):
+                        pass
+        else:
+            return None
+        if stamp.tzinfo is None:
+            stamp = stamp.replace(tzinfo=timezone.utc)
+        return int(stamp.timestamp())
+
+    def stamp_of(self, ordinal):
+        """Get a timestamp of an ordinal (self.NO_STAMP if it has none)."""
+        if ordinal < len(self.by_ordinal):
+            return self.by_ordinal[ordinal]
+        return self.NO_STAMP
+
+    def __bounds(self, stamp, ordinal, stamps, ordinals):
+        """Get positions right before and right after (stamp, ordinal)."""
+        lo = bisect_left(stamps, stamp)
+        hi = bisect_right(stamps, stamp, lo)
+        return (bisect_left(ordinals, ordinal, lo, hi),
+                bisect_right(ordinals, ordinal, lo, hi))
+
+    def clear(self):
+        """Drop everything from a timeline."""
+        del self.stamps[:], self.ordinals[:], self.by_ordinal[:]
+
+    def load(self, pairs):
+        """Replace a timeline with (ordinal, timestamp) pairs in one go.
+
+        :param pairs: ordinals and their timestamps (None for no timestamp)
+        :type pairs:  iterable of tuple
+        """
+        self.clear()
+        entries = []
+        for ordinal, stamp in pairs:
+            self.__set_stamp(ordinal, stamp)
+            if stamp is not None:
+                entries.append((stamp, ordinal))
+        entries.sort()
+        self.stamps.extend(stamp for stamp, _ in entries)
+        self.ordinals.extend(ordinal for _, ordinal in entries)
+
+    def __set_stamp(self, ordinal, stamp):
+        """Record a timestamp of an ordinal."""
+        missing = ordinal + 1 - len(self.by_ordinal)
+        if missing > 0:
+            self.by_ordinal.extend([self.NO_STAMP] * missing)
+        self.by_ordinal[ordinal] = self.NO_STAMP if stamp is None else stamp
+
+    def add(self, ordinal, stamp):
+        """Put an ordinal on a timeline (replacing its previous timestamp).
+
+        :param ordinal: linkfile ordinal
+        :param stamp:   timestamp (None to only drop an ordinal)
+
+        :type ordinal: int
+        :type stamp:   int
+        """
+        self.remove(ordinal)
+        self.__set_stamp(ordinal, stamp)
+        if stamp is not None:
+            pos = self.__bounds(stamp, ordinal, self.stamps, self.ordinals)[1]
+            self.stamps.insert(pos, stamp)
+            self.ordinals.insert(pos, ordinal)
+
+    def remove(self, ordinal):
+        """Drop an ordinal from a timeline (no-op if it's not there).
+
+        :param ordinal: linkfile ordinal
+        :type ordinal:  int
+        """
+        stamp = self.stamp_of(ordinal)
+        if stamp == self.NO_STAMP:
+            return
+        pos = self.__bounds(stamp, ordinal, self.stamps, self.ordinals)[0]
+        del self.stamps[pos], self.ordinals[pos]
+        self.by_ordinal[ordinal] = self.NO_STAMP
+
+    def query(self, start=None, end=None, candidates=None, template=None,
+              limit=None, cursor=None, reverse=False):
+        """Get a page of a timeline.
+
+        :param start:      lowest timestamp (inclusive)
+        :param end:        highest timestamp (exclusive)
+        :param candidates: ordinals to choose from (i.e. registrations on
+                           a site); all ordinals if not passed
+        :param template:   template name entries should have
+        :param limit:      maximum amount of entries
+        :param cursor:     (timestamp, linkfile id) of the last entry of
+                           a previous page
+        :param reverse:    newest entries first
+
+        :type start:      int
+        :type end:        int
+        :type candidates: iterable of int
+        :type template:   str
+        :type limit:      int
+        :type cursor:     tuple
+        :type reverse:    bool
+
+        :return: [(linkfile id, timestamp)] and a cursor of a next page (None
+                 if it's the last one)
+        :rtype:  tuple
+        """
+        if limit is not None and limit < 1:
+            return [], None
+        stamps, ordinals = self.stamps, self.ordinals
+        if candidates is not None:
+            stamp_of, no_stamp = self.stamp_of, self.NO_STAMP
+            entries = sorted((stamp_of(o), o) for o in candidates
+                             if stamp_of(o) != no_stamp)
+            stamps = [stamp for stamp, _ in entries]
+            ordinals = [ordinal for _, ordinal in entries]
+        lo = 0 if start is None else bisect_left(stamps, start)
+        hi = len(stamps) if end is None else bisect_left(stamps, end)
+        if cursor is not None:
+            stamp, lid = cursor
+            ordinal = self.ordinal_of(lid)
+            if ordinal is None:  # deleted meanwhile: resume by time only
+                ordinal = -1 if reverse else 2 ** 32
+            before, after = self.__bounds(stamp, ordinal, stamps, ordinals)
+            if reverse:
+                hi = min(hi, before)
+            else:
+                lo = max(lo, after)
+        items, id_of, template_of = [], self.id_of, self.template_of
+        for idx in (range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)):
+            ordinal = ordinals[idx]
+            if template is not None and template_of(ordinal) != template:
+                continue
+            if len(items) == limit:
+                return items, items[-1][::-1]
+            items.append((id_of(ordinal), stamps[idx]))
+        return items, None
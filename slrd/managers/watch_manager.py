@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Keep the in-memory index in sync with a base directory.
+
+This module watches directories an index is built from and re-indexes only
+files that were changed (created, modified, moved or deleted) instead of
+rebuilding the whole index. Linux inotify is used when it's available (through
+libc, no extra dependencies) and directory polling otherwise.
+
+Changes come in bursts (i.e. `git pull` touches many files at once) so events
+are collected until the directory settles down and then applied in one go.
+
+Classes:
+    - WatchManager
+"""
+import ctypes
+import ctypes.util
+from os import close, read, stat, strerror
+from os.path import join
+from select import select
+from struct import Struct
+from threading import Event, Thread
+from time import monotonic
+from slrd.controllers import fsctrl
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class _Inotify(object):
+    """Minimal libc inotify binding."""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    FILE_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | \
+        IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+
+    EVENT = Struct('iIII')
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, libc):
+        """Initialization method.
+
+        :param libc: loaded libc with inotify support
+        :type libc:  ctypes.CDLL
+        """
+        self.libc = libc
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), strerror(ctypes.get_errno()))
+
+    @classmethod
+    def create(cls):
+        """Create an inotify instance if a platform supports it.
+
+        :return: inotify instance or None
+        :rtype:  _Inotify
+        """
+        name = ctypes.util.find_library('c')
+        try:
+            libc = ctypes.CDLL(name, use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+            return cls(libc)
+        except (OSError, AttributeError):
+            return None
+
+    def add_watch(self, path, mask):
+        """Add a watch for a directory.
+
+        :return: watch descriptor or -1 on failure
+        :rtype:  int
+        """
+        return self.libc.inotify_add_watch(self.fd, path.encode(), mask)
+
+    def read_events(self, timeout):
+        """Read pending events waiting for at most timeout seconds.
+
+        :return: list of (wd, mask, name) tuples
+        :rtype:  list
+        """
+        if not select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            buf = read(self.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset, size = 0, self.EVENT.size
+        while offset < len(buf):
+            wd, mask, _, nlen = self.EVENT.unpack_from(buf, offset)
+            offset += size
+            name = buf[offset:offset + nlen].rstrip(b'\0').decode()
+            offset += nlen
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        """Close an inotify file descriptor."""
+        close(self.fd)
+
+
+class WatchManager(object):
+    """Re-index files that were changed in directories of an index."""
+
+    POLL_INTERVAL = 2.0
+    SETTLE_DELAY = 0.2
+
+    LOGSTR_MODE = 'watching %i directories, mode: %s'
+    LOGSTR_NO_INOTIFY = 'inotify is not available: falling back to polling'
+    LOGSTR_WATCH_FAIL = 'failed to watch directory (will poll it): %s'
+    LOGSTR_OVERFLOW = 'inotify queue overflow: rescanning all directories'
+    LOGSTR_APPLIED = 're-indexed %i changed files'
+    LOGSTR_STOPPED = 'watcher stopped'
+
+    def __init__(self, index, poll_interval=None, use_inotify=True,
+                 on_apply=None):
+        """Initialization method.
+
+        :param index:         index to keep in sync (should implement
+                              watch_dirs() and reindex_path(path))
+        :param poll_interval: seconds between directory scans when polling
+        :param use_inotify:   use inotify if a platform supports it
+        :param on_apply:      function to call with an amount of re-indexed
+                              files after changes were applied
+
+        :type index:         slrd.managers.index_manager.IndexManager
+        :type poll_interval: float
+        :type use_inotify:   bool
+        :type on_apply:      function
+        """
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self.index = index
+        self.dirs = tuple(index.watch_dirs())
+        self.poll_interval = poll_interval or self.POLL_INTERVAL
+        self.on_apply = on_apply
+        self._inotify = _Inotify.create() if use_inotify else None
+        if use_inotify and self._inotify is None:
+            self.logger.warning(self.LOGSTR_NO_INOTIFY)
+        self._wds = {}      # watch descriptor -> directory
+        self._root_wds = {}  # watch descriptor -> parent of watched dirs
+        self._polled = set()
+        self._state = {}    # directory -> {path: (mtime_ns, size, inode)}
+        self._pending = set()
+        self._stop = Event()
+        self._thread = None
+        for path in self.dirs:
+            self._state[path] = fsctrl.scan_dir(path)
+            self.__watch(path)
+        self.logger.info(self.LOGSTR_MODE, len(self.dirs), self.mode)
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    @property
+    def mode(self):
+        """Get a watch mode: 'inotify', 'poll' or 'mixed'."""
+        if self._inotify is None or len(self._polled) == len(self.dirs):
+            return 'poll'
+        return 'mixed' if self._polled else 'inotify'
+
+    def __watch(self, path):
+        """Start watching a directory with inotify (poll it on failure).
+
+        A parent directory is watched as well so that a directory that is
+        created later (i.e. by a sync) is picked up.
+        """
+        if self._inotify is None:
+            self._polled.add(path)
+            return
+        parent = path.rsplit('/', 1)[0] or '/'
+        if parent not in self._root_wds.values():
+            wd = self._inotify.add_watch(parent, _Inotify.ROOT_MASK)
+            if wd >= 0:
+                self._root_wds[wd] = parent
+        wd = self._inotify.add_watch(path, _Inotify.FILE_MASK)
+        if wd < 0:
+            self.logger.debug(self.LOGSTR_WATCH_FAIL, path)
+            self._polled.add(path)
+            return
+        self._polled.discard(path)
+        self._wds[wd] = path
+
+    def __rescan(self, path):
+        """Diff a directory against its last scan and queue changed files."""
+        old, new = self._state.get(path, {}), fsctrl.scan_dir(path)
+        self._state[path] = new
+        for fpath, sig in new.items():
+            if old.get(fpath) != sig:
+                self._pending.add(fpath)
+        self._pending.update(old.keys() - new.keys())
+
+    def __handle_events(self, events):
+        """Queue files mentioned in inotify events."""
+        for wd, mask, name in events:
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                self.logger.warning(self.LOGSTR_OVERFLOW)
+                for path in self.dirs:
+                    self.__rescan(path)
+            elif wd in self._root_wds:
+                path = join(self._root_wds[wd], name)
+                if path in self.dirs and mask & _Inotify.IN_ISDIR:
+                    self.__watch(path)
+                    self.__rescan(path)
+            elif wd in self._wds:
+                path = self._wds[wd]
+                if mask & (_Inotify.IN_DELETE_SELF | _Inotify.IN_MOVE_SELF |
+                           _Inotify.IN_IGNORED):
+                    self._wds.pop(wd)
+                    self.__rescan(path)
+                elif name and not mask & _Inotify.IN_ISDIR:
+                    self._pending.add(join(path, name))
+
+    def __update_state(self, path):
+        """Refresh a stat signature of a single file after it's re-indexed.
+
+        Keeps signatures of inotify-watched directories current so that a
+        later rescan (queue overflow, directory re-creation) diffs correctly.
+        """
+        state = self._state.setdefault(path.rsplit('/', 1)[0], {})
+        try:
+            st = stat(path, follow_symlinks=False)
+            state[path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            state.pop(path, None)
+
+    def __apply(self):
+        """Re-index all queued files.
+
+        :return: amount of files re-indexed
+        :rtype:  int
+        """
+        pending, self._pending = self._pending, set()
+        count = 0
+        for path in sorted(pending):
+            if self.index.reindex_path(path):
+                count += 1
+                self.__update_state(path)
+        if count:
+            self.logger.info(self.LOGSTR_APPLIED, count)
+            if self.on_apply is not None:
+                self.on_apply(count)
+        return count
+
+    def check(self, timeout=0):
+        """Collect changes and apply them to the index.
+
+        With inotify events are collected until no new events arrive for
+        self.SETTLE_DELAY seconds (or timeout is reached). Polled directories
+        are rescanned once.
+
+        :param timeout: maximum seconds to wait for the first event
+        :type timeout:  float
+
+        :return: amount of files re-indexed
+        :rtype:  int
+        """
+        for path in self._polled:
+            self.__rescan(path)
+        if self._inotify is not None and self._wds:
+            events = self._inotify.read_events(timeout)
+            deadline = monotonic() + max(timeout, self.SETTLE_DELAY)
+            while events:
+                self.__handle_events(events)
+                wait = min(self.SETTLE_DELAY, deadline - monotonic())
+                events = self._inotify.read_events(wait) if wait > 0 else []
+        return self.__apply()
+
+    def __run(self):
+        """Watcher thread main loop."""
+        while not self._stop.is_set():
+            if self._inotify is not None and not self._polled:
+                self.check(self.poll_interval)
+            else:
+                self.check()
+                self._stop.wait(self.poll_interval)
+        self.logger.debug(self.LOGSTR_STOPPED)
+
+    def start(self):
+        """Start watching in a background (daemon) thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self.__run, name='slrd-watcher',
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop a background thread and release inotify resources."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+            self._wds.clear()
+            self._root_wds.clear()
+            self._polled.update(self.dirs)
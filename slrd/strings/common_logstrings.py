@@ -26,3 +26,5 @@ class CommonLogstrings(object):
     # Should be logged when some kind of a check was made. Prefered log level
     # depends on an importance of a check but generally DEBUG is a good start.
     LOG_CHECK_RESULT = "check %s result: %s"
+    # Same as LOG_CHECK_RESULT for checks called with a single argument.
+    LOG_CHECK_CALL_RESULT = "check %s(%s) result: %s"
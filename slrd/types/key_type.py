@@ -2,11 +2,21 @@
 # vi: set ft=python sw=4 :
 """SLRD key data type module.
 
-Todo:
-    - docs
-    - implement
+A key is a single top-level entry of a keyfile: a key name (i.e.
+first_name) with all of its values, each one referencing a list of linkfile
+ids. Both keyfile shapes from the README are accepted:
+
+```
+first_name: {John: [...], Bob: [...]}
+first_name:
+    - John: [...]
+    - Bob: [...]
+```
+
+Classes:
+    - KeyType
 """
-from super_type import SuperType
+from slrd.types.super_type import SuperType
 
 
 class KeyType(SuperType):
@@ -15,14 +25,86 @@ class KeyType(SuperType):
     This data type stores references to corresponding value files.
     """
 
-    def __init__(self, raw_yaml=None, **kwargs):
-        """Initialization method.
+    __slots__ = ('name', 'values', 'ids')
+
+    FIELDS = ('name', 'values', 'ids')
+
+    def _load(self, data):
+        """Resolve {key name: values} (a keyfile with a single key).
+
+        :param data: parsed content
+        :type data:  dict
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if not isinstance(data, dict) or len(data) != 1:
+            self._fail(data)
+        (name, raw), = data.items()
+        self._set(name, raw)
+
+    def _set(self, name, raw):
+        """Fill fields from a key name and its raw values."""
+        name_ = self._name
+        values, ids = [], []
+        for value, value_ids in self.iter_values(raw, self._fail):
+            if value_ids is None:
+                value_ids = ()
+            elif not isinstance(value_ids, (list, tuple)):
+                self._fail(raw)
+            values.append(name_(value))
+            ids.append(tuple(name_(i) for i in value_ids))
+        self.name = name_(name)
+        self.values = tuple(values)
+        self.ids = tuple(ids)
+
+    @staticmethod
+    def iter_values(raw, fail):
+        """Iterate (value, ids) pairs of raw values of a single key.
+
+        :param raw:  raw values (dict or list of single-item dicts)
+        :param fail: function to call on malformed input
+
+        :type raw:  dict or list
+        :type fail: function
+        """
+        if isinstance(raw, dict):
+            yield from raw.items()
+        elif isinstance(raw, list):
+            for item in raw:
+                if not isinstance(item, dict):
+                    fail(item)
+                yield from item.items()
+        elif raw is not None:
+            fail(raw)
+
+    @classmethod
+    def from_keyfile(cls, content):
+        """Build keys of a whole keyfile.
+
+        :param content: parsed content of a keyfile
+        :type content:  dict
+
+        :return: keys in order of a keyfile
+        :rtype:  tuple
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if not isinstance(content, dict):
+            cls.__new__(cls)._fail(content)
+        keys = []
+        for name, raw in content.items():
+            key = cls.__new__(cls)
+            key._set(name, raw)
+            keys.append(key)
+        return tuple(keys)
 
-        :param raw_yaml:
-        :param kwargs:
+    def items(self):
+        """Iterate (value, ids) pairs."""
+        return zip(self.values, self.ids)
 
-        :type raw_yaml:
-        :type kwargs:
+    def to_dict(self):
+        """Export a key as {name: {value: [ids]}}.
 
-        :raise: <???>
+        :rtype: dict
         """
+        return {self.name: {v: list(ids) for v, ids in self.items()}}
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""SLRD linkfile data type module.
+
+A linkfile is created once a user registers somewhere using a template:
+
+```
+id: <random_value>
+template: <template_name>
+keys:
+    first_name: John
+    email: johnjohn@mealforfree.de
+created_on: 02.02.2018 14:22 Africa/Accra
+notes: My main FB profile
+<any_other_optional_keys: ...>
+```
+
+Key names and values are kept in two parallel tuples (key names interned and
+shared between all linkfiles) instead of a dict per linkfile.
+
+Classes:
+    - LinkType
+"""
+from slrd.types.super_type import SuperType
+
+
+class LinkType(SuperType):
+    """SLRD linkfile data type."""
+
+    __slots__ = ('id', 'template', 'key_names', 'key_values', 'created_on',
+                 'notes', 'extra')
+
+    FIELDS = ('id', 'template', 'keys', 'created_on', 'notes')
+    KNOWN = frozenset(FIELDS)
+    # keys whose values never leave a backend in plain text (keyfiles, API)
+    SECRET_KEYS = frozenset(('password', 'pin', 'secret', 'token', 'totp'))
+
+    def _load(self, data):
+        """Resolve parsed linkfile content.
+
+        :param data: parsed content
+        :type data:  dict
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if not isinstance(data, dict) or data.get('id') is None:
+            self._fail(data)
+        name = self._name
+        keys = data.get('keys') or {}
+        if not isinstance(keys, dict):
+            self._fail(keys)
+        template = data.get('template')
+        self.id = name(data['id'])
+        self.template = None if template is None else name(template)
+        self.key_names = tuple(name(k) for k in keys)
+        self.key_values = tuple(keys.values())
+        self.created_on = data.get('created_on')
+        self.notes = data.get('notes')
+        self.extra = self._extra(data, self.KNOWN)
+
+    @property
+    def keys(self):
+        """Get {key name: value} (built on access)."""
+        return dict(zip(self.key_names, self.key_values))
+
+    def get_key(self, name, default=None):
+        """Get a value of a single key without building a dict.
+
+        :param name: key name (i.e. first_name)
+        :type name:  str
+        """
+        try:
+            return self.key_values[self.key_names.index(name)]
+        except ValueError:
+            return default
+
+    def __getitem__(self, name):
+        """Read-only mapping-style access (optional keys included)."""
+        if name in self.KNOWN:
+            return getattr(self, name)
+        if self.extra is not None and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def to_dict(self, secrets=True):
+        """Export a linkfile as parsed content.
+
+        :param secrets: include keys and optional fields named like
+                        self.SECRET_KEYS
+        :type secrets:  bool
+
+        :rtype: dict
+        """
+        data = {'id': self.id}
+        for field in ('template', 'created_on', 'notes'):
+            if getattr(self, field) is not None:
+                data[field] = getattr(self, field)
+        if self.key_names:
+            data['keys'] = self.keys
+        if self.extra:
+            data.update(self.extra)
+        if not secrets:
+            data = {name: value for name, value in data.items()
+                    if name not in self.SECRET_KEYS}
+            if 'keys' in data:
+                data['keys'] = {name: value for name, value in
+                                data['keys'].items()
+                                if name not in self.SECRET_KEYS}
+        return data
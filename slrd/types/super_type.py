@@ -2,16 +2,31 @@
 # vi: set ft=python sw=4 :
 """Module that provides a unified superclass for all SLRD data types.
 
-Todo:
-    - implement?
-    - docs?
+Data types are compact model objects: every field lives in a __slots__ slot
+(no per-instance __dict__), field and key names are interned and lists are
+stored as tuples. A model is built straight from parsed data with
+from_parsed() or from raw YAML/keyword arguments with a constructor.
+
+Classes:
+    - SuperType
 """
-import yaml
+from sys import intern
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.utils import codec_registry
 
 
 class SuperType(object):
     """Underlying class of all SLRD data types."""
 
+    __slots__ = ()
+
+    # names of fields exposed through mapping-style access (see __getitem__)
+    FIELDS = ()
+
+    ERRMSG_BOTH_INPUTS = 'either raw YAML or keyword arguments expected'
+    ERRMSG_BAD_YAML = 'malformed YAML: %s'
+    ERRMSG_BAD_DATA = 'malformed %s: %s'
+
     def __init__(self, raw_yaml=None, **kwargs):
         """Initialization method.
 
@@ -19,24 +34,98 @@ class SuperType(object):
             - raw YAML string that should be loaded
             - keyword arguments that should be resolved by a child
 
-        Then save input data to an instance field for a post-processing by a
-        specific child instance.
+        Then let a specific child resolve input data into its fields.
 
         :param raw_yaml: raw YAML that should be resolved to arguments for
                          a specific child instance
-        :kwargs:         keyword arguments to bypass to a child saving it
-                         to an instance field
+        :kwargs:         keyword arguments to bypass to a child
         :type raw_yaml:  str
         :type kwargs:    dict
 
-        :raise: <???>
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
         """
         if raw_yaml and kwargs:
-            raise #REALLY BAD (CAN'T PASS BOTH)
+            raise SLRDIllegalArgumentError(self.ERRMSG_BOTH_INPUTS)
         if raw_yaml:
             try:
-                self.args = yaml.loads(raw_yaml)
-            except:
-                raise # NOPE, not YAML actually
-        else:
-            self.args = kwargs
+                kwargs = codec_registry.get('yaml').loads(raw_yaml)
+            except Exception as e:
+                raise SLRDIllegalArgumentError(self.ERRMSG_BAD_YAML % e)
+        self._load(kwargs)
+
+    @classmethod
+    def from_parsed(cls, data):
+        """Build an instance from already parsed data.
+
+        :param data: parsed content (i.e. of a YAML file)
+        :type data:  dict
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        obj = cls.__new__(cls)
+        obj._load(data)
+        return obj
+
+    def _load(self, data):
+        """Resolve parsed data into fields (implemented by children).
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        raise NotImplementedError
+
+    def _fail(self, data):
+        """Raise an error about malformed input data.
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        raise SLRDIllegalArgumentError(
+                self.ERRMSG_BAD_DATA % (type(self).__name__, data))
+
+    @staticmethod
+    def _name(value):
+        """Get an interned str out of a key or field name."""
+        return intern(str(value))
+
+    @staticmethod
+    def _extra(data, known):
+        """Get fields of data not known to a model (None if there are none).
+
+        :param data:  parsed data
+        :param known: names of fields a model keeps in slots
+
+        :rtype: dict
+        """
+        extra = {intern(str(k)): v for k, v in data.items() if k not in known}
+        return extra or None
+
+    def to_dict(self):
+        """Export an instance as built-in types only (for serialization).
+
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, name):
+        """Read-only mapping-style access to fields (i.e. obj['id'])."""
+        if name in self.FIELDS:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        """Get a field by name like dict.get() does."""
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        """Compare models by content."""
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        """."""
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
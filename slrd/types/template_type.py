@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""SLRD template data type module.
+
+A template describes which keys a site (or any other kind of record) has:
+
+```
+name: Facebook registration template
+type: online
+first_time_link: fb.com/register
+link: fb.com/login
+keys:
+    - first_name
+    - email: {format: email}
+    - password: {min_length: 8}
+    - nickname: {required: false, max_length: 32}
+<frontend specific content: ...>
+```
+
+A key is either a name or a name with rules its values are validated by (see
+slrd.managers.template_manager). Key names are kept in self.keys and rules in
+self.rules.
+
+Fields unknown to the backend are kept as is in self.extra for frontends.
+
+Classes:
+    - TemplateType
+"""
+from slrd.types.super_type import SuperType
+
+
+class TemplateType(SuperType):
+    """SLRD template data type."""
+
+    __slots__ = ('name', 'type', 'link', 'first_time_link', 'keys', 'rules',
+                 'extra')
+
+    FIELDS = ('name', 'type', 'link', 'first_time_link', 'keys')
+    KNOWN = frozenset(FIELDS)
+    DEF_TYPE = 'plain'
+
+    def _load(self, data):
+        """Resolve parsed template content.
+
+        :param data: parsed content
+        :type data:  dict
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        if not isinstance(data, dict) or data.get('name') is None:
+            self._fail(data)
+        name = self._name
+        keys = data.get('keys') or ()
+        if not isinstance(keys, (list, tuple)):
+            self._fail(keys)
+        self.name = name(data['name'])
+        self.type = name(data.get('type') or self.DEF_TYPE)
+        self.link = data.get('link')
+        self.first_time_link = data.get('first_time_link')
+        names, rules = [], {}
+        for key in keys:
+            if isinstance(key, dict):
+                if len(key) != 1:
+                    self._fail(key)
+                (key, key_rules), = key.items()
+                if key_rules is not None:
+                    if not isinstance(key_rules, dict):
+                        self._fail(key_rules)
+                    rules[name(key)] = key_rules
+            names.append(name(key))
+        self.keys = tuple(names)
+        self.rules = rules or None
+        self.extra = self._extra(data, self.KNOWN)
+
+    def to_dict(self):
+        """Export a template as parsed content.
+
+        :rtype: dict
+        """
+        data = {'name': self.name, 'type': self.type}
+        for field in ('link', 'first_time_link'):
+            if getattr(self, field) is not None:
+                data[field] = getattr(self, field)
+        if self.keys:
+            rules = self.rules or {}
+            data['keys'] = [{key: rules[key]} if key in rules else key
+                            for key in self.keys]
+        if self.extra:
+            data.update(self.extra)
+        return data
@@ -2,8 +2,14 @@
 # vi: set ft=python sw=4 :
 """."""
 import logging
+from os import environ
 from slrd.utils.type_checker import TypeChecker
+from slrd.utils.random_utils import RandomUtils
+from slrd.utils.codec_registry import CodecRegistry
 
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
-type_checker = TypeChecker()  # all checks enabled
+# all checks are enabled unless SLRD_TYPE_CHECK=NOCHECK is set
+type_checker = TypeChecker(environ.get('SLRD_TYPE_CHECK', 'STRICT'))
+random_utils = RandomUtils()
+codec_registry = CodecRegistry()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Registry of structured data formats (codecs).
+
+Every format is resolved once, when the registry is created, instead of
+importing a parser module on every load. Available codecs:
+
+- yaml: user-facing format of keyfiles, linkfiles and templates; uses the
+  LibYAML based CSafeLoader/CSafeDumper when PyYAML was built with it and
+  falls back to pure-Python SafeLoader/SafeDumper otherwise;
+- json: standard library JSON;
+- binary: compact marshal-based serialization of built-in types for
+  ephemeral internal data (shared memory index, index snapshot cache). The
+  marshal format may change between Python versions and is unsafe for
+  untrusted input: never use it for persisted records (i.e. container
+  records) or for data crossing a trust boundary.
+
+Codecs share a tiny interface: loads(data) accepts str or bytes-like data and
+dumps(obj) returns str (text codecs) or bytes (self.binary is True).
+
+Classes:
+    - YAMLCodec
+    - JSONCodec
+    - BinaryCodec
+    - CodecRegistry
+"""
+import json
+import marshal
+try:
+    import yaml
+except ImportError:  # yaml codec is unavailable
+    yaml = None
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
+
+
+def _text(data):
+    """Get str or bytes out of bytes-like data (i.e. memoryview)."""
+    if isinstance(data, (str, bytes)):
+        return data
+    return bytes(data)
+
+
+class YAMLCodec(object):
+    """YAML codec (LibYAML accelerated when available)."""
+
+    name = 'yaml'
+    binary = False
+
+    def __init__(self):
+        """Resolve the fastest safe loader and dumper."""
+        self.Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        self.Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+        self.accelerated = self.Loader is not yaml.SafeLoader
+
+    def loads(self, data):
+        """Parse YAML (safe subset only: no arbitrary objects)."""
+        return yaml.load(_text(data), Loader=self.Loader)
+
+    def dumps(self, obj):
+        """Serialize obj to block-style YAML."""
+        return yaml.dump(obj, Dumper=self.Dumper, default_flow_style=False,
+                         allow_unicode=True)
+
+
+class JSONCodec(object):
+    """JSON codec."""
+
+    name = 'json'
+    binary = False
+
+    def loads(self, data):
+        """Parse JSON."""
+        return json.loads(_text(data))
+
+    def dumps(self, obj):
+        """Serialize obj to compact JSON."""
+        return json.dumps(obj, separators=(',', ':'), default=str)
+
+
+class BinaryCodec(object):
+    """Compact binary codec of built-in types (marshal).
+
+    Only for ephemeral data: marshal is not stable across Python versions.
+    """
+
+    name = 'binary'
+    binary = True
+
+    @classmethod
+    def plain(cls, obj):
+        """Convert obj to types marshal can serialize.
+
+        Parsed files may carry values marshal knows nothing about (i.e. YAML
+        timestamps); those are replaced with their string representation.
+        """
+        if isinstance(obj, dict):
+            return {cls.plain(k): cls.plain(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            return type(obj)(cls.plain(v) for v in obj)
+        if obj is None or isinstance(obj, (str, bytes, bool, int, float)):
+            return obj
+        return str(obj)
+
+    def loads(self, data):
+        """Deserialize data produced by self.dumps().
+
+        :raises: EOFError, ValueError, TypeError on malformed data
+        """
+        return marshal.loads(data)
+
+    def dumps(self, obj):
+        """Serialize obj (values of foreign types are stringified)."""
+        try:
+            return marshal.dumps(obj)
+        except ValueError:
+            return marshal.dumps(self.plain(obj))
+
+
+class CodecRegistry(object):
+    """Formats available for loading and dumping structured data."""
+
+    LOGSTR_REGISTERED = 'codec registered: %s, accelerated: %s'
+    LOGSTR_NO_YAML = 'PyYAML is not installed: yaml codec is unavailable'
+
+    ERRMSG_UNSUP_FORMAT = 'unsupported format: %s'
+
+    def __init__(self):
+        """Initialization method: register built-in codecs."""
+        self.logger = LazyLogger(__name__)
+        self.logger.debug(comlogstr.LOG_INIT_START)
+        self._codecs = {}
+        if yaml is not None:
+            self.register(YAMLCodec())
+        else:
+            self.logger.warning(self.LOGSTR_NO_YAML)
+        self.register(JSONCodec())
+        self.register(BinaryCodec())
+        self.logger.debug(comlogstr.LOG_INIT_END)
+
+    def register(self, codec, name=None):
+        """Register (or replace) a codec.
+
+        :param codec: object with loads(), dumps() and binary attribute
+        :param name:  format name; defaults to codec.name
+
+        :type codec: object
+        :type name:  str
+        """
+        name = name or codec.name
+        self._codecs[name] = codec
+        self.logger.debug(self.LOGSTR_REGISTERED, name,
+                          getattr(codec, 'accelerated', False))
+
+    def get(self, name):
+        """Get a codec of a format.
+
+        :param name: format name (i.e. yaml)
+        :type name:  str
+
+        :rtype: object
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        try:
+            return self._codecs[name]
+        except KeyError:
+            errmsg = self.ERRMSG_UNSUP_FORMAT % name
+            self.logger.critical(errmsg)
+            raise SLRDIllegalArgumentError(errmsg)
+
+    def formats(self):
+        """Get names of all registered formats.
+
+        :rtype: tuple
+        """
+        return tuple(self._codecs)
+
+    def __contains__(self, name):
+        """Check whether a format is registered."""
+        return name in self._codecs
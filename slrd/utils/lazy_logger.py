@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Logging facade used across the project.
+
+Log strings must never be formatted by a caller (self.LOGSTR_X % args): that
+costs the same whether a record is emitted or not. LazyLogger hands a format
+string and its arguments to the logging module as is, so that a level is
+checked first and formatting only happens once a record is actually emitted.
+
+Per-item events of bulk operations (i.e. every file read during a container
+scan) go to a separate hot path channel instead: a child logger named
+'<name>.hot' that only sees every n-th event and carries event fields as
+structured data (record.event, record.fields) for handlers that want them.
+
+Classes:
+    - LazyLogger
+"""
+from itertools import count
+import logging
+from os import environ
+
+
+LOGSTR_BAD_ENV = 'ignoring malformed %s=%r, using %i'
+
+
+def _env_int(name, default, minimum=1):
+    """Get a positive integer out of an environment variable.
+
+    A malformed value must not break an import of every module that logs, so
+    it's reported and a default is used instead.
+
+    :param name:    environment variable name
+    :param default: value to use if a variable is unset or malformed
+    :param minimum: smallest value allowed
+
+    :rtype: int
+    """
+    value = environ.get(name)
+    if value is None:
+        return default
+    try:
+        return max(int(value), minimum)
+    except ValueError:
+        logging.getLogger(__name__).warning(LOGSTR_BAD_ENV, name, value,
+                                            default)
+        return default
+
+
+class _Fields(object):
+    """Hot path event fields rendered only when a record is formatted."""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        """."""
+        self.fields = fields
+
+    def __str__(self):
+        """Render fields as space separated key=value pairs."""
+        return ' '.join('%s=%s' % item for item in sorted(self.fields.items()))
+
+
+class LazyLogger(object):
+    """Level-guarded logger with a sampled hot path channel."""
+
+    HOT_SUFFIX = 'hot'
+    HOT_FORMAT = '%s %s'
+    # every n-th hot path event is emitted; SLRD_LOG_HOT_SAMPLE overrides it
+    DEF_HOT_SAMPLE = _env_int('SLRD_LOG_HOT_SAMPLE', 100)
+
+    __slots__ = ('logger', 'hot_logger', 'hot_sample', '_hot_count',
+                 'debug', 'info', 'warning', 'error', 'critical',
+                 'exception')
+
+    def __init__(self, name, hot_sample=None):
+        """Initialization method.
+
+        :param name:       logger name (module __name__)
+        :param hot_sample: emit every n-th hot path event; defaults to
+                           self.DEF_HOT_SAMPLE
+
+        :type name:       str
+        :type hot_sample: int
+        """
+        self.logger = logging.getLogger(name)
+        self.hot_logger = self.logger.getChild(self.HOT_SUFFIX)
+        self.hot_sample = max(hot_sample or self.DEF_HOT_SAMPLE, 1)
+        self._hot_count = count()
+        # bound methods of a logger itself: no extra call per log line, a
+        # level is checked before a message is formatted
+        self.debug = self.logger.debug
+        self.info = self.logger.info
+        self.warning = self.logger.warning
+        self.error = self.logger.error
+        self.critical = self.logger.critical
+        self.exception = self.logger.exception
+
+    def enabled(self, level=logging.DEBUG):
+        """Check whether records of a level would be emitted.
+
+        Use it to guard computation of expensive log arguments.
+
+        :param level: logging level
+        :type level:  int
+
+        :rtype: bool
+        """
+        return self.logger.isEnabledFor(level)
+
+    def hot(self, event, **fields):
+        """Log a hot path event (sampled, DEBUG level).
+
+        :param event:  event name
+        :param fields: event data (not copied: pass immutable values)
+
+        :type event:  str
+        :type fields: dict
+        """
+        if not self.hot_logger.isEnabledFor(logging.DEBUG):
+            return
+        if next(self._hot_count) % self.hot_sample:
+            return
+        self.hot_logger.debug(self.HOT_FORMAT, event, _Fields(fields),
+                              extra={'event': event, 'fields': fields})
@@ -5,27 +5,102 @@
 This module provides various utility functions that utilize randomness: random
 string generator, random timestamp generator etc.
 
+All randomness comes from a system CSPRNG (secrets module and os.urandom()).
+
 Classes:
     - RandomUtils
 
 Todo:
     - finish docstrings
-    - implement methods
 """
-import logging
+from datetime import datetime, timedelta
+from os import urandom
+from secrets import SystemRandom, randbelow, token_hex
+from slrd.utils.lazy_logger import LazyLogger
 
 
 class RandomUtils(object):
     """Randomness-related utility functions."""
 
+    # default span of random timestamps (back from now)
+    DEF_DATETIME_SPAN = timedelta(days=365)
+
     def __init__(self):
         """."""
-        self.logger = logging.getLogger(__name__)
+        self.logger = LazyLogger(__name__)
         self.logger.debug("initialization started")
+        self._random = SystemRandom()
         self.logger.debug("initialization finished")
 
     def get_random_string(self, length):
-        """."""
+        """Get a random string of hex digits.
 
-    def get_random_datetime(self, formt, lbound=None, rbound=None):
-        """."""
+        :param length: length of a string
+        :type length:  int
+
+        :return: random string
+        :rtype:  str
+        """
+        return token_hex((length + 1) // 2)[:length]
+
+    def get_random_bytes(self, length):
+        """Get random bytes in a single draw.
+
+        :param length: amount of bytes
+        :type length:  int
+
+        :return: random bytes
+        :rtype:  bytes
+        """
+        return urandom(length)
+
+    def get_random_datetime(self, formt=None, lbound=None, rbound=None):
+        """Get a random timestamp in [lbound, rbound).
+
+        :param formt:  strftime() format to return a timestamp in; datetime
+                       object is returned if not passed
+        :param lbound: lower bound; defaults to rbound - DEF_DATETIME_SPAN
+        :param rbound: upper bound; defaults to now
+
+        :type formt:  str
+        :type lbound: datetime.datetime
+        :type rbound: datetime.datetime
+
+        :return: random timestamp (second precision)
+        :rtype:  datetime.datetime or str
+        """
+        rbound = rbound or datetime.today()
+        lbound = lbound or rbound - self.DEF_DATETIME_SPAN
+        span = max(int((rbound - lbound).total_seconds()), 1)
+        timestamp = lbound.replace(microsecond=0) + \
+            timedelta(seconds=randbelow(span))
+        return timestamp.strftime(formt) if formt else timestamp
+
+    def get_random_sample(self, population, k):
+        """Get k unique random elements of a population.
+
+        :param population: sequence or set to sample from
+        :param k:          sample size (capped at a population size)
+
+        :type population: collections.abc.Collection
+        :type k:          int
+
+        :return: random sample
+        :rtype:  list
+        """
+        if not isinstance(population, (list, tuple, range, str)):
+            population = list(population)
+        return self._random.sample(population, min(k, len(population)))
+
+    def get_random_delay(self, mean):
+        """Get a random delay in [mean / 2, mean * 3 / 2).
+
+        Periodic background jobs sleep for random delays so that their
+        activity doesn't form a recognizable pattern.
+
+        :param mean: mean delay in seconds
+        :type mean:  float
+
+        :rtype: float
+        """
+        return mean * (0.5 + self._random.random())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Token bucket rate limiter.
+
+A bucket is refilled at a constant rate (i.e. bytes per second) up to its
+burst size. Background jobs take tokens before doing work and back off when
+a bucket is empty, so their I/O stays within a budget. A job that can't know
+the exact cost in advance may consume() more than there is: a bucket goes
+into debt and following attempts wait until the debt is paid off, which keeps
+the long-term rate within the budget.
+
+Classes:
+    - TokenBucket
+"""
+from threading import Lock
+from time import monotonic
+from slrd.exceptions import SLRDIllegalArgumentError
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket."""
+
+    __slots__ = ('rate', 'burst', '_tokens', '_stamp', '_clock', '_lock')
+
+    ERRMSG_BAD_RATE = 'rate and burst should be positive: %s, %s'
+
+    def __init__(self, rate, burst=None, clock=monotonic):
+        """Initialization method.
+
+        A bucket starts full.
+
+        :param rate:  tokens added per second
+        :param burst: bucket capacity (one second worth of tokens by default)
+        :param clock: function returning current time in seconds
+
+        :type rate:  float
+        :type burst: float
+        :type clock: function
+
+        :raise: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        burst = rate if burst is None else burst
+        if rate <= 0 or burst <= 0:
+            raise SLRDIllegalArgumentError(self.ERRMSG_BAD_RATE %
+                                           (rate, burst))
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._clock = clock
+        self._stamp = clock()
+        self._lock = Lock()
+
+    def __refill(self):
+        """Add tokens accumulated since the last call (lock is held)."""
+        now = self._clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def available(self):
+        """Get amount of tokens in a bucket (negative while in debt).
+
+        :rtype: float
+        """
+        with self._lock:
+            self.__refill()
+            return self._tokens
+
+    def try_consume(self, amount):
+        """Take tokens if there are enough of them.
+
+        :param amount: tokens to take
+        :type amount:  float
+
+        :return: whether tokens were taken
+        :rtype:  bool
+        """
+        with self._lock:
+            self.__refill()
+            if self._tokens < amount:
+                return False
+            self._tokens -= amount
+            return True
+
+    def consume(self, amount):
+        """Take tokens unconditionally (a bucket may go into debt).
+
+        :param amount: tokens to take
+        :type amount:  float
+        """
+        with self._lock:
+            self.__refill()
+            self._tokens -= amount
+
+    def delay(self, amount):
+        """Get seconds to wait until amount of tokens is available.
+
+        :param amount: tokens needed (at most self.burst)
+        :type amount:  float
+
+        :rtype: float
+        """
+        with self._lock:
+            self.__refill()
+            return max(0.0, (min(amount, self.burst) - self._tokens) /
+                       self.rate)
@@ -3,26 +3,42 @@
 """Utility module that provides a type check functionality.
 
 Prefered way of using it: create a singletone instance in a root __init__.py of
-a project; import in each module where type check is needed and then call it
-any function/method like that:
+a project; import in each module where type check is needed and decorate
+functions/methods with declared types of their parameters:
 
 ```
-import slrd.typechecker as tc  # instantized in __init__.py
+from slrd.utils import type_checker as tc  # instantized in __init__.py
 
+    @tc.accepts(arg1=str, arg2=str, arg3=int)
+    def func(arg1, arg2, arg3=None):
+        ...
+```
+
+Declared types are resolved against a function signature once, when the
+function is defined, and turned into a tuple of precompiled checks run on each
+call. A parameter with None as a default value accepts None as well. In
+NOCHECK mode the decorator returns a function untouched so disabled checks
+cost nothing. Note that a mode has to be set before decorated modules are
+imported (see SLRD_TYPE_CHECK environment variable in slrd.utils).
+
+To check whether an argument is a function pass `callable` as a type.
+
+An older call-time form is supported as well:
+
+```
     def func(arg1, arg2, arg3):
         # make sure it's the first call
         tc.check_types(str, str, int, arg1, arg2, arg3)
 ```
 
-To check whether an argument ins a function pass `callable` as a type.
-
 Todo:
     -
 """
-from inspect import isfunction, isbuiltin
-import logging
+from functools import wraps
+from inspect import isfunction, isbuiltin, signature, Parameter
 from slrd.exceptions import SLRDIllegalArgumentError
 from slrd.strings import comlogstr
+from slrd.utils.lazy_logger import LazyLogger
 
 
 class TypeChecker(object):
@@ -34,11 +50,10 @@ class TypeChecker(object):
             ]
 
     LOGSTR_MODESET = 'mode set: %s'
-    LOGSTR_TC_CALLED = 'performing type check [mode: %s]'
-    LOGSTR_TC_SKIP = 'skipping type check [mode: %s]'
     ERRSTR_UNSUP_MODE = 'unsupported mode: %s'
     ERRSTR_TCLEN_ODD = 'amount of input parameters have to be even: got %i'
     ERRSTR_CHECK_FAIL = 'type check failed for: %s is %s'
+    ERRSTR_NO_PARAM = 'can\'t check types of %s: no parameter %s'
 
     def __init__(self, mode='STRICT'):
         """Initialization method.
@@ -49,7 +64,7 @@ class TypeChecker(object):
 
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
         """
-        self.logger = logging.getLogger(__name__)
+        self.logger = LazyLogger(__name__)
         self.logger.debug(comlogstr.LOG_INIT_START)
         self.mode = 0  # default to STRICT mode
         self.set_mode(mode)
@@ -71,7 +86,80 @@ class TypeChecker(object):
             errstr = self.ERRSTR_UNSUP_MODE % str(mode)
             self.logger.critical(errstr)
             raise SLRDIllegalArgumentError(errstr)
-        self.logger.info(self.LOGSTR_MODESET % mode)
+        self.logger.info(self.LOGSTR_MODESET, mode)
+
+    @staticmethod
+    def _compile_check(ttype):
+        """Get a predicate that checks an argument against a type.
+
+        :param ttype: type (or tuple of types) or `callable`
+        :type ttype:  type
+
+        :return: predicate
+        :rtype:  function
+        """
+        if ttype is callable:
+            return lambda arg: isfunction(arg) or isbuiltin(arg)
+        return lambda arg: isinstance(arg, ttype)
+
+    def __fail(self, arg, ttype):
+        """Log and raise a type check failure.
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+        """
+        errmsg = self.ERRSTR_CHECK_FAIL % (str(arg), str(ttype))
+        self.logger.critical(errmsg)
+        raise SLRDIllegalArgumentError(errmsg)
+
+    def accepts(self, **types):
+        """Decorate a function to check types of its arguments.
+
+        :param types: {parameter name: type} to check arguments against;
+                      `callable` checks an argument is a function
+        :type types:  dict
+
+        :return: decorator
+        :rtype:  function
+
+        :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
+                 (at definition time if a parameter do not exist)
+        """
+        def decorator(func):
+            if self.mode != 0:
+                return func
+            params = signature(func).parameters
+            names = list(params)
+            checks = []
+            for name, ttype in types.items():
+                param = params.get(name)
+                if param is None:
+                    errmsg = self.ERRSTR_NO_PARAM % (func.__qualname__, name)
+                    self.logger.critical(errmsg)
+                    raise SLRDIllegalArgumentError(errmsg)
+                pos = None
+                if param.kind in (Parameter.POSITIONAL_ONLY,
+                                  Parameter.POSITIONAL_OR_KEYWORD):
+                    pos = names.index(name)
+                checks.append((pos, name, self._compile_check(ttype),
+                               param.default is None, ttype))
+            checks = tuple(checks)
+            fail = self.__fail
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                nargs = len(args)
+                for pos, name, check, nullable, ttype in checks:
+                    if pos is not None and pos < nargs:
+                        arg = args[pos]
+                    elif name in kwargs:
+                        arg = kwargs[name]
+                    else:
+                        continue  # default value is used
+                    if not check(arg) and not (nullable and arg is None):
+                        fail(arg, ttype)
+                return func(*args, **kwargs)
+            return wrapper
+        return decorator
 
     def check_types(self, *args):
         """Check types of input arguments.
@@ -81,42 +169,37 @@ class TypeChecker(object):
         respective pairs (i, n/2 + i), where n - even number of input passed to
         this function, i in [0, n/2).
 
-        An exception will be raised if at least one check has failed.z
+        An exception will be raised if at least one check has failed.
 
-        Instead of type a callable object (i.e. function) can be passed that
-        should return bool value when called on a corresponding argument. If
-        returned value is truthy check is considered to be passed.
-
-        For example, type check for a function should look like this:
+        Instead of type a `callable` can be passed to check an argument is a
+        function:
 
         ```
-        check_types(open, callable)  # cause callable(<func>) will return True
+        check_types(callable, open)
         ```
 
+        Prefer self.accepts() decorator: it does not re-resolve types on each
+        call and is free in NOCHECK mode.
+
         :raises: slrd.exceptions.common_exceptions.SLRDIllegalArgumentError
         """
-        if self.mode == 0:
-            self.logger.info(
-                    self.LOGSTR_TC_CALLED % self.mode_verb)
-            args_len = len(args)
-            if args_len % 2 != 0:
-                errmsg = self.ERRSTR_TCLEN_ODD % args_len
-                self.logger.critical(errmsg)
-                raise SLRDIllegalArgumentError(errmsg)
-            half_args = args_len // 2
-            for i in range(half_args):
-                arg = args[half_args + i]
-                ttype = args[i]
-                try:
-                    if ttype.__name__ == 'callable':
-                        check_res = isfunction(arg) or isbuiltin(arg)
-                    else:
-                        check_res = isinstance(arg, ttype)
-                    if not check_res:
-                        raise Exception()
-                except Exception:
-                    errmsg = self.ERRSTR_CHECK_FAIL % (str(arg), str(ttype))
-                    self.logger.critical(errmsg)
-                    raise SLRDIllegalArgumentError(errmsg)
+        if self.mode != 0:
             return
-        self.logger.debug(self.LOGSTR_TC_SKIP % self.mode_verb)
+        args_len = len(args)
+        if args_len % 2 != 0:
+            errmsg = self.ERRSTR_TCLEN_ODD % args_len
+            self.logger.critical(errmsg)
+            raise SLRDIllegalArgumentError(errmsg)
+        half_args = args_len // 2
+        for i in range(half_args):
+            arg = args[half_args + i]
+            ttype = args[i]
+            try:
+                if ttype is callable:
+                    check_res = isfunction(arg) or isbuiltin(arg)
+                else:
+                    check_res = isinstance(arg, ttype)
+            except TypeError:
+                check_res = False
+            if not check_res:
+                self.__fail(arg, ttype)
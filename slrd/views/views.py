@@ -1,7 +1,144 @@
-from slrd import slrd
-from flask import render_template
+"""Request handlers.
+
+Handlers only read the shared in-memory index of a process (see
+slrd.managers.backend_manager). Index reads may block (mapped pages are read
+from disk on first access, a new process waits for a first published index),
+so they are handed to a bounded executor through backend.executors: a burst
+of requests is turned away with HTTP 503 instead of exhausting server
+threads.
+
+Values of secret keys (see LinkType.SECRET_KEYS) are never returned.
+"""
+from flask import jsonify, render_template, request
+from slrd import backend, slrd
+from slrd.exceptions import SLRDExecutorBusyError
+from slrd.exceptions import SLRDTemplateValidationError
+from slrd.managers.executor_manager import ExecutorManager
+
+# seconds a client is asked to wait when executors are saturated
+RETRY_AFTER = 1
+# timeline page size: default and maximum
+TIMELINE_LIMIT = 50
+TIMELINE_MAX_LIMIT = 500
+# search results: default and maximum amount
+SEARCH_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+
+@slrd.errorhandler(SLRDExecutorBusyError)
+def busy(e):
+    response = jsonify(error=str(e))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
+
+
+def run(func, *args):
+    """Call func(*args) in an IO executor and wait for a result.
+
+    :raises: slrd.exceptions.manager_exceptions.SLRDExecutorBusyError or
+             anything a call raises
+    """
+    return backend.executors.run(ExecutorManager.IO, func, *args)
 
 
 @slrd.route('/')
 def index():
     return render_template('index.html')
+
+
+@slrd.route('/api/sites')
+def sites():
+    return jsonify(sites=run(lambda: list(backend.index.sites())))
+
+
+@slrd.route('/api/keys/<key>')
+def values(key):
+    return jsonify(values=run(lambda: list(backend.index.values(key))))
+
+
+@slrd.route('/api/keys/<key>/<value>')
+def lookup(key, value):
+    return jsonify(ids=run(lambda: list(backend.index.lookup(key, value))))
+
+
+@slrd.route('/api/linkfiles/<lid>')
+def linkfile(lid):
+    link = run(lambda: backend.index.get_linkfile(lid))
+    if link is None:
+        return jsonify(error='no such linkfile'), 404
+    return jsonify(link.to_dict(secrets=False))
+
+
+@slrd.route('/api/timeline')
+def timeline():
+    """Get a page of registrations ordered by time (newest first).
+
+    Query parameters: start, end (UNIX timestamps), site, template, limit,
+    cursor (returned as next by a previous page) and order (asc or desc).
+    """
+    args = request.args
+    try:
+        # args.get(type=int) would quietly fall back to a default
+        start, end = [int(args[name]) if name in args else None
+                      for name in ('start', 'end')]
+        limit = min(int(args.get('limit', TIMELINE_LIMIT)),
+                    TIMELINE_MAX_LIMIT)
+        cursor = args.get('cursor')
+        if cursor is not None:
+            stamp, lid = cursor.split(':', 1)
+            cursor = (int(stamp), lid)
+        if args.get('order', 'desc') not in ('asc', 'desc'):
+            raise ValueError(args['order'])
+    except ValueError:
+        return jsonify(error='malformed timeline query'), 400
+    items, cursor = run(lambda: backend.index.timeline(
+            start, end, args.get('site'), args.get('template'), limit, cursor,
+            reverse=args.get('order', 'desc') == 'desc'))
+    return jsonify(items=[{'id': lid, 'created_on': stamp}
+                          for lid, stamp in items],
+                   next=None if cursor is None else '%i:%s' % cursor)
+
+
+@slrd.route('/api/search')
+def search():
+    """Find sites and templates by a (partial) query typed by a user.
+
+    Query parameters: q (query) and limit. Results are ranked: an exact
+    match, prefixes of whole names, prefixes of name parts and then similar
+    names (typos).
+    """
+    try:
+        limit = int(request.args.get('limit', SEARCH_LIMIT))
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify(error='malformed search query'), 400
+    query = request.args.get('q', '')  # request is bound to this thread
+    results = run(lambda: backend.index.search(
+            query, min(limit, SEARCH_MAX_LIMIT)))
+    return jsonify(results=[{'term': term, 'kind': kind, 'ref': ref,
+                             'score': round(score, 3)}
+                            for term, kind, ref, score in results])
+
+
+@slrd.route('/api/templates/<name>/validate', methods=['POST'])
+def validate(name):
+    """Check keys (a JSON object) against a template before registering."""
+    keys = request.get_json(silent=True)
+    if not isinstance(keys, dict):
+        return jsonify(error='keys object expected'), 400
+
+    def check():
+        """Get validation errors (None if there is no such template)."""
+        if backend.index.get_template(name) is None:
+            return None
+        return backend.validators.validator(name).errors(keys)
+
+    try:
+        errors = run(check)
+    except SLRDTemplateValidationError as e:  # malformed rules
+        return jsonify(error=str(e)), 422
+    if errors is None:
+        return jsonify(error='no such template'), 404
+    return jsonify(errors=errors)
@@ -2,7 +2,7 @@
 #
 ##################################################################
 # title:      start.sh                                           #
-# descrption: Start a development version of SLRD backend server #
+# descrption: Start SLRD backend server                          #
 # usage:      start.sh -h                                        #
 # developer:  ddnomad                                            #
 # version:    0.0.1                                              #
@@ -15,6 +15,21 @@ readonly COLOR_RESET='\e[39m'
 
 # TODO: add support for CLI options (-h etc.)
 
+# SLRD_GPG_KEY (and SLRD_GPG_HOME): a key to encrypt an index snapshot with,
+# so that a server restores its index instead of parsing every file on start
+# worker processes map a single index published by one of them; threads of
+# a worker share it
+# the API serves plain text of linkfiles: only listen on loopback by default
+readonly SLRD_BIND="${SLRD_BIND:-127.0.0.1:8080}"
+readonly SLRD_WORKERS="${SLRD_WORKERS:-2}"
+readonly SLRD_THREADS="${SLRD_THREADS:-16}"
+
 echo -e "${COLOR_INFO}[i] Running setup${COLOR_RESET}"
-echo -e "${COLOR_INFO}[i] Starting Flask${COLOR_RESET}"
-nocache python3 ./server.py
+if [[ "${SLRD_DEBUG}" = '1' ]]; then
+    echo -e "${COLOR_INFO}[i] Starting Flask${COLOR_RESET}"
+    nocache python3 ./server.py
+else
+    echo -e "${COLOR_INFO}[i] Starting gunicorn${COLOR_RESET}"
+    nocache gunicorn --worker-class gthread --workers "${SLRD_WORKERS}" \
+        --threads "${SLRD_THREADS}" --bind "${SLRD_BIND}" slrd:slrd
+fi
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Base class of tests which need GPG keys.
+
+Classes:
+    - GPGTestCase
+"""
+from tempfile import TemporaryDirectory
+import unittest
+import gnupg
+from slrd.controllers.gpg_controller import GPGController
+
+
+class GPGTestCase(unittest.TestCase):
+    """Test case with GPG keys generated in a temporary GPG home.
+
+    A key is generated for every address in EMAILS (key IDs are kept in
+    cls.key_ids, the first one in cls.key_id); cls.gpgctrl is a controller
+    of the first key.
+    """
+
+    EMAILS = ('test@slrd.local',)
+    PT_LENGTH = 1000
+    WORKERS = None
+
+    @classmethod
+    def setUpClass(cls):
+        """Generate GPG keys in a temporary GPG home."""
+        cls.gpg_home = TemporaryDirectory()
+        cls.gpg = gnupg.GPG(gnupghome=cls.gpg_home.name)
+        cls.key_ids = [cls.gpg.gen_key(cls.gpg.gen_key_input(
+            key_type='RSA', key_length=1024, name_email=email,
+            no_protection=True)).fingerprint for email in cls.EMAILS]
+        cls.key_id = cls.key_ids[0]
+        cls.gpgctrl = cls.controller(workers=cls.WORKERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop workers and remove a temporary GPG home."""
+        cls.gpgctrl.close()
+        cls.gpg_home.cleanup()
+
+    @classmethod
+    def controller(cls, key_id=None, workers=None):
+        """Get a fresh controller of a key (the first one by default)."""
+        return GPGController(key_id or cls.key_id, cls.gpg_home.name,
+                             cls.PT_LENGTH, workers)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.backend_manager module."""
+from os import makedirs, unlink
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from threading import Event
+import unittest
+from unittest import mock
+import slrd
+from slrd.managers.backend_manager import BackendManager
+from slrd.managers.executor_manager import ExecutorManager
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.shared_index_manager import SharedIndexManager
+from slrd.managers.snapshot_manager import SnapshotManager
+
+
+class FakeGPGController(object):
+    """Store blobs as they are."""
+
+    max_data_len = 4096  # of containers (there are none here)
+
+    def encrypt_blob(self, data):
+        """Pretend to encrypt data."""
+        return data.hex()
+
+    def decrypt_blob(self, data):
+        """Pretend to decrypt data."""
+        return bytes.fromhex(data)
+
+
+class TestBackendManager(unittest.TestCase):
+    """Test slrd.managers.backend_manager module."""
+
+    def setUp(self):
+        """Create a base directory with a single keyfile."""
+        self.tmpdir = TemporaryDirectory()
+        kdir = join(self.tmpdir.name, IndexManager.KEYFILE_DIR)
+        makedirs(kdir)
+        with open(join(kdir, 'sites'), 'w') as f:
+            f.write('sites: {fb.com: [id1]}')
+        tdir = join(self.tmpdir.name, IndexManager.TEMPLATE_DIR)
+        makedirs(tdir)
+        with open(join(tdir, 'fb'), 'w') as f:
+            f.write('name: fb\nkeys: [first_name, {email: {format: email}}]')
+        ldir = join(self.tmpdir.name, IndexManager.LINKFILE_DIR)
+        makedirs(ldir)
+        with open(join(ldir, 'id2'), 'w') as f:
+            f.write('id: id2\nkeys: {email: j@x.de, password: pw}')
+        self.runtime = TemporaryDirectory()
+        patcher = mock.patch.object(SharedIndexManager, 'RUNTIME_DIRS',
+                                    (self.runtime.name,))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = BackendManager(self.tmpdir.name, watch=False)
+
+    def tearDown(self):
+        """Stop a backend and remove temporary directories."""
+        self.backend.shutdown()
+        self.runtime.cleanup()
+        self.tmpdir.cleanup()
+
+    def test_per_process(self):
+        """Test state is created once per process and an index is shared."""
+        index, executors = self.backend.index, self.backend.executors
+        self.assertIs(self.backend.index, index)
+        self.assertEqual(index.sites(), ('fb.com',))
+        writer = self.backend._shared
+        with mock.patch('slrd.managers.backend_manager.getpid',
+                        return_value=-1):
+            # another process maps a published index instead of building one
+            other = self.backend.index
+            self.assertIsNot(other, index)
+            self.assertEqual(other.generation, index.generation)
+            self.assertFalse(self.backend._shared.is_writer)
+            self.backend.shutdown()
+        writer.release_writer()
+        executors.shutdown()
+
+    def test_local_fallback(self):
+        """Test a process-local index is used if a shared one is unusable."""
+        self.assertEqual(self.backend.index.sites(), ('fb.com',))
+        writer = self.backend._shared
+        unlink(writer.path)  # a mapped file must not be truncated
+        with open(writer.path, 'wb') as f:
+            f.write(b'garbage')
+        with mock.patch('slrd.managers.backend_manager.getpid',
+                        return_value=-1):
+            local = self.backend.index
+            self.assertIsInstance(local, IndexManager)
+            self.assertEqual(local.sites(), ('fb.com',))
+            self.assertIs(self.backend.index, local)
+            self.backend.shutdown()
+        writer.release_writer()
+        with mock.patch.object(SharedIndexManager, 'RUNTIME_DIRS', ()):
+            backend = BackendManager(self.tmpdir.name, watch=False)
+            self.assertIsInstance(backend.index, IndexManager)
+            self.assertEqual(backend.index.sites(), ('fb.com',))
+            backend.shutdown()
+
+    def test_snapshot(self):
+        """Test a writer starts from an index snapshot if it can."""
+        self.backend.shutdown()
+        backend = BackendManager(self.tmpdir.name, watch=False,
+                                 gpgctrl=FakeGPGController())
+        self.assertEqual(backend.index.sites(), ('fb.com',))
+        backend.shutdown()
+        path = join(self.tmpdir.name, SnapshotManager.SNAPSHOT_NAME)
+        self.assertTrue(exists(path))
+        with mock.patch.object(IndexManager, 'load') as load:
+            self.assertEqual(backend.index.sites(), ('fb.com',))
+            load.assert_not_called()
+        backend.shutdown()
+
+    def test_views(self):
+        """Test views are served from a shared index."""
+        client = slrd.slrd.test_client()
+        with mock.patch('slrd.views.views.backend', self.backend):
+            self.assertEqual(client.get('/api/sites').get_json(),
+                             {'sites': ['fb.com']})
+            self.assertEqual(client.get('/api/keys/sites/fb.com').get_json(),
+                             {'ids': ['id1']})
+            self.assertEqual(client.get('/api/linkfiles/id1').status_code,
+                             404)
+            self.assertEqual(client.get('/api/linkfiles/id2').get_json(),
+                             {'id': 'id2', 'keys': {'email': 'j@x.de'}})
+            self.assertEqual(client.get('/api/timeline').get_json(),
+                             {'items': [], 'next': None})
+            self.assertEqual(
+                    client.get('/api/timeline?cursor=x').status_code, 400)
+            self.assertEqual(
+                    client.get('/api/timeline?start=abc').status_code, 400)
+            self.assertEqual(
+                    client.get('/api/search?q=fb').get_json()['results'],
+                    [{'term': 'fb.com', 'kind': 'site', 'ref': 'fb.com',
+                      'score': 2.0}])
+            self.assertEqual(
+                    client.get('/api/search?q=f&limit=0').status_code, 400)
+            self.assertEqual(
+                    client.get('/api/search?q=f&limit=x').status_code, 400)
+            response = client.post('/api/templates/fb/validate',
+                                   json={'first_name': 'John', 'email': 'x'})
+            self.assertEqual(response.get_json(),
+                             {'errors': ['key email: not a valid email']})
+            self.assertEqual(client.post('/api/templates/no/validate',
+                                         json={}).status_code, 404)
+            self.assertEqual(client.post('/api/templates/fb/validate',
+                                         json=[]).status_code, 400)
+
+    def test_busy(self):
+        """Test requests are turned away while executors are saturated."""
+        self.backend.shutdown()
+        backend = BackendManager(self.tmpdir.name, watch=False,
+                                 io_workers=1, queue_factor=1)
+        self.addCleanup(backend.shutdown)
+        release = Event()
+        self.addCleanup(release.set)
+        backend.executors.submit(ExecutorManager.IO, release.wait)
+        client = slrd.slrd.test_client()
+        with mock.patch('slrd.views.views.backend', backend):
+            response = client.get('/api/sites')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
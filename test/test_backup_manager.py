@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.backup_manager module."""
+from os import listdir, makedirs, stat
+from os.path import exists, join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.exceptions import SLRDBackupError, SLRDFSCtrlWriteException
+from slrd.managers.backup_manager import BackupManager
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.snapshot_manager import SnapshotManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestBackupManager(GPGTestCase):
+    """Test slrd.managers.backup_manager module."""
+
+    PT_LENGTH = 512
+
+    def setUp(self):
+        """Populate a base directory with containers and keyfiles."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = join(self.tmpdir.name, 'base')
+        containers = ContainerManager(self.base_dir, self.gpgctrl)
+        for i in range(5):
+            containers.put('id%i' % i, b'linkfile %i' % i)
+        containers.flush()
+        self.files = {'keyfiles/sites': b'sites: {fb.com: [id1]}\n',
+                      'keyfiles/empty': b'',
+                      'templates/fb': b'name: fb\nkeys: [email]\n',
+                      SnapshotManager.SNAPSHOT_NAME: b'derived',
+                      '.git/HEAD': b'ref: refs/heads/master\n'}
+        for name, content in self.files.items():
+            makedirs(join(self.base_dir, name.rpartition('/')[0]),
+                     exist_ok=True)
+            with open(join(self.base_dir, name), 'wb') as f:
+                f.write(content)
+        self.containers = sorted(listdir(containers.container_dir))
+        self.backups = BackupManager(self.base_dir, self.gpgctrl)
+
+    def tearDown(self):
+        """Remove temporary directories."""
+        self.tmpdir.cleanup()
+
+    def read(self, *path):
+        """Read a file."""
+        with open(join(*path), 'rb') as f:
+            return f.read()
+
+    def test_roundtrip(self):
+        """Test an archive is encrypted and restores a base directory."""
+        archive = join(self.tmpdir.name, 'backup.slrd')
+        reports = []
+        stats = self.backups.backup(archive, reports.append)
+        self.assertEqual(stats['files'], len(self.containers) + 3)
+        self.assertEqual(len(reports), stats['files'])
+        self.assertEqual(reports[-1]['bytes'], reports[-1]['total_bytes'])
+        self.assertEqual(stats['size'], stat(archive).st_size)
+        self.assertEqual(stat(archive).st_mode & 0o777, 0o600)
+        self.assertNotIn(b'sites:', self.read(archive))
+        with self.assertRaises(SLRDFSCtrlWriteException):
+            self.backups.backup(archive)
+
+        target = join(self.tmpdir.name, 'restored')
+        stats = self.backups.restore(archive, target)
+        self.assertEqual(stats['files'], len(self.containers) + 3)
+        for name in ('keyfiles/sites', 'keyfiles/empty', 'templates/fb'):
+            self.assertEqual(self.read(target, name), self.files[name])
+        self.assertFalse(exists(join(target, '.git')))
+        self.assertFalse(exists(join(target, SnapshotManager.SNAPSHOT_NAME)))
+        for name in self.containers:
+            self.assertEqual(
+                self.read(target, ContainerManager.CONTAINER_DIR, name),
+                self.read(self.base_dir, ContainerManager.CONTAINER_DIR,
+                          name))
+        restored = ContainerManager(target, self.gpgctrl)
+        restored.load()
+        self.assertEqual(restored.get('id3'), b'linkfile 3')
+        with self.assertRaises(SLRDBackupError):
+            self.backups.restore(archive, target)
+
+    def test_abort(self):
+        """Test a failed backup leaves no archive behind."""
+        archive = join(self.base_dir, 'backup.slrd')
+
+        def abort(stats):
+            if stats['files'] == 2:
+                raise KeyboardInterrupt()
+
+        with self.assertRaises(SLRDBackupError):
+            self.backups.backup(archive, abort)
+        self.assertEqual(listdir(self.base_dir).count('backup.slrd'), 0)
+        self.assertEqual([n for n in listdir(self.base_dir)
+                          if n.endswith('.tmp')], [])
+        # an archive inside of a base directory doesn't back up itself
+        self.backups.backup(archive)
+        stats = self.backups.backup(archive, force=True)
+        self.assertEqual(stats['files'], len(self.containers) + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.cache_manager module."""
+from time import sleep
+import unittest
+from slrd.managers.cache_manager import CacheManager
+
+
+class FakeGPGController(object):
+    """Decrypt by reversing a string; count calls."""
+
+    def __init__(self):
+        """Initialization method."""
+        self.calls = 0
+
+    def decrypt(self, data):
+        """Pretend to decrypt data."""
+        self.calls += 1
+        return data[::-1].encode()
+
+
+class TestCacheManager(unittest.TestCase):
+    """Test slrd.managers.cache_manager module."""
+
+    def setUp(self):
+        """Create a cache with a tiny byte budget."""
+        self.gpgctrl = FakeGPGController()
+        self.cache = CacheManager(self.gpgctrl, max_bytes=10)
+
+    def test_hit(self):
+        """Test repeated reads do not call decrypt."""
+        self.assertEqual(bytes(self.cache.decrypt('c1', 'abc')), b'cba')
+        self.assertEqual(bytes(self.cache.decrypt('c1', 'abc')), b'cba')
+        self.assertEqual(self.gpgctrl.calls, 1)
+        self.assertEqual((self.cache.hits, self.cache.size), (1, 3))
+        # rewritten container is never served stale
+        self.assertEqual(bytes(self.cache.decrypt('c1', 'xyz')), b'zyx')
+        self.assertEqual((self.gpgctrl.calls, self.cache.size), (2, 3))
+
+    def test_lru(self):
+        """Test least recently used entries are evicted over budget."""
+        self.cache.decrypt('c1', 'aaaa')
+        self.cache.decrypt('c2', 'bbbb')
+        self.cache.decrypt('c1', 'aaaa')
+        self.cache.decrypt('c3', 'cccc')
+        digest = self.cache.digest
+        self.assertIsNone(self.cache.get('c2', digest('bbbb')))
+        self.assertIsNotNone(self.cache.get('c1', digest('aaaa')))
+        self.assertLessEqual(self.cache.size, 10)
+        # larger than the whole budget: served but not cached
+        self.assertEqual(bytes(self.cache.decrypt('c4', 'x' * 11)), b'x' * 11)
+        self.assertIsNone(self.cache.get('c4', digest('x' * 11)))
+
+    def tearDown(self):
+        """Stop an expiry thread."""
+        self.cache.close()
+
+    def test_ttl(self):
+        """Test idle entries expire."""
+        cache = CacheManager(self.gpgctrl, ttl=0.01, expire_interval=60)
+        self.addCleanup(cache.close)
+        cache.decrypt('c1', 'abc')
+        sleep(0.02)
+        self.assertIsNone(cache.get('c1', cache.digest('abc')))
+        self.assertEqual(cache.size, 0)
+
+    def test_expiry_thread(self):
+        """Test idle entries expire without being accessed."""
+        cache = CacheManager(self.gpgctrl, ttl=0.01)
+        self.addCleanup(cache.close)
+        cache.decrypt('c1', 'abc')
+        self.assertIsNotNone(cache._thread)
+        for _ in range(100):
+            if cache._thread is None:
+                break
+            sleep(0.01)
+        self.assertEqual((cache.size, cache._thread), (0, None))
+        cache.decrypt('c1', 'abc')
+        self.assertIsNotNone(cache._thread)
+
+    def test_lock(self):
+        """Test locking wipes cached buffers but not copies handed out."""
+        plain = self.cache.decrypt('c1', 'abc')
+        cached = self.cache.get('c1', self.cache.digest('abc'))
+        buf, = [entry.buf for entry in self.cache._entries.values()]
+        self.cache.lock()
+        self.assertEqual(bytes(buf), b'\0\0\0')
+        self.assertEqual((plain, cached), (b'cba', b'cba'))
+        self.assertEqual(self.cache.size, 0)
+        self.cache.decrypt('c1', 'abc')
+        self.assertEqual(self.gpgctrl.calls, 2)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.utils.codec_registry module."""
+from datetime import date
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.utils import codec_registry
+
+
+class TestCodecRegistry(unittest.TestCase):
+    """Test slrd.utils.codec_registry module."""
+
+    DATA = {'id': 'id1', 'sites': ['fb.com', 'ggl.com'], 'n': 3,
+            'nested': {'ok': True, 'none': None}}
+
+    def test_roundtrip(self):
+        """Test every built-in codec loads what it dumps."""
+        for name in ('yaml', 'json', 'binary'):
+            with self.subTest(codec=name):
+                codec = codec_registry.get(name)
+                dumped = codec.dumps(self.DATA)
+                self.assertIsInstance(dumped, bytes if codec.binary else str)
+                self.assertEqual(codec.loads(dumped), self.DATA)
+                if not codec.binary:
+                    raw = memoryview(dumped.encode())
+                    self.assertEqual(codec.loads(raw), self.DATA)
+
+    def test_yaml_safe(self):
+        """Test YAML is parsed safely and timestamps are binary-dumpable."""
+        yaml = codec_registry.get('yaml')
+        with self.assertRaises(Exception):
+            yaml.loads('!!python/object/apply:os.system ["true"]')
+        parsed = yaml.loads('created_on: 2018-02-02')
+        self.assertEqual(parsed, {'created_on': date(2018, 2, 2)})
+        binary = codec_registry.get('binary')
+        self.assertEqual(binary.loads(binary.dumps(parsed)),
+                         {'created_on': '2018-02-02'})
+
+    def test_unknown(self):
+        """Test unknown formats are rejected."""
+        self.assertNotIn('toml', codec_registry)
+        with self.assertRaises(SLRDIllegalArgumentError):
+            codec_registry.get('toml')
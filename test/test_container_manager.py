@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.container_manager module."""
+from os import listdir
+from os.path import join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDFSCtrlReadException
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.index_manager import IndexManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestContainerManager(GPGTestCase):
+    """Test slrd.managers.container_manager module.
+
+    Containers are kept small (256 bytes) so that splitting is easy to
+    trigger.
+    """
+
+    PT_LENGTH = 256
+
+    def setUp(self):
+        """Create an empty base directory."""
+        self.tmpdir = TemporaryDirectory()
+        self.cman = ContainerManager(self.tmpdir.name, self.gpgctrl)
+
+    def tearDown(self):
+        """Remove a temporary base directory."""
+        self.tmpdir.cleanup()
+
+    def reload(self):
+        """Get a fresh container manager loaded from disk."""
+        cman = ContainerManager(self.tmpdir.name, self.gpgctrl)
+        cman.load()
+        return cman
+
+    def test_pack_small(self):
+        """Test many small records share a single container."""
+        for i in range(10):
+            self.cman.put('key%i' % i, b'v' * 5)
+        self.assertEqual(self.cman.flush(), (1, 0))
+        self.assertEqual(len(listdir(self.cman.container_dir)), 1)
+        cman = self.reload()
+        self.assertEqual(cman.stats()['containers'], 1)
+        self.assertEqual(cman.get('key7'), b'vvvvv')
+        self.assertIsNone(cman.get('nope'))
+
+    def test_split_large(self):
+        """Test a value larger than a container is split and reassembled."""
+        value = bytes(range(256)) * 3
+        self.cman.put('big', value)
+        self.cman.put('small', b'x')
+        written, _ = self.cman.flush()
+        self.assertGreater(written, 3)
+        cman = self.reload()
+        self.assertEqual(cman.get('big'), value)
+        self.assertEqual(cman.get('small'), b'x')
+        # the small record went into the partially filled tail container
+        self.assertEqual(cman.stats()['containers'], written)
+
+    def test_reuse_free_space(self):
+        """Test new records go to partially filled containers."""
+        self.cman.put('a', b'a' * 100)
+        self.cman.flush()
+        cman = self.reload()
+        cman.put('b', b'b' * 50)
+        self.assertEqual(cman.flush(), (1, 0))
+        self.assertEqual(self.reload().stats()['containers'], 1)
+
+    def test_delete(self):
+        """Test deleting records and removal of empty containers."""
+        self.cman.put('a', b'a')
+        self.cman.put('a', b'b')
+        self.cman.flush()
+        cman = self.reload()
+        self.assertEqual(cman.get('a'), b'b')
+        cman.delete('a')
+        self.assertEqual(cman.flush(), (0, 1))
+        self.assertEqual(listdir(cman.container_dir), [])
+
+    def test_put_failure(self):
+        """Test a put that fails part-way leaves an old value in place."""
+        self.cman.put('a', b'a' * 100)
+        self.cman.put('b', b'b' * 50)
+        self.cman.flush()
+        cman = self.reload()
+        before = cman.stats()
+        records = cman._ContainerManager__records
+        calls = []
+
+        def failing(cont):
+            calls.append(cont.name)
+            if len(calls) == 3:  # a container a second part goes to
+                raise SLRDFSCtrlReadException('broken container')
+            return records(cont)
+
+        with mock.patch.object(cman, '_ContainerManager__records', failing):
+            with self.assertRaises(SLRDFSCtrlReadException):
+                cman.put('a', b'c' * 300)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(cman.get('a'), b'a' * 100)
+        self.assertEqual(cman.stats(), before)
+        self.assertEqual(cman.flush(), (0, 0))
+        cman.put('a', b'c' * 300)
+        cman.flush()
+        self.assertEqual(self.reload().get('a'), b'c' * 300)
+
+    def test_flush_failure(self):
+        """Test emptied containers outlive a flush that fails to write."""
+        value = bytes(range(256)) * 2
+        self.cman.put('big', value)
+        self.cman.flush()
+        cman = self.reload()
+        count = cman.stats()['containers']
+        cman.put('big', b'x')  # leaves all but one container empty
+        with mock.patch.object(cman.gpgctrl, 'encrypt_many',
+                               side_effect=OSError('gpg failed')):
+            with self.assertRaises(OSError):
+                cman.flush()
+        self.assertEqual(len(listdir(cman.container_dir)), count)
+        self.assertEqual(self.reload().get('big'), value)
+        self.assertEqual(cman.flush(), (1, count - 1))
+        self.assertEqual(self.reload().get('big'), b'x')
+
+    def test_stale_parts(self):
+        """Test keys whose parts don't add up are skipped on load."""
+        value = bytes(range(256)) * 2
+        self.cman.put('big', value)
+        self.cman.put('small', b'x')
+        self.cman.flush()
+
+        def stale(name, part):
+            """Write a container with a part of an older 2-part version."""
+            data = self.gpgctrl.encrypt(ContainerManager._encode(
+                    {('big', part): (2, b'old')}))
+            with open(join(self.cman.container_dir, name), 'w') as f:
+                f.write(data)
+
+        stale('stale0', 0)
+        cman = self.reload()
+        self.assertEqual(cman.get('big'), value)
+        stale('stale1', 1)
+        cman = self.reload()  # two complete versions: ambiguous
+        self.assertIsNone(cman.get('big'))
+        self.assertEqual(cman.get('small'), b'x')
+
+    def test_reindex(self):
+        """Test containers changed on disk are re-read one by one."""
+        self.cman.put('a', b'a')
+        self.cman.flush()
+        other = self.reload()
+        index = IndexManager(self.tmpdir.name, containers=other)
+        self.assertIn(other.container_dir, index.watch_dirs())
+        before = fsctrl.scan_dir(self.cman.container_dir)
+        self.cman.put('b', b'b' * 300)  # split over two containers
+        self.cman.delete('a')
+        self.cman.flush()
+        after = fsctrl.scan_dir(self.cman.container_dir)
+        changed = sorted(path for path in before.keys() | after.keys()
+                         if before.get(path) != after.get(path))
+        for path in changed:
+            self.assertTrue(index.reindex_path(path))
+        self.assertIsNone(other.get('a'))
+        self.assertEqual(other.get('b'), b'b' * 300)
+        self.assertEqual(other.stats(), self.reload().stats())
+        # files a manager wrote itself are not read again
+        other.put('c', b'c')
+        other.flush()
+        with mock.patch.object(other.gpgctrl, 'decrypt') as decrypt:
+            for path in fsctrl.scan_dir(other.container_dir):
+                other.reindex_path(path)
+            decrypt.assert_not_called()
+        self.assertEqual(other.get('c'), b'c')
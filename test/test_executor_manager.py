@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.executor_manager module."""
+import asyncio
+from threading import Event
+import unittest
+from slrd.exceptions import SLRDExecutorBusyError, SLRDIllegalArgumentError
+from slrd.managers.executor_manager import ExecutorManager
+
+
+class TestExecutorManager(unittest.TestCase):
+    """Test slrd.managers.executor_manager module."""
+
+    def setUp(self):
+        """Create executors with a single worker and two task slots."""
+        self.executors = ExecutorManager(1, 1, queue_factor=2)
+
+    def tearDown(self):
+        """Stop executors."""
+        self.executors.shutdown()
+
+    def test_run(self):
+        """Test work is run synchronously and asynchronously."""
+        self.assertEqual(self.executors.run('io', pow, 2, 3), 8)
+        self.assertEqual(asyncio.run(
+            self.executors.run_async('crypto', pow, 2, 4)), 16)
+        with self.assertRaises(SLRDIllegalArgumentError):
+            self.executors.run('gpu', pow, 2, 3)
+
+    def test_busy(self):
+        """Test work is rejected once a pool is full and accepted after."""
+        release = Event()
+        futures = [self.executors.submit('crypto', release.wait)
+                   for _ in range(2)]
+        with self.assertRaises(SLRDExecutorBusyError):
+            self.executors.submit('crypto', release.wait)
+        # pools are bounded independently
+        self.assertEqual(self.executors.run('io', abs, -1), 1)
+        release.set()
+        for future in futures:
+            future.result()
+        self.assertTrue(self.executors.run('crypto', release.is_set))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.controllers.fs_controller module."""
+from datetime import datetime
+from os import listdir, stat, symlink
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.controllers import fs_controller
+from slrd.controllers.fs_controller import FSController
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.exceptions import SLRDFSCtrlReadException, SLRDFSCtrlWriteException
+
+
+class TestFSControllerBatch(unittest.TestCase):
+    """Test batch operations of slrd.controllers.fs_controller module."""
+
+    def setUp(self):
+        """Create a temporary directory."""
+        self.tmpdir = TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.fsctrl = FSController()
+
+    def tearDown(self):
+        """Remove a temporary directory."""
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        """Test files written in a batch are read and deleted in a batch."""
+        files = {'a': 'first', 'b': '', 'c': 'third\n' * 100000}
+        ts = datetime(2017, 5, 4, 3, 2, 1)
+        self.fsctrl.write_many(self.path, files, timestamp=lambda: ts)
+        self.assertEqual(stat(join(self.path, 'a')).st_mode & 0o777, 0o600)
+        self.assertEqual(stat(join(self.path, 'c')).st_mtime, ts.timestamp())
+        self.assertEqual(self.fsctrl.read_many(self.path, ['c', 'a', 'b']),
+                         [files['c'], files['a'], files['b']])
+        self.assertEqual(
+                self.fsctrl.delete_many(self.path, ['a', 'b', 'missing']), 2)
+        self.assertEqual(listdir(self.path), ['c'])
+        self.assertEqual(self.fsctrl.delete_many(join(self.path, 'x'), ['c']),
+                         0)
+
+    def test_force(self):
+        """Test existing files are only overwritten when forced."""
+        self.fsctrl.write_many(self.path, {'a': 'old'})
+        with self.assertRaises(SLRDFSCtrlWriteException):
+            self.fsctrl.write_many(self.path, {'a': 'new'})
+        self.fsctrl.write_many(self.path, {'a': 'new'}, force=True)
+        self.assertEqual(self.fsctrl.read_many(self.path, ['a']), ['new'])
+
+    def test_rejected(self):
+        """Test names escaping a directory and symlinks are rejected."""
+        for name in ('../a', '', '..', 'a/b'):
+            with self.subTest(name=name):
+                with self.assertRaises(SLRDIllegalArgumentError):
+                    self.fsctrl.write_many(self.path, {name: 'x'})
+        self.fsctrl.write_many(self.path, {'a': 'x'})
+        symlink(join(self.path, 'a'), join(self.path, 'link'))
+        with self.assertRaises(SLRDFSCtrlReadException):
+            self.fsctrl.read_many(self.path, ['link'])
+        with self.assertRaises(SLRDFSCtrlWriteException):
+            self.fsctrl.write_many(self.path, {'link': 'y'}, force=True)
+        with self.assertRaises(SLRDFSCtrlReadException):
+            self.fsctrl.read_many(self.path, ['missing'])
+
+
+class TestFSControllerAtomic(unittest.TestCase):
+    """Test atomic writes of slrd.controllers.fs_controller module."""
+
+    def setUp(self):
+        """Create a temporary directory."""
+        self.tmpdir = TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.fsctrl = FSController()
+
+    def tearDown(self):
+        """Remove a temporary directory."""
+        self.tmpdir.cleanup()
+
+    def test_replace(self):
+        """Test a file is replaced by a new inode, no temporary files left."""
+        path = join(self.path, 'a')
+        self.fsctrl.write_to_file('old', path, mode=0o600)
+        ino = stat(path).st_ino
+        self.fsctrl.write_to_file('new', path, mode=0o600, force=True)
+        self.assertNotEqual(stat(path).st_ino, ino)
+        self.assertEqual(self.fsctrl.read_file(path), 'new')
+        self.assertEqual(listdir(self.path), ['a'])
+
+    def test_failed_write(self):
+        """Test a failed write keeps an old file and cleans up after itself."""
+        path = join(self.path, 'a')
+        self.fsctrl.write_to_file('old', path, mode=0o600)
+        with mock.patch('slrd.controllers.fs_controller.fsync',
+                        side_effect=OSError('disk on fire')):
+            with self.assertRaises(SLRDFSCtrlWriteException):
+                self.fsctrl.write_to_file('new', path, force=True)
+            with self.assertRaises(SLRDFSCtrlWriteException):
+                self.fsctrl.write_many(self.path, {'a': 'new'}, force=True)
+        self.assertEqual(self.fsctrl.read_file(path), 'old')
+        self.assertEqual(listdir(self.path), ['a'])
+
+    def test_group_commit(self):
+        """Test a directory is fsync'ed once per group."""
+        real_fsync = fs_controller.fsync
+        with mock.patch('slrd.controllers.fs_controller.fsync',
+                        side_effect=real_fsync) as fsync:
+            with self.fsctrl.group_commit():
+                with self.fsctrl.group_commit():
+                    for name in 'abc':
+                        self.fsctrl.write_to_file(name, join(self.path, name))
+                self.fsctrl.write_many(self.path, {'d': 'd', 'e': 'e'})
+                self.fsctrl.delete_many(self.path, ['a'])
+            # 5 files + 1 directory
+            self.assertEqual(fsync.call_count, 6)
+        tmp_name = '%sx.1234%s' % (FSController.TMP_PREFIX,
+                                   FSController.TMP_SUFFIX)
+        open(join(self.path, tmp_name), 'w').close()
+        self.assertEqual(sorted(self.fsctrl.scan_dir(self.path)),
+                         [join(self.path, name) for name in 'bcde'])
+
+    def test_map_file(self):
+        """Test files are mapped and streamed in chunks."""
+        self.fsctrl.write_many(self.path, {'a': 'abcdefg', 'empty': ''})
+        with self.fsctrl.map_file(join(self.path, 'a')) as view:
+            self.assertEqual(bytes(view[2:4]), b'cd')
+        with self.fsctrl.map_file(join(self.path, 'empty')) as view:
+            self.assertEqual(len(view), 0)
+        self.assertEqual([bytes(chunk) for chunk in self.fsctrl.read_chunks(
+                                join(self.path, 'a'), 3)],
+                         [b'abc', b'def', b'g'])
+        with self.assertRaises(SLRDFSCtrlReadException):
+            with self.fsctrl.map_file(self.path):
+                pass
+
+    def test_walk_dir(self):
+        """Test a subtree is walked in order and skipped names left out."""
+        for sub in ('b', 'a', '.git'):
+            self.fsctrl.create_dir(join(self.path, sub), 0o700)
+            self.fsctrl.write_many(join(self.path, sub), {'y': '', 'x': ''})
+        self.fsctrl.write_many(self.path, {'z': '', 'skip': ''})
+        self.assertEqual(
+            [path[len(self.path) + 1:] for path, _ in self.fsctrl.walk_dir(
+                self.path, ('.git', 'skip'))],
+            ['z', 'a/x', 'a/y', 'b/x', 'b/y'])
+
+    def test_atomic_output(self):
+        """Test a file written by someone else appears atomically."""
+        path = join(self.path, 'a')
+        with self.fsctrl.atomic_output(path, 0o640) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                f.write('data')
+            self.assertEqual(listdir(self.path), [tmp_path.split('/')[-1]])
+        self.assertEqual(self.fsctrl.read_file(path), 'data')
+        self.assertEqual(stat(path).st_mode & 0o777, 0o640)
+        with self.assertRaises(SLRDFSCtrlWriteException):
+            with self.fsctrl.atomic_output(path):
+                pass
+        with self.assertRaises(SLRDFSCtrlWriteException):
+            with self.fsctrl.atomic_output(path, force=True) as tmp_path:
+                pass  # nothing written to a temporary path
+        self.assertEqual(listdir(self.path), ['a'])
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.controllers.git_controller module."""
+from datetime import datetime
+from os import makedirs, remove
+from os.path import join
+from shutil import which
+from subprocess import run
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.controllers.git_controller import GitController
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.exceptions import SLRDGitCtrlSyncException
+
+
+def write(path, content):
+    """Write a file creating parent directories."""
+    makedirs(path.rsplit('/', 1)[0], exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+@unittest.skipUnless(which('git'), 'git is not installed')
+class TestGitController(unittest.TestCase):
+    """Test slrd.controllers.git_controller module."""
+
+    def setUp(self):
+        """Create a bare remote and two clones of it."""
+        self.tmpdir = TemporaryDirectory()
+        self.remote = join(self.tmpdir.name, 'remote.git')
+        run(('git', 'init', '-q', '--bare', self.remote), check=True)
+        self.a = GitController(join(self.tmpdir.name, 'a'))
+        self.b = GitController(join(self.tmpdir.name, 'b'))
+        for ctrl in (self.a, self.b):
+            makedirs(ctrl.repo_dir)
+            ctrl.init(self.remote)
+
+    def tearDown(self):
+        """Remove temporary repositories."""
+        self.tmpdir.cleanup()
+
+    def test_commit(self):
+        """Test a batch of paths is committed at once."""
+        self.assertIsNone(self.a.head())
+        paths = [join(self.a.repo_dir, 'c', name) for name in ('x', 'y')]
+        for path in paths:
+            write(path, path)
+        ts = datetime(2018, 2, 2, 14, 22)
+        first = self.a.commit(paths, 'first', timestamp=ts)
+        self.assertEqual(self.a.head(), first)
+        self.assertEqual(self.a.changed_paths(None, first), paths)
+        self.assertIsNone(self.a.commit(paths, 'nothing changed'))
+        remove(paths[0])
+        write(paths[1], 'changed')
+        second = self.a.commit([join(self.a.repo_dir, 'c')], 'second')
+        self.assertEqual(self.a.changed_paths(first, second), paths)
+        self.assertEqual(self.a.changed_paths(second, second), [])
+        with self.assertRaises(SLRDIllegalArgumentError):
+            self.a.commit([self.tmpdir.name], 'outside')
+
+    def test_sync(self):
+        """Test pulls report changed paths only."""
+        write(join(self.a.repo_dir, 'x'), 'x')
+        write(join(self.a.repo_dir, 'y'), 'y')
+        self.a.commit(['x', 'y'], 'first')
+        self.a.push()
+        self.assertEqual(self.b.pull(), [join(self.b.repo_dir, p)
+                                         for p in ('x', 'y')])
+        self.assertEqual(self.b.head(), self.a.head())
+        remove(join(self.a.repo_dir, 'x'))
+        self.a.commit(['x'], 'remove')
+        self.a.push()
+        self.assertEqual(self.b.pull(), [join(self.b.repo_dir, 'x')])
+        self.assertEqual(self.b.pull(), [])
+
+    def test_conflict(self):
+        """Test a conflicting merge is aborted."""
+        write(join(self.a.repo_dir, 'x'), 'x')
+        self.a.commit(['x'], 'first')
+        self.a.push()
+        self.b.pull()
+        for ctrl in (self.a, self.b):
+            write(join(ctrl.repo_dir, 'x'), ctrl.repo_dir)
+            ctrl.commit(['x'], 'conflict')
+        self.a.push()
+        head = self.b.head()
+        with self.assertRaises(SLRDGitCtrlSyncException):
+            self.b.pull()
+        self.assertEqual(self.b.head(), head)
+        with open(join(self.b.repo_dir, 'x')) as f:
+            self.assertEqual(f.read(), self.b.repo_dir)
+        with self.assertRaises(SLRDGitCtrlSyncException):
+            self.b.push()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.controllers.gpg_controller module."""
+from shutil import which
+import sys
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.exceptions import SLRDGPGCtrlDecryptException
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestGPGController(GPGTestCase):
+    """Test slrd.controllers.gpg_controller module."""
+
+    PT_LENGTH = 128
+    WORKERS = 4
+
+    def test_pad(self):
+        """Test padded blocks have a fixed length and unpad strictly."""
+        gpgctrl = self.gpgctrl
+        for data in (b'', b'secret', b'x' * gpgctrl.max_data_len):
+            with self.subTest(length=len(data)):
+                block = gpgctrl.pad(data)
+                self.assertEqual(len(block), self.PT_LENGTH)
+                self.assertEqual(gpgctrl.unpad(block), data)
+        with self.assertRaises(SLRDIllegalArgumentError):
+            gpgctrl.pad(b'x' * (gpgctrl.max_data_len + 1))
+        with self.assertRaises(SLRDGPGCtrlDecryptException):
+            gpgctrl.unpad(b'\xff' * self.PT_LENGTH)
+        with self.assertRaises(SLRDGPGCtrlDecryptException):
+            gpgctrl.unpad(b'\x00' * (self.PT_LENGTH - 1))
+
+    def test_unpad_path(self):
+        """Test good and bad headers run the same lines until a final check."""
+        gpgctrl = self.gpgctrl
+        code = type(gpgctrl).unpad.__code__
+
+        def trace(block):
+            """Get line numbers of unpad() run on a block."""
+            lines = []
+
+            def tracer(frame, event, arg):
+                if frame.f_code is code:
+                    if event == 'line':
+                        lines.append(frame.f_lineno)
+                    return tracer
+                return None
+
+            sys.settrace(tracer)
+            try:
+                gpgctrl.unpad(block)
+            except SLRDGPGCtrlDecryptException:
+                pass
+            finally:
+                sys.settrace(None)
+            return lines
+
+        good = trace(gpgctrl.pad(b'secret'))
+        for header in (gpgctrl.max_data_len + 1, 2 ** 32 - 1):
+            with self.subTest(header=header):
+                block = header.to_bytes(4, 'big') + bytes(
+                        self.PT_LENGTH - 4)
+                bad = trace(block)
+                self.assertEqual(bad[:len(good) - 1], good[:-1])
+                self.assertNotEqual(bad, good)
+        self.assertEqual(trace(gpgctrl.pad(b'x' * gpgctrl.max_data_len)),
+                         good)
+
+    def test_pad_many(self):
+        """Test a batch is padded like single blocks with distinct filler."""
+        gpgctrl = self.gpgctrl
+        blocks = [b'', b'secret', b'x' * gpgctrl.max_data_len] * 40
+        padded = gpgctrl.pad_many(blocks)
+        self.assertEqual([len(block) for block in padded],
+                         [self.PT_LENGTH] * len(blocks))
+        self.assertEqual([gpgctrl.unpad(block) for block in padded], blocks)
+        fillers = {bytes(block[10:]) for block in padded[1::3]}
+        self.assertEqual(len(fillers), len(padded[1::3]))
+        self.assertEqual(gpgctrl.pad_many([]), [])
+        with self.assertRaises(SLRDIllegalArgumentError):
+            gpgctrl.pad_many([b'', b'x' * (gpgctrl.max_data_len + 1)])
+
+    def test_roundtrip(self):
+        """Test a single block survives encryption."""
+        encrypted = self.gpgctrl.encrypt(b'secret')
+        self.assertEqual(self.gpgctrl.decrypt(encrypted), b'secret')
+
+    def test_batch_order(self):
+        """Test batch operations keep an input order."""
+        blocks = [b'block %i' % i for i in range(12)]
+        encrypted = self.gpgctrl.encrypt_many(blocks)
+        self.assertEqual(len(set(encrypted)), len(blocks))
+        self.assertEqual(self.gpgctrl.decrypt_many(encrypted), blocks)
+        self.assertEqual(self.gpgctrl.decrypt_many([]), [])
+
+    def test_hybrid(self):
+        """Test blocks sealed with a data key and mixed batches."""
+        gpg_block = self.gpgctrl.encrypt(b'gpg')
+        gpgctrl = self.controller()
+        gpgctrl.load_data_key(gpgctrl.generate_data_key())
+        self.assertTrue(gpgctrl.hybrid)
+        sealed = gpgctrl.encrypt_many([b'', b'data key', b'x' * 100])
+        self.assertTrue(all(gpgctrl.is_hybrid(block) for block in sealed))
+        self.assertEqual(len(set(len(block) for block in sealed)), 1)
+        self.assertEqual(gpgctrl.decrypt_many(sealed + [gpg_block]),
+                         [b'', b'data key', b'x' * 100, b'gpg'])
+        views = [memoryview(block.encode()) for block in sealed[1:2] +
+                 [gpg_block]]
+        self.assertEqual(gpgctrl.decrypt_many(views), [b'data key', b'gpg'])
+        tampered = sealed[1][:-6] + ('A' if sealed[1][-6] != 'A' else 'B') + \
+            sealed[1][-5:]
+        with self.assertRaises(SLRDGPGCtrlDecryptException):
+            gpgctrl.decrypt(tampered)
+        gpgctrl.unload_data_keys()
+        with self.assertRaises(SLRDGPGCtrlDecryptException):
+            gpgctrl.decrypt(sealed[0])
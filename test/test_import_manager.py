@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.import_manager module."""
+from io import StringIO
+import json
+from os.path import exists, join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.controllers import fsctrl
+from slrd.exceptions import SLRDImportError
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.import_manager import ImportManager, _JSONStream
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.template_manager import TemplateManager
+from slrd.types.link_type import LinkType
+from slrd.types.template_type import TemplateType
+from test.gpg_test_case import GPGTestCase
+
+
+CSV_EXPORT = """name,url,username,password
+Facebook,https://www.facebook.com/login,john,cookies
+Mail,mail.de,bob,
+Stack,https://stackexchange.com,john,s3cret
+"""
+
+JSON_EXPORT = {
+    'encrypted': False,
+    'folders': [{'id': 'f1', 'name': 'Social'}],
+    'items': [
+        {'name': 'Facebook', 'notes': 'main',
+         'login': {'uris': [{'uri': 'https://fb.com'}], 'username': 'john',
+                   'password': 'cookies'}},
+        {'name': 'Note', 'type': 2, 'notes': 'plain note'},
+    ],
+}
+
+
+class TestJSONStream(unittest.TestCase):
+    """Test pulling JSON values out of a text file in small chunks."""
+
+    def test_items(self):
+        """Test values are parsed across chunk boundaries."""
+        stream = _JSONStream(StringIO(' [1234567, {"a": [1, 2]}, "x" ] '), 3)
+        self.assertEqual(list(stream.items()), [1234567, {'a': [1, 2]}, 'x'])
+        self.assertEqual(stream.peek(), '')
+        with self.assertRaises(ValueError):
+            list(_JSONStream(StringIO('[1, 2'), 3).items())
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestImportManager(GPGTestCase):
+    """Test slrd.managers.import_manager module."""
+
+    PT_LENGTH = 512
+
+    def setUp(self):
+        """Create an empty base directory and an importer."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        self.containers = ContainerManager(self.base_dir, self.gpgctrl)
+        self.templates = {'login': TemplateType(
+            name='login', keys=['username', {'password': {'min_length': 1}}])}
+        self.importer = ImportManager(
+                self.base_dir, self.containers,
+                TemplateManager(self.templates.get), batch_size=2)
+
+    def tearDown(self):
+        """Remove a temporary base directory."""
+        self.tmpdir.cleanup()
+
+    def export(self, name, content):
+        """Write an export file."""
+        path = join(self.base_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def keyfile(self, key):
+        """Get {value: [ids]} of a key out of keyfiles an importer wrote."""
+        index = IndexManager(self.base_dir)
+        index.load()
+        return {value: list(index.lookup(key, value))
+                for value in index.values(key)}
+
+    def linkfiles(self, ids):
+        """Load linkfiles back from freshly loaded containers.
+
+        Records are plain JSON, independent of a Python version.
+        """
+        containers = ContainerManager(self.base_dir, self.gpgctrl)
+        containers.load()
+        return [LinkType.from_parsed(json.loads(containers.get(lid)))
+                for lid in ids]
+
+    def test_csv(self):
+        """Test a CSV export is validated, packed and indexed."""
+        path = self.export('export.csv', CSV_EXPORT)
+        stats = self.importer.run(path, template='login')
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['imported'], 2)
+        self.assertEqual(stats['errors'],
+                         [(2, ['missing required key: password'])])
+        sites = self.keyfile('sites')
+        self.assertEqual(sorted(sites), ['facebook.com', 'stackexchange.com'])
+        self.assertEqual(self.keyfile('username'),
+                         {'john': sites['facebook.com'] +
+                          sites['stackexchange.com']})
+        self.assertEqual(self.keyfile('password'), {})
+        # a keyfile per batch, existing ones are never rewritten
+        self.assertEqual(len(fsctrl.scan_dir(self.importer.keyfile_dir)), 2)
+        link, = self.linkfiles(sites['facebook.com'])
+        self.assertEqual(link.template, 'login')
+        self.assertEqual(link.keys, {'username': 'john',
+                                     'password': 'cookies'})
+        self.assertEqual(link['title'], 'Facebook')
+        self.assertFalse(exists(self.importer.checkpoint_path))
+
+    def test_index(self):
+        """Test imported linkfiles are indexed out of containers."""
+        self.importer.run(self.export('export.csv', CSV_EXPORT),
+                          template='login')
+        index = IndexManager(self.base_dir, containers=ContainerManager(
+                self.base_dir, self.gpgctrl))
+        index.load()
+        lid, = self.keyfile('sites')['facebook.com']
+        self.assertEqual(index.get_linkfile(lid).keys['password'], 'cookies')
+        self.assertEqual(index.linkfile_count(), 2)
+        entries, _ = index.timeline()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(index.timeline(site='facebook.com')[0][0][0], lid)
+        # restored from a state, then kept in sync as containers change
+        index.load_state(index.dump_state())
+        self.assertEqual(index.linkfile_count(), 2)
+        before = fsctrl.scan_dir(self.containers.container_dir)
+        self.containers.delete(lid)
+        self.containers.flush()
+        after = fsctrl.scan_dir(self.containers.container_dir)
+        for path in before.keys() | after.keys():
+            if before.get(path) != after.get(path):
+                self.assertTrue(index.reindex_path(path))
+        self.assertIsNone(index.get_linkfile(lid))
+        self.assertEqual(len(index.timeline()[0]), 1)
+
+    def test_json(self):
+        """Test nested JSON exports and JSON Lines are streamed."""
+        self.importer.READ_CHUNK = 7
+        path = self.export('export.json', json.dumps(JSON_EXPORT))
+        self.assertEqual(self.importer.run(path)['imported'], 2)
+        link, = self.linkfiles(self.keyfile('sites')['fb.com'])
+        self.assertEqual(link.notes, 'main')
+        self.assertEqual(link.keys['password'], 'cookies')
+        path = self.export('export.jsonl', '\n'.join(
+                json.dumps({'url': 'x%i.de' % i}) for i in range(3)))
+        self.assertEqual(self.importer.run(path)['imported'], 3)
+        self.assertEqual(len(self.keyfile('sites')), 4)
+        with self.assertRaises(SLRDImportError):
+            self.importer.run(self.export('bad.json', '[{"url": '))
+        with self.assertRaises(SLRDImportError):
+            self.importer.run(self.export('export.txt', ''))
+
+    def test_resume(self):
+        """Test an interrupted import resumes after a last checkpoint."""
+        path = self.export('export.csv', CSV_EXPORT + '\n'.join(
+                'Site%i,site%i.com,user%i,pw' % (i, i, i) for i in range(4)))
+        put = self.containers.put
+        calls = []
+
+        def failing_put(key, value):
+            calls.append(key)
+            if len(calls) == 5:
+                raise OSError('interrupted')
+            put(key, value)
+
+        with mock.patch.object(self.containers, 'put', failing_put):
+            with self.assertRaises(OSError):
+                self.importer.run(path)
+        self.assertTrue(exists(self.importer.checkpoint_path))
+        stats = self.importer.run(path)
+        self.assertEqual(stats['rows'], 7)
+        self.assertEqual(stats['imported'], 7)
+        sites = self.keyfile('sites')
+        self.assertEqual(len(sites), 7)
+        self.assertTrue(all(len(ids) == 1 for ids in sites.values()))
+        self.assertEqual(len(self.containers.keys()), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
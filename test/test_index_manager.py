@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.index_manager module."""
+from os import makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.managers.index_manager import IndexManager
+
+
+KEYFILE_NAMES = """
+first_name:
+    - John: [id1, id2]
+    - Bob: [id3]
+"""
+
+KEYFILE_SITES = """
+sites:
+    facebook.com: [id1]
+    stackexchange.com: [id2, id3, id2]
+"""
+
+LINKFILE_TMPL = """
+id: %s
+template: Facebook registration template
+keys:
+    first_name: John
+created_on: 02.02.2018 14:22 Africa/Accra
+"""
+
+TEMPLATE_FB = """
+name: Facebook registration template
+type: online
+first_time_link: fb.com/register
+link: fb.com/login
+keys:
+    - first_name
+"""
+
+
+class TestIndexManager(unittest.TestCase):
+    """Test slrd.managers.index_manager module.
+
+    A fresh base directory with a couple of keyfiles and linkfiles is spawned
+    in a temporary folder for each test case.
+    """
+
+    def setUp(self):
+        """Populate a temporary base directory."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        kdir = join(self.base_dir, IndexManager.KEYFILE_DIR)
+        ldir = join(self.base_dir, IndexManager.LINKFILE_DIR)
+        makedirs(kdir)
+        makedirs(ldir)
+        makedirs(join(self.base_dir, IndexManager.TEMPLATE_DIR))
+        self.write(join(kdir, 'k1'), KEYFILE_NAMES)
+        self.write(join(kdir, 'k2'), KEYFILE_SITES)
+        self.write(join(kdir, 'broken'), 'first_name: [[[')
+        for lid in ('id1', 'id2', 'id3'):
+            self.write(join(ldir, lid), LINKFILE_TMPL % lid)
+        self.write(join(self.base_dir, IndexManager.TEMPLATE_DIR, 'fb'),
+                   TEMPLATE_FB)
+        self.index = IndexManager(self.base_dir)
+        self.index.load()
+
+    def tearDown(self):
+        """Remove a temporary base directory."""
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        """Write content to a file."""
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_lookup(self):
+        """Test key -> value -> linkfile ids queries."""
+        self.assertEqual(self.index.lookup('first_name', 'John'),
+                         ('id1', 'id2'))
+        self.assertEqual(self.index.lookup('first_name', 'Bob'), ('id3',))
+        self.assertEqual(self.index.lookup('first_name', 'Nope'), ())
+        self.assertEqual(self.index.lookup('last_name', 'John'), ())
+
+    def test_lookup_site(self):
+        """Test site -> linkfile ids queries (duplicates dropped)."""
+        self.assertEqual(self.index.lookup_site('facebook.com'), ('id1',))
+        self.assertEqual(self.index.lookup_site('stackexchange.com'),
+                         ('id2', 'id3'))
+        self.assertEqual(sorted(self.index.sites()),
+                         ['facebook.com', 'stackexchange.com'])
+
+    def test_get_linkfile(self):
+        """Test linkfiles are parsed once and served from RAM."""
+        self.assertEqual(self.index.linkfile_count(), 3)
+        linkfile = self.index.get_linkfile('id2')
+        self.assertEqual(linkfile['keys']['first_name'], 'John')
+        self.assertIsNone(self.index.get_linkfile('id42'))
+
+    def test_reindex(self):
+        """Test single files can be re-indexed and removed."""
+        path = join(self.base_dir, IndexManager.KEYFILE_DIR, 'k1')
+        self.index.add_keyfile(path, {'first_name': {'Dolori': ['id2']}})
+        self.assertEqual(self.index.lookup('first_name', 'John'), ())
+        self.assertEqual(self.index.lookup('first_name', 'Dolori'), ('id2',))
+        self.index.remove_keyfile(path)
+        self.assertEqual(self.index.keys(), ('sites',))
+        self.index.remove_linkfile(
+                join(self.base_dir, IndexManager.LINKFILE_DIR, 'id1'))
+        self.assertIsNone(self.index.get_linkfile('id1'))
+        self.assertEqual(self.index.lookup_site('facebook.com'), ('id1',))
+
+    def test_shared_keys(self):
+        """Test keyfiles defining the same key are merged, not replaced."""
+        kdir = join(self.base_dir, IndexManager.KEYFILE_DIR)
+        self.index.add_keyfile(join(kdir, 'k3'),
+                               {'first_name': {'John': ['id3'], 'Al': []}})
+        self.assertEqual(self.index.values('first_name'),
+                         ('John', 'Bob', 'Al'))
+        self.assertEqual(self.index.lookup('first_name', 'John'),
+                         ('id1', 'id2', 'id3'))
+        state = self.index.dump_state()
+        self.index.remove_keyfile(join(kdir, 'k1'))
+        self.assertEqual(self.index.values('first_name'), ('John', 'Al'))
+        self.assertEqual(self.index.lookup('first_name', 'John'), ('id3',))
+        self.index.load_state(state)
+        self.assertEqual(self.index.values('first_name'),
+                         ('John', 'Bob', 'Al'))
+        self.assertEqual(self.index.lookup('first_name', 'John'),
+                         ('id1', 'id2', 'id3'))
+        self.index.remove_keyfile(join(kdir, 'k3'))
+        self.assertEqual(self.index.values('first_name'), ('John', 'Bob'))
+        self.assertEqual(self.index.lookup('first_name', 'John'),
+                         ('id1', 'id2'))
+
+    def test_search(self):
+        """Test sites and templates are searched and kept in sync."""
+        template = self.index.get_template('Facebook registration template')
+        self.assertEqual(template.keys, ('first_name',))
+        self.assertEqual(self.index.templates(), (template,))
+        self.assertEqual([r[0] for r in self.index.search('fa')],
+                         ['facebook.com'])
+        self.assertEqual(self.index.search('fb.com/log', 1),
+                         [('fb.com/login', 'template', template.name, 2.0)])
+        path = join(self.base_dir, IndexManager.TEMPLATE_DIR, 'fb')
+        self.index.remove_template(path)
+        self.assertEqual(self.index.search('fb.com/log'), [])
+        self.index.add_keyfile(
+                join(self.base_dir, IndexManager.KEYFILE_DIR, 'k2'),
+                {'sites': {'fb.com': ['id1']}})
+        self.assertEqual([r[0] for r in self.index.search('fa')], [])
+        self.assertEqual(self.index.search('fb')[0][0], 'fb.com')
+        self.assertTrue(self.index.reindex_path(path))
+        self.assertIsNotNone(self.index.get_template(template.name))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.key_manager module."""
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.managers.key_manager import KeyManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestKeyManager(GPGTestCase):
+    """Test slrd.managers.key_manager module."""
+
+    def test_epochs(self):
+        """Test data keys survive restarts and old epochs stay readable."""
+        with TemporaryDirectory() as base_dir:
+            gpgctrl = self.controller()
+            first = KeyManager(base_dir, gpgctrl).load()
+            old_block = gpgctrl.encrypt(b'old')
+            second = KeyManager(base_dir, gpgctrl).rotate()
+            self.assertNotEqual(first, second)
+            gpgctrl = self.controller()
+            self.assertEqual(KeyManager(base_dir, gpgctrl).load(), second)
+            self.assertEqual(gpgctrl.decrypt(old_block), b'old')
+            self.assertIn(second, gpgctrl.encrypt(b'new'))
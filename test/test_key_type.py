@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.types.key_type module."""
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.types.key_type import KeyType
+
+
+class TestKeyType(unittest.TestCase):
+    """Test slrd.types.key_type module."""
+
+    def test_shapes(self):
+        """Test both keyfile shapes resolve into the same keys."""
+        mapping = KeyType('first_name: {John: [id1, id2], Bob: [id3]}')
+        listed = KeyType('first_name:\n  - John: [id1, id2]\n  - Bob: [id3]')
+        self.assertEqual(mapping, listed)
+        self.assertEqual(mapping.values, ('John', 'Bob'))
+        self.assertEqual(mapping.ids, (('id1', 'id2'), ('id3',)))
+        keys = KeyType.from_keyfile({'sites': {'fb.com': None},
+                                     'age': {42: ['id1']}})
+        self.assertEqual([key.to_dict() for key in keys],
+                         [{'sites': {'fb.com': []}}, {'age': {'42': ['id1']}}])
+
+    def test_malformed(self):
+        """Test malformed keyfiles are rejected."""
+        for content in ({'k': 'v'}, {'k': ['v']}, {'k': {'v': 'id1'}}, []):
+            with self.subTest(content=content):
+                with self.assertRaises(SLRDIllegalArgumentError):
+                    KeyType.from_keyfile(content)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.utils.lazy_logger module."""
+import logging
+import unittest
+from unittest import mock
+from slrd.utils import lazy_logger
+from slrd.utils.lazy_logger import LazyLogger
+
+
+class Probe(object):
+    """Log argument counting how many times it was formatted."""
+
+    def __init__(self):
+        """."""
+        self.formatted = 0
+
+    def __str__(self):
+        """."""
+        self.formatted += 1
+        return 'probe'
+
+
+class TestLazyLogger(unittest.TestCase):
+    """Test slrd.utils.lazy_logger module."""
+
+    NAME = 'slrd.test.lazy'
+
+    def setUp(self):
+        """Start every test case with a logger at WARNING level."""
+        logging.getLogger(self.NAME).setLevel(logging.WARNING)
+
+    def test_deferred(self):
+        """Test arguments are formatted only for emitted records."""
+        logger = LazyLogger(self.NAME)
+        probe = Probe()
+        logger.debug('not emitted: %s', probe)
+        self.assertEqual(probe.formatted, 0)
+        self.assertFalse(logger.enabled())
+        with self.assertLogs(self.NAME, logging.DEBUG) as cm:
+            logger.debug('emitted: %s', probe)
+        self.assertEqual(cm.output, ['DEBUG:%s:emitted: probe' % self.NAME])
+        self.assertEqual(probe.formatted, 1)
+
+    def test_hot_sampled(self):
+        """Test hot path events are sampled and carry structured fields."""
+        logger = LazyLogger(self.NAME, hot_sample=3)
+        logger.hot('ignored', n=-1)  # disabled level: not counted either
+        with self.assertLogs(self.NAME + '.hot', logging.DEBUG) as cm:
+            for i in range(7):
+                logger.hot('fs.read', n=i, path='/x')
+        self.assertEqual([r.fields['n'] for r in cm.records], [0, 3, 6])
+        self.assertEqual(cm.records[0].event, 'fs.read')
+        self.assertEqual(cm.records[1].getMessage(), 'fs.read n=3 path=/x')
+
+    def test_env_sample(self):
+        """Test malformed sample rates fall back to a default."""
+        for value, expected in (('abc', 100), ('', 100), ('0', 1),
+                                ('-5', 1), ('7', 7), (None, 100)):
+            with self.subTest(value=value):
+                env = {} if value is None else \
+                    {'SLRD_LOG_HOT_SAMPLE': value}
+                with mock.patch.dict('os.environ', env, clear=True):
+                    self.assertEqual(lazy_logger._env_int(
+                            'SLRD_LOG_HOT_SAMPLE', 100), expected)
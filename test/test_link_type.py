@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.types.link_type module."""
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.types.link_type import LinkType
+
+
+class TestLinkType(unittest.TestCase):
+    """Test slrd.types.link_type module."""
+
+    RAW = '\n'.join(('id: id1', 'template: fb', 'keys:',
+                     '    first_name: John', '    email: j@x.de',
+                     'notes: main', 'color: red'))
+
+    def test_parse(self):
+        """Test a linkfile is resolved into slots and exported back."""
+        linkfile = LinkType(self.RAW)
+        self.assertFalse(hasattr(linkfile, '__dict__'))
+        self.assertEqual(linkfile.key_names, ('first_name', 'email'))
+        self.assertEqual(linkfile.get_key('email'), 'j@x.de')
+        self.assertIsNone(linkfile.get_key('password'))
+        self.assertEqual(linkfile['keys']['first_name'], 'John')
+        self.assertEqual(linkfile['color'], 'red')
+        self.assertIsNone(linkfile.get('created_on'))
+        other = LinkType.from_parsed(linkfile.to_dict())
+        self.assertEqual(other, linkfile)
+        self.assertIs(other.key_names[0], linkfile.key_names[0])
+
+    def test_secrets(self):
+        """Test secret keys can be left out of an export."""
+        linkfile = LinkType.from_parsed({
+            'id': 'id1', 'keys': {'email': 'j@x.de', 'password': 'pw'},
+            'pin': '1234'})
+        self.assertEqual(linkfile.to_dict()['keys']['password'], 'pw')
+        self.assertEqual(linkfile.to_dict(secrets=False),
+                         {'id': 'id1', 'keys': {'email': 'j@x.de'}})
+
+    def test_malformed(self):
+        """Test malformed linkfiles are rejected."""
+        for data in ({'template': 'fb'}, {'id': 'x', 'keys': [1]}, []):
+            with self.subTest(data=data):
+                with self.assertRaises(SLRDIllegalArgumentError):
+                    LinkType.from_parsed(data)
+        with self.assertRaises(SLRDIllegalArgumentError):
+            LinkType(self.RAW, id='x')
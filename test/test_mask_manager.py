@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.mask_manager module."""
+from os import stat
+from os.path import join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.controllers.git_controller import GitController
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.mask_manager import MaskManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg') and which('git'),
+                     'gpg or git binary is not available')
+class TestMaskManager(GPGTestCase):
+    """Test slrd.managers.mask_manager module."""
+
+    PT_LENGTH = 256
+
+    def setUp(self):
+        """Create a repository with a few containers."""
+        self.tmpdir = TemporaryDirectory()
+        self.gitctrl = GitController(self.tmpdir.name)
+        self.gitctrl.init()
+        self.cman = ContainerManager(self.tmpdir.name, self.gpgctrl)
+        for i in range(4):
+            self.cman.put('key%i' % i, b'v' * 200)
+        self.cman.flush()
+
+    def tearDown(self):
+        """Remove a temporary repository."""
+        self.tmpdir.cleanup()
+
+    def read_files(self):
+        """Get {container path: encrypted content}."""
+        files = {}
+        for name in self.cman.idle_names():
+            with open(join(self.cman.container_dir, name), 'rb') as f:
+                files[f.name] = f.read()
+        return files
+
+    def test_round(self):
+        """Test decoys are rewritten within a budget and committed."""
+        masker = MaskManager(self.cman, self.gitctrl, rate=1, burst=10 ** 6,
+                             max_batch=2)
+        self.assertEqual(masker.commit(), self.gitctrl.head())
+        first = self.gitctrl.head()
+        old = self.read_files()
+        sizes = {stat(path).st_size for path in old}
+        written, commit = masker.run_once()
+        self.assertEqual(written, 2 * sizes.pop())
+        new = self.read_files()
+        changed = [path for path in old if old[path] != new[path]]
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(self.gitctrl.changed_paths(first, commit),
+                         sorted(changed))
+        # real changes go into the same commit as decoys
+        self.cman.put('key0', b'new')
+        self.cman.flush()
+        masker.bucket.consume(10 ** 6)
+        self.assertEqual(masker.mask(), 0)
+        self.assertIsNotNone(masker.commit())
+        cman = ContainerManager(self.tmpdir.name, self.gpgctrl)
+        cman.load()
+        self.assertEqual(cman.get('key0'), b'new')
+        self.assertEqual(cman.get('key3'), b'v' * 200)
+
+    def test_skip_modified(self):
+        """Test containers modified in RAM are never rewritten."""
+        self.cman.put('key1', b'changed')
+        idle = self.cman.idle_names()
+        self.assertEqual(self.cman.rewrite(
+            set(self.cman._containers) - set(idle)), (0, 0))
+        count, written = self.cman.rewrite(self.cman._containers)
+        self.assertEqual(count, len(idle))
+        self.assertEqual(written % count, 0)
+
+    def test_thread(self):
+        """Test a background thread can be started and stopped."""
+        masker = MaskManager(self.cman, interval=3600)
+        masker.start()
+        masker.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.utils.rate_limiter module."""
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.utils.rate_limiter import TokenBucket
+
+
+class Clock(object):
+    """Manually advanced clock."""
+
+    def __init__(self):
+        """."""
+        self.now = 0.0
+
+    def __call__(self):
+        """."""
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test slrd.utils.rate_limiter module."""
+
+    def setUp(self):
+        """Create a bucket of 10 tokens refilled at 5 tokens a second."""
+        self.clock = Clock()
+        self.bucket = TokenBucket(5, 10, clock=self.clock)
+
+    def test_refill(self):
+        """Test tokens are taken and refilled up to a burst size."""
+        self.assertTrue(self.bucket.try_consume(8))
+        self.assertFalse(self.bucket.try_consume(3))
+        self.assertEqual(self.bucket.delay(3), 0.2)
+        self.clock.now = 0.2
+        self.assertTrue(self.bucket.try_consume(3))
+        self.clock.now = 100
+        self.assertEqual(self.bucket.available(), 10)
+
+    def test_debt(self):
+        """Test a bucket in debt delays following consumers."""
+        self.bucket.consume(20)
+        self.assertEqual(self.bucket.available(), -10)
+        self.assertEqual(self.bucket.delay(100), 4)
+        self.clock.now = 2
+        self.assertEqual(self.bucket.available(), 0)
+
+    def test_bad_rate(self):
+        """Test a rate should be positive."""
+        with self.assertRaises(SLRDIllegalArgumentError):
+            TokenBucket(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
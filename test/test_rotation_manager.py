@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.rotation_manager module."""
+from os import listdir, stat
+from os.path import exists, join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.controllers.gpg_controller import AESGCM
+from slrd.exceptions import SLRDKeyRotationError
+from slrd.managers.container_manager import ContainerManager
+from slrd.managers.key_manager import KeyManager
+from slrd.managers.rotation_manager import RotationManager
+from slrd.managers.shared_index_manager import SharedIndexManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestRotationManager(GPGTestCase):
+    """Test slrd.managers.rotation_manager module."""
+
+    EMAILS = ('old@slrd.local', 'new@slrd.local')
+    PT_LENGTH = 512
+    RECORDS = 12
+
+    @classmethod
+    def setUpClass(cls):
+        """Generate an old and a new GPG key in a temporary GPG home."""
+        super().setUpClass()
+        cls.old_key, cls.new_key = cls.key_ids
+
+    def setUp(self):
+        """Create a base directory and a runtime directory for locks."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        self.container_dir = join(self.base_dir,
+                                  ContainerManager.CONTAINER_DIR)
+        self.runtime = TemporaryDirectory()
+        patcher = mock.patch.object(SharedIndexManager, 'RUNTIME_DIRS',
+                                    (self.runtime.name,))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove temporary directories."""
+        self.runtime.cleanup()
+        self.tmpdir.cleanup()
+
+    def populate(self, gpgctrl):
+        """Write a container per record."""
+        containers = ContainerManager(self.base_dir, gpgctrl)
+        for i in range(self.RECORDS):
+            containers.put('id%i' % i, b'x' * (containers.capacity - 20))
+        containers.flush()
+        return sorted(listdir(self.container_dir))
+
+    def recipients(self, name):
+        """Get IDs of keys a GPG-encrypted container is encrypted to."""
+        with open(join(self.container_dir, name)) as f:
+            return self.gpg.get_recipients(f.read())
+
+    def check(self, gpgctrl):
+        """Check every record is readable after a rotation."""
+        containers = ContainerManager(self.base_dir, gpgctrl)
+        containers.load()
+        self.assertEqual(len(containers.keys()), self.RECORDS)
+        self.assertEqual(containers.get('id7'),
+                         b'x' * (containers.capacity - 20))
+
+    def test_gpg(self):
+        """Test containers are re-encrypted to a new key and resumed."""
+        names = self.populate(self.controller(self.old_key))
+        broken = join(self.container_dir, names[0])
+        with open(broken) as f:
+            content = f.read()
+        with open(broken, 'w') as f:
+            f.write('garbage')
+        rotation = RotationManager(self.base_dir,
+                                   self.controller(self.old_key),
+                                   self.new_key, workers=2, batch_size=3,
+                                   io_rate=10 ** 9)
+        with self.assertRaises(SLRDKeyRotationError):
+            rotation.run()
+        self.assertTrue(exists(rotation.journal_path))
+        inodes = {name: stat(join(self.container_dir, name)).st_ino
+                  for name in names[1:]}
+        with open(broken, 'w') as f:
+            f.write(content)
+        stats = rotation.run()
+        self.assertEqual(stats['containers'], 1)
+        self.assertEqual(stats['passes'], 1)
+        self.assertFalse(exists(rotation.journal_path))
+        for name in names[1:]:
+            self.assertEqual(stat(join(self.container_dir, name)).st_ino,
+                             inodes[name])
+        for name in names:
+            self.assertEqual(self.recipients(name), [self.new_key[-16:]])
+        self.check(self.controller(self.new_key))
+
+    def test_server_running(self):
+        """Test a rotation refuses to run next to a server."""
+        self.populate(self.controller(self.old_key))
+        server = SharedIndexManager(self.base_dir)
+        self.assertTrue(server.acquire_writer())
+        rotation = RotationManager(self.base_dir,
+                                   self.controller(self.old_key),
+                                   self.new_key, workers=1)
+        with self.assertRaises(SLRDKeyRotationError):
+            rotation.run()
+        self.assertFalse(exists(rotation.journal_path))
+        server.release_writer()
+        self.assertEqual(rotation.run()['containers'], self.RECORDS)
+        # a lock is given up once a rotation is done
+        self.assertTrue(server.acquire_writer())
+        server.release_writer()
+
+    def test_torn_journal(self):
+        """Test a journal torn while its header was written is ignored."""
+        self.populate(self.controller(self.old_key))
+        rotation = RotationManager(self.base_dir,
+                                   self.controller(self.old_key),
+                                   self.new_key, workers=1)
+        for content in ('', '{"old": "', '[]\n'):
+            with self.subTest(content=content):
+                with open(rotation.journal_path, 'w') as f:
+                    f.write(content)
+                self.assertEqual(rotation.run()['containers'],
+                                 self.RECORDS)
+                self.assertFalse(exists(rotation.journal_path))
+        with open(rotation.journal_path, 'w') as f:
+            f.write('{"old": \n{"x": [1, 2, 3]}\n')
+        with self.assertRaises(SLRDKeyRotationError):
+            rotation.run()
+
+    @unittest.skipIf(AESGCM is None, 'cryptography is not installed')
+    def test_hybrid(self):
+        """Test containers are sealed with a new data key."""
+        old = self.controller(self.old_key)
+        KeyManager(self.base_dir, old).load()
+        self.populate(old)
+        stats = RotationManager(self.base_dir, old, self.new_key,
+                                workers=2).run()
+        self.assertEqual(stats['containers'], self.RECORDS)
+        new = self.controller(self.new_key)
+        epoch = KeyManager(self.base_dir, new).load()
+        self.assertEqual(sorted(listdir(join(self.base_dir,
+                                             KeyManager.KEY_DIR))),
+                         sorted([KeyManager.CURRENT_NAME, epoch]))
+        self.check(new)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.search_manager module."""
+import unittest
+from slrd.managers.search_manager import SearchManager
+from slrd.types.template_type import TemplateType
+
+
+class TestSearchManager(unittest.TestCase):
+    """Test slrd.managers.search_manager module."""
+
+    SITES = ('facebook.com', 'fb.com', 'mail.google.com', 'google.com',
+             'stackexchange.com', 'Facebook.de')
+
+    def setUp(self):
+        """Build a search index over sites and a template."""
+        template = TemplateType.from_parsed({
+            'name': 'Facebook registration template',
+            'link': 'https://www.fb.com/login',
+            'first_time_link': 'fb.com/register'})
+        self.search = SearchManager.from_index(self.SITES, [template])
+
+    def terms(self, query, limit=None):
+        """Get terms found by a query."""
+        return [term for term, _, _, _ in self.search.search(query, limit)]
+
+    def test_prefix(self):
+        """Test prefixes of whole terms rank before prefixes of tokens."""
+        self.assertEqual(len(self.search), 8)
+        self.assertEqual(self.terms('face'), ['facebook.de', 'facebook.com'])
+        self.assertEqual(self.terms('FB.com')[:2], ['fb.com', 'fb.com/login'])
+        self.assertEqual(self.terms('goo', 2),
+                         ['google.com', 'mail.google.com'])
+        self.assertEqual(self.search.search('fb.com/reg')[:1],
+                         [('fb.com/register', 'template',
+                           'Facebook registration template',
+                           SearchManager.PREFIX)])
+        self.assertEqual(self.terms('https://www.stack'),
+                         ['stackexchange.com'])
+        self.assertEqual(self.terms('  '), [])
+
+    def test_exact(self):
+        """Test an exact match goes first."""
+        result = self.search.search('google.com')
+        self.assertEqual(result[0][:3], ('google.com', 'site', 'google.com'))
+        self.assertEqual(result[0][3], SearchManager.EXACT)
+        self.assertEqual(result[1][0], 'mail.google.com')
+
+    def test_fuzzy(self):
+        """Test typos are found by trigram similarity."""
+        result = self.search.search('facebok')
+        self.assertEqual(sorted(term for term, _, _, _ in result),
+                         ['facebook.com', 'facebook.de'])
+        # a reference keeps a site name as it is stored in the sites keyfile
+        self.assertIn(('facebook.de', 'site', 'Facebook.de'),
+                      [entry[:3] for entry in result])
+        self.assertTrue(all(score < SearchManager.TOKEN
+                            for _, _, _, score in result))
+        self.assertIn('stackexchange.com', self.terms('stakexchange'))
+        self.assertEqual(self.terms('qwxz'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.shared_index_manager module."""
+from os import chmod, listdir, makedirs
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.exceptions import SLRDSharedIndexError
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.shared_index_manager import SharedIndex
+from slrd.managers.shared_index_manager import SharedIndexManager
+
+
+class TestSharedIndexManager(unittest.TestCase):
+    """Test slrd.managers.shared_index_manager module."""
+
+    KEYFILES = {
+        'sites': 'sites: {fb.com: [id1, id2], mail.de: [id2]}',
+        'names': 'first_name: [{John: [id1]}, {Bob: [id2, id3]}]',
+    }
+    LINKFILES = {
+        'id1': 'id: id1\ntemplate: fb\nkeys: {first_name: John}',
+        'id2': 'id: id2\ntemplate: mail\nnotes: main\nextra: [1, 2]',
+    }
+    TEMPLATES = {
+        'fb': 'name: fb\nlink: fb.com/login\nkeys: [first_name]',
+    }
+
+    def setUp(self):
+        """Build an index and publish it."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        for sub, files in ((IndexManager.KEYFILE_DIR, self.KEYFILES),
+                           (IndexManager.LINKFILE_DIR, self.LINKFILES),
+                           (IndexManager.TEMPLATE_DIR, self.TEMPLATES)):
+            makedirs(join(self.base_dir, sub))
+            for name, content in files.items():
+                self.write(join(self.base_dir, sub, name), content)
+        self.index = IndexManager(self.base_dir)
+        self.index.load()
+        self.runtime = TemporaryDirectory()
+        self.writer = self.manager()
+        self.reader = self.manager(check_interval=0)
+
+    def tearDown(self):
+        """Release a writer lock and remove temporary directories."""
+        self.writer.release_writer()
+        self.runtime.cleanup()
+        self.tmpdir.cleanup()
+
+    def manager(self, **kwargs):
+        """Get a manager keeping an index in a temporary runtime directory."""
+        return SharedIndexManager(self.base_dir, runtime_dir=self.runtime.name,
+                                  **kwargs)
+
+    @staticmethod
+    def write(path, content):
+        """Write content to a file."""
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_queries(self):
+        """Test a mapped index answers like the one it was built from."""
+        self.assertIsNone(self.reader.current())
+        self.assertTrue(self.writer.acquire_writer())
+        self.assertFalse(self.reader.acquire_writer())
+        self.assertEqual(self.writer.publish(self.index), 1)
+        shared = self.reader.current()
+        self.assertEqual(shared.keys(), ('first_name', 'sites'))
+        self.assertEqual(shared.sites(), ('fb.com', 'mail.de'))
+        for key, value in (('sites', 'fb.com'), ('first_name', 'Bob'),
+                           ('first_name', 'Nobody'), ('nokey', 'x')):
+            with self.subTest(key=key, value=value):
+                self.assertEqual(shared.lookup(key, value),
+                                 self.index.lookup(key, value))
+        self.assertEqual(shared.values('nokey'), ())
+        for lid in ('id1', 'id2', 'id3', 'id0', 'id9'):
+            with self.subTest(lid=lid):
+                self.assertEqual(shared.get_linkfile(lid),
+                                 self.index.get_linkfile(lid))
+        self.assertEqual(shared.linkfile_count(), 2)
+        self.assertEqual(shared.templates(), self.index.templates())
+        self.assertEqual(shared.get_template('fb').link, 'fb.com/login')
+        self.assertIsNone(shared.get_template('mail'))
+        for query in ('fb', 'mail', 'fb.com/lo', 'mial.de', ''):
+            with self.subTest(query=query):
+                self.assertEqual(shared.search(query),
+                                 self.index.search(query))
+
+    def test_generation_swap(self):
+        """Test readers pick up new generations and old ones stay usable."""
+        with self.assertRaises(SLRDSharedIndexError):
+            self.writer.publish(self.index)
+        self.writer.acquire_writer()
+        self.writer.publish(self.index)
+        old = self.reader.current()
+        self.write(join(self.index.keyfile_dir, 'sites'),
+                   'sites: {new.com: [id1]}')
+        self.index.reindex_path(join(self.index.keyfile_dir, 'sites'))
+        self.assertEqual(self.writer.publish(self.index), 2)
+        new = self.reader.current()
+        self.assertEqual((new.generation, new.sites()), (2, ('new.com',)))
+        self.assertEqual(old.sites(), ('fb.com', 'mail.de'))
+        self.assertIs(self.reader.current(), new)
+        # a writer that comes later continues a sequence of generations
+        self.writer.release_writer()
+        writer = self.manager()
+        self.assertTrue(writer.acquire_writer())
+        self.assertEqual(writer.publish(self.index), 3)
+        writer.release_writer()
+
+    def test_location(self):
+        """Test an index is kept out of a base directory and kept private."""
+        self.writer.acquire_writer()
+        self.writer.publish(self.index)
+        self.assertEqual(dirname(dirname(self.writer.path)),
+                         self.runtime.name)
+        self.assertNotIn(SharedIndexManager.INDEX_NAME,
+                         listdir(self.base_dir))
+        default = SharedIndexManager(self.base_dir)
+        if default.dir is not None:
+            self.assertFalse(default.path.startswith(self.base_dir))
+        self.writer.release_writer()
+        chmod(self.writer.dir, 0o755)
+        with self.assertRaises(SLRDSharedIndexError):
+            self.writer.acquire_writer()
+        with self.assertRaises(SLRDSharedIndexError):
+            self.manager(check_interval=0).current()
+        with mock.patch.object(SharedIndexManager, 'RUNTIME_DIRS', ()):
+            manager = SharedIndexManager(self.base_dir)
+            with self.assertRaises(SLRDSharedIndexError):
+                manager.acquire_writer()
+            with self.assertRaises(SLRDSharedIndexError):
+                manager.wait(10)
+
+    def test_blobs(self):
+        """Test only changed linkfiles are encoded again."""
+        blobs = {}
+        data = SharedIndex.build(self.index.shared_state(), 1, blobs)
+        self.assertEqual(sorted(blobs), [0, 1])
+        encoded = dict(blobs)
+        self.write(join(self.index.linkfile_dir, 'id2'),
+                   'id: id2\ntemplate: mail\nnotes: changed')
+        self.index.reindex_path(join(self.index.linkfile_dir, 'id2'))
+        changed = SharedIndex.build(self.index.shared_state(), 2, blobs)
+        self.assertIs(blobs[0][1], encoded[0][1])
+        self.assertIsNot(blobs[1][1], encoded[1][1])
+        self.assertEqual(SharedIndex(memoryview(changed)).get_linkfile(
+                'id2').notes, 'changed')
+        self.assertEqual(changed, SharedIndex.build(
+                self.index.shared_state(), 2))
+        self.assertNotEqual(data, changed)
+
+    def test_malformed(self):
+        """Test malformed and missing indexes are rejected."""
+        with self.assertRaises(SLRDSharedIndexError):
+            SharedIndex(memoryview(b'garbage'))
+        data = SharedIndex.build(self.index.shared_state(), 1)
+        with self.assertRaises(SLRDSharedIndexError):
+            SharedIndex(memoryview(data[:-20]))
+        self.reader.WAIT_INTERVAL = 0.01
+        with self.assertRaises(SLRDSharedIndexError):
+            self.reader.wait(0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.snapshot_manager module."""
+from os import makedirs, remove
+from os.path import join
+from shutil import which
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.snapshot_manager import SnapshotManager
+from test.gpg_test_case import GPGTestCase
+
+
+@unittest.skipUnless(which('gpg'), 'gpg binary is not available')
+class TestSnapshotManager(GPGTestCase):
+    """Test slrd.managers.snapshot_manager module.
+
+    A throwaway GPG home with an unprotected key is generated once for all
+    test cases.
+    """
+
+    def setUp(self):
+        """Populate a temporary base directory."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        self.kdir = join(self.base_dir, IndexManager.KEYFILE_DIR)
+        self.ldir = join(self.base_dir, IndexManager.LINKFILE_DIR)
+        makedirs(self.kdir)
+        makedirs(self.ldir)
+        self.write(join(self.kdir, 'names'), 'first_name: {John: [id1]}')
+        self.write(join(self.kdir, 'sites'), 'sites: {fb.com: [id1]}')
+        self.write(join(self.ldir, 'id1'),
+                   'id: id1\ntemplate: fb\ncreated_on: 2018-02-02')
+
+    def tearDown(self):
+        """Remove a temporary base directory."""
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        """Write content to a file."""
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def new_snapshot(self):
+        """Get a snapshot manager for a fresh (empty) index."""
+        return SnapshotManager(IndexManager(self.base_dir), self.gpgctrl)
+
+    def test_roundtrip(self):
+        """Test an index is restored from a snapshot without parsing files."""
+        self.assertIsNone(self.new_snapshot().load())
+        self.new_snapshot().load_index()
+        snapshot = self.new_snapshot()
+        self.assertEqual(snapshot.load(), 0)
+        index = snapshot.index
+        self.assertEqual(index.lookup('first_name', 'John'), ('id1',))
+        self.assertEqual(index.lookup_site('fb.com'), ('id1',))
+        self.assertEqual(index.get_linkfile('id1')['template'], 'fb')
+
+    def test_reconcile(self):
+        """Test only files changed after a snapshot was taken are reloaded."""
+        self.new_snapshot().load_index()
+        self.write(join(self.kdir, 'names'), 'first_name: {Bob: [id1]}')
+        remove(join(self.kdir, 'sites'))
+        snapshot = self.new_snapshot()
+        self.assertEqual(snapshot.load(), 2)
+        self.assertEqual(snapshot.index.lookup('first_name', 'Bob'), ('id1',))
+        self.assertEqual(snapshot.index.lookup_site('fb.com'), ())
+
+    def test_changed_while_building(self):
+        """Test a file changed while an index is built isn't taken as fresh."""
+        snapshot = self.new_snapshot()
+        load = snapshot.index.load
+
+        def load_then_change():
+            """Build an index, then change a file before it's saved."""
+            load()
+            self.write(join(self.kdir, 'names'), 'first_name: {Bob: [id1]}')
+
+        with mock.patch.object(snapshot.index, 'load', load_then_change):
+            snapshot.load_index()
+        snapshot = self.new_snapshot()
+        self.assertEqual(snapshot.load(), 1)
+        self.assertEqual(snapshot.index.lookup('first_name', 'Bob'), ('id1',))
+
+    def test_corrupted(self):
+        """Test an unusable snapshot results in a full rebuild."""
+        snapshot = self.new_snapshot()
+        self.write(snapshot.path, 'garbage')
+        snapshot.load_index()
+        self.assertEqual(snapshot.index.lookup('first_name', 'John'),
+                         ('id1',))
+        self.assertEqual(self.new_snapshot().load(), 0)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.template_manager module."""
+from datetime import date
+import unittest
+from slrd.exceptions import SLRDTemplateValidationError
+from slrd.managers.template_manager import TemplateManager
+from slrd.managers.template_manager import TemplateValidator
+from slrd.types.link_type import LinkType
+from slrd.types.template_type import TemplateType
+
+
+TEMPLATE = """
+name: fb
+keys:
+    - first_name
+    - email: {format: email}
+    - pin: {type: str, pattern: '[0-9]{4}'}
+    - born: {type: date, required: false}
+    - nickname: {required: false, min_length: 2, max_length: 4}
+"""
+
+
+class TestTemplateManager(unittest.TestCase):
+    """Test slrd.managers.template_manager module."""
+
+    def setUp(self):
+        """Create a registry over a single template."""
+        self.templates = {'fb': TemplateType(TEMPLATE)}
+        self.manager = TemplateManager(self.templates.get)
+
+    def test_validate(self):
+        """Test required keys and rules of a compiled template."""
+        validator = TemplateValidator(self.templates['fb'])
+        self.assertEqual(validator.required, {'first_name', 'email', 'pin'})
+        keys = {'first_name': 'John', 'email': 'john@meal.de', 'pin': '0042',
+                'born': date(1990, 1, 1), 'other': [1]}
+        self.assertEqual(validator.errors(keys), [])
+        errors = validator.errors({'first_name': '', 'email': 'john',
+                                   'pin': 4242, 'born': '1990',
+                                   'nickname': 'x'})
+        self.assertEqual(sorted(errors), sorted([
+            'missing required key: first_name',
+            'key email: not a valid email',
+            'key pin: str expected',
+            'key born: date expected',
+            'key nickname: shorter than 2 characters']))
+        self.assertEqual(validator.errors({'pin': {'a': 1}})[-1],
+                         'key pin: value is not a scalar')
+        with self.assertRaises(SLRDTemplateValidationError) as cm:
+            validator.validate({'email': 'secret@value.de'})
+        self.assertEqual(len(cm.exception.errors), 2)
+        self.assertNotIn('secret', str(cm.exception))
+
+    def test_malformed_rules(self):
+        """Test rules are checked when a template is compiled."""
+        for rules in ({'type': 'uuid'}, {'format': 'iban'},
+                      {'pattern': '[0-9'}, {'min_length': -1},
+                      {'max_length': 'long'}, {'unknown': 1}):
+            with self.subTest(rules=rules):
+                template = TemplateType(name='t', keys=[{'k': rules}])
+                with self.assertRaises(SLRDTemplateValidationError):
+                    TemplateValidator(template)
+
+    def test_registry(self):
+        """Test validators are cached until a template changes."""
+        validator = self.manager.validator('fb')
+        self.assertIs(self.manager.validator('fb'), validator)
+        self.templates['fb'] = TemplateType(name='fb', keys=['email'])
+        self.assertIsNot(self.manager.validator('fb'), validator)
+        link = LinkType(id='id1', template='fb', keys={'first_name': 'J'})
+        self.assertEqual(self.manager.errors(link),
+                         ['missing required key: email'])
+        with self.assertRaises(SLRDTemplateValidationError):
+            self.manager.validate(link)
+        self.manager.validate(LinkType(id='id2', keys={}))
+        del self.templates['fb']
+        self.assertEqual(self.manager.errors(link), ['no such template: fb'])
+
+
+if __name__ == '__main__':
+    unittest.main()
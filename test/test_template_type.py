@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.types.template_type module."""
+import unittest
+from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.types.template_type import TemplateType
+
+
+class TestTemplateType(unittest.TestCase):
+    """Test slrd.types.template_type module."""
+
+    def test_parse(self):
+        """Test a template is resolved with frontend content kept aside."""
+        template = TemplateType(name='fb', type='online', link='fb.com/login',
+                                keys=['first_name', 'email'], ui={'x': 1})
+        self.assertEqual(template.keys, ('first_name', 'email'))
+        self.assertEqual(template.extra, {'ui': {'x': 1}})
+        self.assertEqual(TemplateType.from_parsed(template.to_dict()),
+                         template)
+        self.assertEqual(TemplateType(name='notes').type, 'plain')
+        with self.assertRaises(SLRDIllegalArgumentError):
+            TemplateType(type='online')
+
+    def test_rules(self):
+        """Test keys with rules are split into names and rules."""
+        template = TemplateType(name='fb', keys=[
+            'first_name', {'email': {'format': 'email'}}, {'notes': None}])
+        self.assertEqual(template.keys, ('first_name', 'email', 'notes'))
+        self.assertEqual(template.rules, {'email': {'format': 'email'}})
+        self.assertEqual(TemplateType.from_parsed(template.to_dict()),
+                         template)
+        for keys in ([{'a': {}, 'b': {}}], [{'a': 'email'}]):
+            with self.subTest(keys=keys):
+                with self.assertRaises(SLRDIllegalArgumentError):
+                    TemplateType(name='fb', keys=keys)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.timeline_manager module."""
+from datetime import date, datetime, timezone
+from os import makedirs, remove
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.shared_index_manager import SharedIndex
+from slrd.managers.timeline_manager import TimelineManager
+
+
+class TestTimelineManager(unittest.TestCase):
+    """Test slrd.managers.timeline_manager module."""
+
+    def test_parse_stamp(self):
+        """Test supported created_on formats."""
+        utc = datetime(2018, 2, 2, 14, 22, tzinfo=timezone.utc).timestamp()
+        for created_on, stamp in (
+                ('02.02.2018 14:22 Africa/Accra', utc),
+                ('02.02.2018 14:22', utc),
+                ('02.02.2018 16:22 Europe/Kiev', utc),
+                ('02.02.2018 14:22 Nowhere/Void', utc),
+                ('2018-02-02T14:22:00+00:00', utc),
+                (datetime(2018, 2, 2, 14, 22), utc),
+                (date(2018, 2, 2), utc - 14 * 3600 - 22 * 60),
+                ('yesterday', None), (None, None), (42, None)):
+            with self.subTest(created_on=created_on):
+                self.assertEqual(TimelineManager.parse_stamp(created_on),
+                                 stamp)
+
+    def test_incremental(self):
+        """Test entries are kept sorted while added and removed."""
+        tl = TimelineManager(str, int, lambda o: 't%i' % (o % 2))
+        tl.load([(0, 30), (1, 10), (2, None)])
+        for ordinal, stamp in ((3, 20), (4, 10), (5, 40)):
+            tl.add(ordinal, stamp)
+        tl.add(0, 50)
+        tl.remove(1)
+        tl.remove(2)
+        self.assertEqual(list(tl.stamps), [10, 20, 40, 50])
+        self.assertEqual(list(tl.ordinals), [4, 3, 5, 0])
+        self.assertEqual(tl.stamp_of(1), tl.NO_STAMP)
+        self.assertEqual(tl.query(15, 50), ([('3', 20), ('5', 40)], None))
+        self.assertEqual(tl.query(template='t1', reverse=True),
+                         ([('5', 40), ('3', 20)], None))
+        self.assertEqual(tl.query(candidates=[0, 1, 3]),
+                         ([('3', 20), ('0', 50)], None))
+
+    def test_pages(self):
+        """Test pages chained by cursors cover a timeline exactly once."""
+        tl = TimelineManager(str, int, lambda o: None)
+        tl.load((o, o // 3) for o in range(20))
+        for reverse in (False, True):
+            with self.subTest(reverse=reverse):
+                seen, cursor = [], None
+                while True:
+                    items, cursor = tl.query(limit=6, cursor=cursor,
+                                             reverse=reverse)
+                    self.assertLessEqual(len(items), 6)
+                    seen.extend(int(lid) for lid, _ in items)
+                    if cursor is None:
+                        break
+                self.assertEqual(seen, sorted(range(20), reverse=reverse))
+        self.assertEqual(tl.query(limit=0), ([], None))
+
+
+class TestIndexTimeline(unittest.TestCase):
+    """Test a timeline of an index and of a shared index built from it."""
+
+    def setUp(self):
+        """Create a base directory with a few registrations."""
+        self.tmpdir = TemporaryDirectory()
+        self.index = IndexManager(self.tmpdir.name)
+        makedirs(self.index.keyfile_dir)
+        makedirs(self.index.linkfile_dir)
+        self.write(join(self.index.keyfile_dir, 'sites'),
+                   'sites: {fb.com: [id1, id3], mail.de: [id2]}')
+        for lid, template, day in (('id1', 'fb', 3), ('id2', 'mail', 1),
+                                   ('id3', 'fb', 2), ('id4', 'fb', None)):
+            created_on = '' if day is None else \
+                'created_on: 0%i.02.2018 10:00 UTC' % day
+            self.write(join(self.index.linkfile_dir, lid),
+                       'id: %s\ntemplate: %s\n%s' % (lid, template,
+                                                     created_on))
+        self.index.load()
+
+    def tearDown(self):
+        """Remove a base directory."""
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        """Write content to a file."""
+        with open(path, 'w') as f:
+            f.write(content)
+
+    @staticmethod
+    def ids(page):
+        """Get linkfile ids of a timeline page."""
+        return [lid for lid, _ in page[0]]
+
+    def test_queries(self):
+        """Test filters work the same on an index and a shared index."""
+        shared = SharedIndex(memoryview(
+                SharedIndex.build(self.index.shared_state(), 1)))
+        for index in (self.index, shared):
+            with self.subTest(index=type(index).__name__):
+                self.assertEqual(self.ids(index.timeline()),
+                                 ['id2', 'id3', 'id1'])
+                self.assertEqual(self.ids(index.timeline(site='fb.com',
+                                                         reverse=True)),
+                                 ['id1', 'id3'])
+                self.assertEqual(self.ids(index.timeline(template='mail')),
+                                 ['id2'])
+                self.assertEqual(index.timeline(site='none.com'), ([], None))
+                page, cursor = index.timeline(limit=1, reverse=True)
+                self.assertEqual(self.ids(index.timeline(cursor=cursor,
+                                                         reverse=True)),
+                                 ['id3', 'id2'])
+
+    def test_reindex(self):
+        """Test a timeline follows changed linkfiles."""
+        path = join(self.index.linkfile_dir, 'id2')
+        self.write(path, 'id: id2\ncreated_on: 05.02.2018 10:00')
+        self.index.reindex_path(path)
+        self.assertEqual(self.ids(self.index.timeline()),
+                         ['id3', 'id1', 'id2'])
+        remove(path)
+        self.index.reindex_path(path)
+        self.assertEqual(self.ids(self.index.timeline()), ['id3', 'id1'])
+        self.index.load_state(self.index.dump_state())
+        self.assertEqual(self.ids(self.index.timeline()), ['id3', 'id1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ import logging
 from os.path import isfile
 import unittest
 from slrd.exceptions import SLRDIllegalArgumentError
+from slrd.utils.type_checker import TypeChecker
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -72,3 +73,36 @@ class TestFSController(unittest.TestCase):
         # nothing should be raised
         for comp_arg in comp_args:
             tc.check_types(*comp_arg)
+
+    def test_accepts(self):
+        """Test decorator-based type checks."""
+        checker = TypeChecker('STRICT')
+
+        @checker.accepts(path=str, mode=int, func=callable, ts=int)
+        def func(path, mode=0o700, func=open, ts=None, *args):
+            return path
+
+        args = {
+            (('/tmp',), ()): True,
+            (('/tmp', 0o600, isfile, None), ()): True,
+            (('/tmp',), (('mode', 1), ('ts', 42))): True,
+            ((42,), ()): False,
+            (('/tmp', '0o600'), ()): False,
+            (('/tmp',), (('func', 'open'),)): False,
+            (('/tmp',), (('mode', None),)): False,
+        }
+        for (fargs, fkwargs), passes in args.items():
+            with self.subTest(args=fargs, kwargs=fkwargs):
+                if passes:
+                    self.assertEqual(func(*fargs, **dict(fkwargs)), '/tmp')
+                else:
+                    with self.assertRaises(SLRDIllegalArgumentError):
+                        func(*fargs, **dict(fkwargs))
+        with self.assertRaises(SLRDIllegalArgumentError):
+            checker.accepts(nope=str)(func)
+
+    def test_accepts_nocheck(self):
+        """Test decorator returns a function untouched in NOCHECK mode."""
+        def func(path):
+            return path
+        self.assertIs(TypeChecker('NOCHECK').accepts(path=str)(func), func)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# vi: set ft=python sw=4 :
+"""Test slrd.managers.watch_manager module."""
+from os import makedirs, remove, rename
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from slrd.managers.index_manager import IndexManager
+from slrd.managers.watch_manager import WatchManager
+
+
+class TestWatchManager(unittest.TestCase):
+    """Test slrd.managers.watch_manager module.
+
+    Every test case is run against both inotify and polling watchers.
+    """
+
+    def setUp(self):
+        """Create an empty base directory and load an index from it."""
+        self.tmpdir = TemporaryDirectory()
+        self.base_dir = self.tmpdir.name
+        self.kdir = join(self.base_dir, IndexManager.KEYFILE_DIR)
+        self.ldir = join(self.base_dir, IndexManager.LINKFILE_DIR)
+        makedirs(self.kdir)
+        self.index = IndexManager(self.base_dir)
+        self.index.load()
+
+    def tearDown(self):
+        """Remove a temporary base directory."""
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        """Write content to a file."""
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def run_scenario(self, watcher):
+        """Apply a couple of changes and check the index follows them."""
+        path = join(self.kdir, 'names')
+        self.write(path, 'first_name: {John: [id1]}')
+        self.assertEqual(watcher.check(1), 1)
+        self.assertEqual(self.index.lookup('first_name', 'John'), ('id1',))
+        # directory created after a watcher was started
+        makedirs(self.ldir)
+        self.write(join(self.ldir, 'tmp'), 'id: id1\ntemplate: t')
+        rename(join(self.ldir, 'tmp'), join(self.ldir, 'id1'))
+        watcher.check(1)
+        self.assertEqual(self.index.get_linkfile('id1')['template'], 't')
+        remove(path)
+        self.assertEqual(watcher.check(1), 1)
+        self.assertEqual(self.index.keys(), ())
+        self.assertEqual(watcher.check(), 0)
+
+    def test_inotify(self):
+        """Test changes are picked up through inotify."""
+        watcher = WatchManager(self.index)
+        if watcher.mode == 'poll':
+            self.skipTest('inotify is not supported on this platform')
+        try:
+            self.run_scenario(watcher)
+        finally:
+            watcher.stop()
+
+    def test_polling(self):
+        """Test changes are picked up through polling."""
+        watcher = WatchManager(self.index, use_inotify=False)
+        self.assertEqual(watcher.mode, 'poll')
+        self.run_scenario(watcher)
+
+    def test_thread(self):
+        """Test a background thread can be started and stopped."""
+        watcher = WatchManager(self.index, poll_interval=0.05)
+        watcher.start()
+        watcher.stop()
+        self.assertEqual(watcher.mode, 'poll')